@@ -0,0 +1,47 @@
+from typing import Dict, Optional, Set
+from google.oauth2.credentials import Credentials
+from starlette.concurrency import run_in_threadpool
+
+from src.credential_store import credential_store
+from src.gmail_access import get_gmail_service, get_profile
+from src.priority_scheduler import priority_scheduler
+
+# Gmail accounts of the authorized users, shared by the routers and the background jobs
+
+# Gmail address of each authorized user, by refresh token (saves a getProfile call per request)
+_accounts: Dict[str, str] = {}
+
+# Credentials of each account are kept in the credential store, so the background jobs of an
+# account run on any server worker, not only on the one its requests happened to reach
+_ACCOUNT_PREFIX = "account:"
+
+# Credentials this process last stored per account (skips rewriting unchanged credentials)
+_remembered: Dict[str, Credentials] = {}
+
+async def remember_credentials(user: str, credentials: Credentials):
+    if _remembered.get(user) is credentials:
+        return
+    await run_in_threadpool(credential_store.set, _ACCOUNT_PREFIX + user, credentials)
+    is_new = user not in _remembered
+    _remembered[user] = credentials
+    if is_new:
+        # Jobs queued for this account (e.g. before a restart) can run now
+        priority_scheduler.wake()
+
+def credentials_for(user: str) -> Optional[Credentials]:
+    """The latest credentials of 'user', or None if they never called the API. Reads the credential store."""
+    return credential_store.get(_ACCOUNT_PREFIX + user)
+
+def ready_users() -> Set[str]:
+    """Accounts whose credentials are known (their background jobs can run). Reads the credential store."""
+    return {key[len(_ACCOUNT_PREFIX):] for key in credential_store.keys(_ACCOUNT_PREFIX)}
+
+async def account_for(credentials: Credentials, gmail_service=None) -> str:
+    """Gmail address of the owner of 'credentials'; also remembers the credentials for background jobs."""
+    key = credentials.refresh_token or credentials.token
+    if key not in _accounts:
+        if gmail_service is None:
+            gmail_service = await run_in_threadpool(get_gmail_service, credentials)
+        _accounts[key] = (await run_in_threadpool(get_profile, gmail_service))['emailAddress']
+    await remember_credentials(_accounts[key], credentials)
+    return _accounts[key]
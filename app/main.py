@@ -1,9 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
-from app.routers import auth, gmail, calendar
+from app.routers import auth, gmail, calendar, jobs
+from app.accounts import ready_users
+from app.routers.gmail import analyze_jobs, process_email_background, stop_backfills
+from src.inference_executor import inference_executor
+from src.analysis_store import analysis_store
+from src.priority_scheduler import priority_scheduler
+from src.job_queue import job_queue
+from src.google_services import service_cache
+from src.credential_store import credential_store
 import os
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the inference workers, which load and warm up all models once (set PARTISH_WARMUP=0
+    to skip the warmup), so no request pays for loading them, then the job workers of
+    /process_inbox (which resume the jobs left by a previous run). On shutdown, unfinished jobs
+    stay queued and running backfills are stopped at their next checkpoint before the workers are stopped.
+    """
+    await inference_executor.start()
+    # Jobs of an account run once its credentials are in the credential store
+    priority_scheduler.configure(analyze_jobs, process_email_background, ready_users=ready_users)
+    await priority_scheduler.start()
+    print(f"Models ready: {inference_executor.worker_status}")
+    print(f"Inference executor: {inference_executor.status()}")
+    yield
+    await priority_scheduler.stop()
+    await stop_backfills()
+    await inference_executor.shutdown()
+    analysis_store.close()
+    job_queue.close()
+    service_cache.clear()
+    credential_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add SessionMiddleware for OAuth state management
 # In a production environment, this SECRET_KEY should be a strong,
@@ -16,11 +48,26 @@ app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(gmail.router, prefix="/api/gmail", tags=["Gmail API"])
 # Include the Calendar router
 app.include_router(calendar.router, prefix="/api/calendar", tags=["Calendar API"])
+# Include the background jobs router
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to PARTISH FastAPI App!"}
 
+@app.get("/health")
+async def health():
+    """
+    Reports model readiness and load/warmup times (from the first worker), executor load, and
+    the job queue and the time-to-action of processed mail (Very Urgent mail first), and the
+    reuse of cached Google API services.
+    """
+    status = dict(inference_executor.worker_status[0]) if inference_executor.worker_status else {"ready": False}
+    status["inference"] = inference_executor.status()
+    status["scheduler"] = priority_scheduler.status()
+    status["google_services"] = service_cache.stats()
+    return status
+
 # You can add more routes and logic here.
 
 if __name__ == "__main__":
@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.responses import RedirectResponse
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request as GoogleAuthRequest
 from google.oauth2.credentials import Credentials
+from starlette.concurrency import run_in_threadpool
 import os
-import pickle
 from dotenv import load_dotenv
+from src.credential_store import credential_store
 
 load_dotenv()
 
@@ -23,10 +22,10 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar.readonly'
 ]
 
-# A simple in-memory store for user credentials (NOT for production!)
-# In a real app, this would be stored securely in a database associated with a user session.
-# Key: user_id (or some session ID), Value: Google Credentials object
-_credentials_store = {}
+# Credentials of the logged-in user, in the credential store shared by every server process
+# (a single placeholder session, NOT for production!). In a real app, they would be associated
+# with a user session.
+SESSION_CREDENTIALS_KEY = "session:current_user"
 
 def get_google_oauth_flow():
     """Initializes and returns a Google OAuth 2.0 Flow object."""
@@ -36,6 +35,9 @@ def get_google_oauth_flow():
             detail="Google Client ID and Secret not configured."
         )
 
+    # Deferred: the OAuth flow pulls in requests/oauthlib, which only the login routes need
+    from google_auth_oauthlib.flow import Flow
+
     # Use a "web" type client config here as we are building a web application
     flow = Flow.from_client_config(
         client_config={
@@ -83,20 +85,21 @@ async def google_callback(request: Request, code: str = None, state: str = None)
     # Store credentials for the current session/user
     # In a real app, you'd associate this with a user ID in a database.
     # For now, we'll use a placeholder key.
-    _credentials_store['current_user'] = credentials
+    await run_in_threadpool(credential_store.set, SESSION_CREDENTIALS_KEY, credentials)
 
     return {"message": "Authentication successful!", "access_token": credentials.token}
 
 # Dependency to get credentials for protected routes
 async def get_google_credentials():
     """Dependency that provides Google API credentials for a user."""
-    credentials = _credentials_store.get('current_user')
+    credentials = await run_in_threadpool(credential_store.get, SESSION_CREDENTIALS_KEY)
     if not credentials:
         raise HTTPException(status_code=401, detail="Not authenticated with Google.")
     
     # Refresh token if expired
     if credentials.expired and credentials.refresh_token:
+        from google.auth.transport.requests import Request as GoogleAuthRequest
         credentials.refresh(GoogleAuthRequest())
-        _credentials_store['current_user'] = credentials # Update store
+        await run_in_threadpool(credential_store.set, SESSION_CREDENTIALS_KEY, credentials) # Update store
     
     return credentials
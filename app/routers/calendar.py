@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from starlette.concurrency import run_in_threadpool
 from typing import Dict
 from datetime import datetime
 from google.oauth2.credentials import Credentials
@@ -28,9 +29,10 @@ async def create_calendar_event_endpoint(
         if not start_dt or not end_dt:
             raise HTTPException(status_code=400, detail=f"Could not parse deadline string: '{deadline_str}'")
 
-        calendar_service = get_calendar_service(credentials)
+        calendar_service = await run_in_threadpool(get_calendar_service, credentials)
         
-        event = create_calendar_event(
+        event = await run_in_threadpool(
+            create_calendar_event,
             calendar_service,
             summary=summary,
             start_datetime=start_dt,
@@ -1,40 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from typing import List, Dict
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, List, Dict, Literal, Optional
 from google.oauth2.credentials import Credentials
 from googleapiclient.errors import HttpError
 
+from app.accounts import account_for, credentials_for, remember_credentials
 from app.routers.auth import get_google_credentials
-from src.gmail_access import get_gmail_service, get_email_details
-from src.JSON_Extracter import analyze_email_sentiment, EmailAnalysis # Import EmailAnalysis model
+from src.gmail_access import get_gmail_service, get_profile, fetch_recent_messages, sync_inbox, sync_checkpoints, list_message_ids, iter_message_chunks
+from src.JSON_Extracter import EmailAnalysis # Import EmailAnalysis model
+from src.inference_executor import inference_executor, InferenceBusyError
 from src.date_parser import parse_deadline_string
 from src.calendar_api import get_calendar_service, create_calendar_event # Import Calendar API functions
+from src.backfill import BackfillJob
+from src.analysis_store import analysis_store
+from src.priority_scheduler import priority_scheduler
 
 router = APIRouter()
 
+# Number of recent messages the inbox endpoints fetch unless ?max_results= is given
+DEFAULT_MAX_RESULTS = int(os.getenv("PARTISH_MAX_RESULTS", "5"))
+
+# Running/finished backfill jobs and their tasks, by Gmail account
+_backfill_jobs: Dict[str, BackfillJob] = {}
+_backfill_tasks: Dict[str, asyncio.Task] = {}
+
+async def _record_analyses(user: str, emails: List[Dict], analyses: List[EmailAnalysis]):
+    """Saves analyses to the analysis store; a storage error is logged, never raised to the client."""
+    try:
+        await run_in_threadpool(analysis_store.save, user, emails, analyses)
+    except Exception as e:
+        print(f"Could not record {len(emails)} analyses for {user}: {e}")
+
 @router.get("/messages", response_model=List[Dict])
-async def list_gmail_messages(credentials: Credentials = Depends(get_google_credentials)):
+async def list_gmail_messages(
+    max_results: int = Query(DEFAULT_MAX_RESULTS, ge=1, le=500),
+    credentials: Credentials = Depends(get_google_credentials)
+):
     """
     Fetches a list of recent Gmail messages for the authenticated user.
     """
     try:
-        gmail_service = get_gmail_service(credentials)
+        gmail_service = await run_in_threadpool(get_gmail_service, credentials)
         
-        # Fetch up to 5 messages. Adjust maxResults or add 'q' for specific queries.
-        results = gmail_service.users().messages().list(userId='me', maxResults=5).execute()
-        messages = results.get('messages', [])
-
-        if not messages:
-            return []
+        # Fetch the most recent messages with batch requests
+        messages = await run_in_threadpool(fetch_recent_messages, gmail_service, max_results=max_results)
 
         messages_data = []
-        for msg_obj in messages:
-            msg_id = msg_obj['id']
-            sender, subject, body = get_email_details(gmail_service, msg_id)
+        for message in messages:
             messages_data.append({
-                "id": msg_id,
-                "sender": sender,
-                "subject": subject,
-                "body_preview": body[:200]
+                "id": message['id'],
+                "sender": message['sender'],
+                "subject": message['subject'],
+                "body_preview": message['body'][:200]
             })
         return messages_data
 
@@ -43,141 +68,393 @@ async def list_gmail_messages(credentials: Credentials = Depends(get_google_cred
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+def _describe_sentiment(analysis: EmailAnalysis) -> str:
+    if analysis.sentiment_score is None:
+        return "not analyzed (settled by the cascade screen)"
+    return f"{analysis.sentiment} (Score: {analysis.sentiment_score:.2f})"
+
+async def _save_sync_checkpoint(sync: Optional[Dict]):
+    """Saves the historyId of an incremental sync (see sync_inbox) once its messages were handled."""
+    if sync is not None and sync['history_id'] is not None:
+        await run_in_threadpool(sync_checkpoints.set, sync['checkpoint_key'], sync['history_id'])
+
 @router.get("/analyze_recent", response_model=List[EmailAnalysis])
-async def analyze_recent_emails(credentials: Credentials = Depends(get_google_credentials)):
+async def analyze_recent_emails(
+    incremental: bool = False,
+    max_results: int = Query(DEFAULT_MAX_RESULTS, ge=1, le=500),
+    credentials: Credentials = Depends(get_google_credentials)
+):
     """
     Fetches recent Gmail messages, analyzes them for urgency and deadlines,
     and returns the analysis results directly.
+    With incremental=true only messages that arrived since the previous incremental call are analyzed.
     """
     try:
-        gmail_service = get_gmail_service(credentials)
+        gmail_service = await run_in_threadpool(get_gmail_service, credentials)
 
-        results = gmail_service.users().messages().list(userId='me', maxResults=5).execute()
-        messages = results.get('messages', [])
+        sync = None
+        if incremental:
+            sync = await run_in_threadpool(sync_inbox, gmail_service, max_results=max_results, consumer='analyze_recent')
+            emails, user = sync['messages'], sync['user']
+        else:
+            emails = await run_in_threadpool(fetch_recent_messages, gmail_service, max_results=max_results)
+            user = await account_for(credentials, gmail_service)
 
-        if not messages:
+        if not emails:
+            await _save_sync_checkpoint(sync)
             return []
 
-        analyzed_emails = []
-        for msg_obj in messages:
-            msg_id = msg_obj['id']
-            sender, subject, body = get_email_details(gmail_service, msg_id)
-            full_email_text = f"{subject} {body}"
+        # Analyze all fetched emails in one batch (single nlp.pipe pass and one model prediction),
+        # in an inference worker so the event loop keeps serving other requests
+        analyzed_emails = await inference_executor.analyze(
+            [f"{e['subject']} {e['body']}" for e in emails], headers=[e.get('headers') for e in emails]
+        )
+        await _record_analyses(user, emails, analyzed_emails)
+        # Only now: if the analysis failed, the next incremental call returns these messages again
+        await _save_sync_checkpoint(sync)
 
-            analysis = analyze_email_sentiment(full_email_text)
-            analyzed_emails.append(analysis)
-            
+        for email, analysis in zip(emails, analyzed_emails):
             # Print to server terminal for debugging/logging, even though it's returned to client
-            print(f"\n--- Analyzed Email: '{subject}' from '{sender}' ---")
-            print(f"  Sentiment: {analysis.sentiment} (Score: {analysis.sentiment_score:.2f})")
+            print(f"\n--- Analyzed Email: '{email['subject']}' from '{email['sender']}' ---")
+            print(f"  Sentiment: {_describe_sentiment(analysis)}")
             print(f"  Urgency (ML): {analysis.urgency_level} (Score: {analysis.ml_urgency_score})")
             print(f"  Deadline: {analysis.deadline}")
             print("-" * 30)
 
         return analyzed_emails
 
+    except InferenceBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Analysis is overloaded, retry later: {e}", headers={"Retry-After": "5"})
     except HttpError as error:
         raise HTTPException(status_code=error.resp.status, detail=f"Gmail API error: {error.content.decode()}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+async def _stream_analyses(gmail_service, user: str, msg_ids: List[str], stream_format: str) -> AsyncIterator[str]:
+    """
+    Fetches and analyzes messages chunk by chunk, yielding one NDJSON line / SSE event per email.
+    A producer task fetches the next chunk while the current one is being analyzed; the
+    bounded queue keeps it at most two chunks ahead.
+    """
+    def _encode(event: str, payload: Dict) -> str:
+        data = json.dumps(jsonable_encoder(payload))
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {data}\n\n"
+        return data + "\n"
 
-# Background task function (to keep the API response fast)
-async def _process_email_background(
-    email_text: str,
-    email_subject: str,
-    email_sender: str,
-    gmail_credentials: Credentials,
-    calendar_credentials: Credentials # Re-added
+    queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+    chunks = iter_message_chunks(gmail_service, msg_ids)
+    # Set when the stream ends (e.g. the client disconnected): no further chunk is fetched
+    stop = threading.Event()
+
+    def _next_chunk() -> Optional[List[Dict]]:
+        return None if stop.is_set() else next(chunks, None)
+
+    async def _produce():
+        # Cancellation (the consumer is gone) is not caught: nobody would read the sentinel
+        try:
+            while not stop.is_set():
+                emails = await run_in_threadpool(_next_chunk)
+                if emails is None:
+                    break
+                await queue.put(emails)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    producer = asyncio.create_task(_produce())
+    sent = 0
+    try:
+        while True:
+            emails = await queue.get()
+            if emails is None:
+                break
+            if isinstance(emails, Exception):
+                raise emails
+            analyses = await inference_executor.analyze(
+                [f"{e['subject']} {e['body']}" for e in emails], headers=[e.get('headers') for e in emails]
+            )
+            await _record_analyses(user, emails, analyses)
+            for email, analysis in zip(emails, analyses):
+                sent += 1
+                yield _encode("analysis", {
+                    "id": email['id'],
+                    "threadId": email['threadId'],
+                    "sender": email['sender'],
+                    "subject": email['subject'],
+                    "analysis": analysis,
+                })
+        yield _encode("done", {"count": sent})
+    except Exception as e:
+        # The response has already started, so errors are reported in-band
+        yield _encode("error", {"error": str(e), "count": sent})
+    finally:
+        # Stops fetching when the client disconnects early
+        stop.set()
+        producer.cancel()
+
+@router.get("/analyze_stream")
+async def analyze_stream(
+    max_results: int = Query(20, ge=1, le=500),
+    stream_format: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+    credentials: Credentials = Depends(get_google_credentials)
 ):
     """
-    Processes a single email for urgency and creates a calendar event if a very urgent deadline is found.
+    Streaming variant of /analyze_recent: each email's analysis (with its id, sender and
+    subject) is sent as soon as it is ready, as NDJSON lines or Server-Sent Events (format=sse).
     """
-    print(f"Background processing email: '{email_subject}' from '{email_sender}'")
     try:
-        analysis = analyze_email_sentiment(email_text)
-        
-        print(f"  Sentiment: {analysis.sentiment} (Score: {analysis.sentiment_score:.2f})")
-        print(f"  Urgency (ML): {analysis.urgency_level} (Score: {analysis.ml_urgency_score})")
-        print(f"  Deadline: {analysis.deadline}")
-
-        if analysis.ml_urgency_score == 2 and analysis.deadline: # Very Urgent
-            print(f"  -> Detected VERY URGENT email with deadline: '{analysis.deadline}'. Creating calendar event...")
-            start_dt, end_dt = parse_deadline_string(analysis.deadline)
-            
-            if start_dt and end_dt:
-                print(f"  Parsed deadline: Start={start_dt.isoformat()}, End={end_dt.isoformat()}")
-                event_summary = f"[PARTISH] Deadline: {email_subject}"
-                event_description = (f"Email from: {email_sender}\n"
-                                     f"Subject: {email_subject}\n"
-                                     f"Deadline string: {analysis.deadline}\n"
-                                     f"Body preview: {email_text[:200]}...")
-
-                calendar_service = get_calendar_service(calendar_credentials) # Use calendar credentials
-                created_event = create_calendar_event(
-                    calendar_service,
-                    summary=event_summary,
-                    start_datetime=start_dt,
-                    end_datetime=end_dt,
-                    description=event_description
-                )
-                if created_event:
-                    print(f"  Successfully created calendar event: {created_event.get('htmlLink')}")
-                else:
-                    print("  Failed to create calendar event.")
-            else:
-                print(f"  Could not parse deadline '{analysis.deadline}' into valid dates. Skipping calendar event.")
-        elif analysis.ml_urgency_score == 1 and analysis.deadline: # Urgent
-            print(f"  -> Detected URGENT email with deadline: '{analysis.deadline}'. Consider creating calendar event...")
-            start_dt, end_dt = parse_deadline_string(analysis.deadline)
-            if start_dt and end_dt:
-                print(f"  Parsed deadline: Start={start_dt.isoformat()}, End={end_dt.isoformat()}")
-            else:
-                print(f"  Could not parse deadline '{analysis.deadline}' into valid dates.")
+        gmail_service = await run_in_threadpool(get_gmail_service, credentials)
+        msg_ids = await run_in_threadpool(list_message_ids, gmail_service, max_results=max_results)
+        user = await account_for(credentials, gmail_service)
+    except HttpError as error:
+        raise HTTPException(status_code=error.resp.status, detail=f"Gmail API error: {error.content.decode()}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_analyses(gmail_service, user, msg_ids, stream_format),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _calendar_event_id(user: str, message_id: str) -> str:
+    # Same event id for every attempt of a message, so a retried job never creates a second event
+    return "partish" + hashlib.sha1(f"{user}:{message_id}".encode('utf-8')).hexdigest()
+
+# Background job action (run by the priority scheduler's workers)
+async def process_email_background(user: str, email: Dict, analysis: EmailAnalysis) -> Dict:
+    """
+    Acts on a single analyzed email: creates a calendar event if a very urgent deadline is found.
+    Returns what was done; raises when the calendar event could not be created, so the job is retried.
+    """
+    email_subject, email_sender = email['subject'], email['sender']
+    email_text = f"{email_subject} {email['body']}"
+    print(f"Background processing email: '{email_subject}' from '{email_sender}'")
+    print(f"  Sentiment: {_describe_sentiment(analysis)}")
+    print(f"  Urgency (ML): {analysis.urgency_level} (Score: {analysis.ml_urgency_score})")
+    print(f"  Deadline: {analysis.deadline}")
+
+    if analysis.ml_urgency_score == 2 and analysis.deadline: # Very Urgent
+        print(f"  -> Detected VERY URGENT email with deadline: '{analysis.deadline}'. Creating calendar event...")
+        start_dt, end_dt = parse_deadline_string(analysis.deadline)
+
+        if start_dt and end_dt:
+            print(f"  Parsed deadline: Start={start_dt.isoformat()}, End={end_dt.isoformat()}")
+            event_summary = f"[PARTISH] Deadline: {email_subject}"
+            event_description = (f"Email from: {email_sender}\n"
+                                 f"Subject: {email_subject}\n"
+                                 f"Deadline string: {analysis.deadline}\n"
+                                 f"Body preview: {email_text[:200]}...")
+
+            credentials = await run_in_threadpool(credentials_for, user)
+            if credentials is None:
+                raise RuntimeError(f"No credentials for {user}.")
+            calendar_service = await run_in_threadpool(get_calendar_service, credentials) # Use calendar credentials
+            created_event = await run_in_threadpool(
+                create_calendar_event,
+                calendar_service,
+                summary=event_summary,
+                start_datetime=start_dt,
+                end_datetime=end_dt,
+                description=event_description,
+                event_id=_calendar_event_id(user, email['id'])
+            )
+            if not created_event:
+                raise RuntimeError("Failed to create calendar event.")
+            print(f"  Successfully created calendar event: {created_event.get('htmlLink')}")
+            return {"action": "calendar_event", "event_id": created_event.get('id'), "link": created_event.get('htmlLink')}
+        print(f"  Could not parse deadline '{analysis.deadline}' into valid dates. Skipping calendar event.")
+        return {"action": "none", "reason": "unparsed_deadline"}
+    elif analysis.ml_urgency_score == 1 and analysis.deadline: # Urgent
+        print(f"  -> Detected URGENT email with deadline: '{analysis.deadline}'. Consider creating calendar event...")
+        start_dt, end_dt = parse_deadline_string(analysis.deadline)
+        if start_dt and end_dt:
+            print(f"  Parsed deadline: Start={start_dt.isoformat()}, End={end_dt.isoformat()}")
         else:
-            print("  -> No urgent deadline detected or email not Very Urgent. Skipping calendar event creation.")
+            print(f"  Could not parse deadline '{analysis.deadline}' into valid dates.")
+        return {"action": "none", "reason": "urgent"}
+    print("  -> No urgent deadline detected or email not Very Urgent. Skipping calendar event creation.")
+    return {"action": "none"}
+
+async def analyze_jobs(user: str, emails: List[Dict]) -> List[EmailAnalysis]:
+    """Analyzes the emails of a batch of jobs and records the analyses."""
+    # Background jobs wait for a free inference slot instead of being rejected
+    analyses = await inference_executor.analyze(
+        [f"{e['subject']} {e['body']}" for e in emails], timeout=None, headers=[e.get('headers') for e in emails]
+    )
+    await _record_analyses(user, emails, analyses)
+    return analyses
+
+async def _schedule_inbox(user: str, emails: List[Dict]) -> List[Dict]:
+    """
+    Queues fetched emails (parsed messages, see gmail_access.parse_message) as durable jobs:
+    the most urgent-looking ones are analyzed and acted on first. Returns job id, pre-score and
+    whether the job is new, per email.
+    """
+    try:
+        urgent_senders = await run_in_threadpool(analysis_store.urgent_senders, user)
     except Exception as e:
-        print(f"Error processing email in background: {e}")
+        print(f"Could not load the urgent senders of {user}: {e}")
+        urgent_senders = set()
+    return await priority_scheduler.submit(user, emails, urgent_senders)
 
 @router.post("/process_inbox")
 async def process_user_inbox(
-    background_tasks: BackgroundTasks,
-    gmail_credentials: Credentials = Depends(get_google_credentials),
-    calendar_credentials: Credentials = Depends(get_google_credentials) # Re-added
+    incremental: bool = False,
+    max_results: int = Query(DEFAULT_MAX_RESULTS, ge=1, le=500),
+    gmail_credentials: Credentials = Depends(get_google_credentials)
 ):
     """
     Fetches recent emails, analyzes them for urgency and deadlines,
     and automatically processes them (calendar event creation is currently disabled).
-    Runs in the background to avoid blocking the API response.
+    Runs in the background as durable jobs (see /api/jobs/{id}), most urgent-looking emails first.
+    A message that already has a job is not processed again.
+    With incremental=true only messages that arrived since the previous incremental run are processed.
     """
     print("Initiating background inbox processing...")
     try:
-        gmail_service = get_gmail_service(gmail_credentials)
+        gmail_service = await run_in_threadpool(get_gmail_service, gmail_credentials)
         
-        results = gmail_service.users().messages().list(userId='me', maxResults=5).execute()
-        messages = results.get('messages', [])
+        sync = None
+        if incremental:
+            sync = await run_in_threadpool(sync_inbox, gmail_service, max_results=max_results, consumer='process_inbox')
+            emails, user = sync['messages'], sync['user']
+            print(f"{sync['mode'].capitalize()} sync for {sync['user']}: {len(emails)} new messages (historyId {sync['history_id']}).")
+            await remember_credentials(user, gmail_credentials)
+        else:
+            emails = await run_in_threadpool(fetch_recent_messages, gmail_service, max_results=max_results)
+            user = await account_for(gmail_credentials, gmail_service)
 
-        if not messages:
+        if not emails:
+            await _save_sync_checkpoint(sync)
             return {"message": "No new messages found to process."}
 
-        for msg_obj in messages:
-            msg_id = msg_obj['id']
-            sender, subject, body = get_email_details(gmail_service, msg_id)
-            full_email_text = f"{subject} {body}"
-            
-            # Offload heavy processing to a background task
-            background_tasks.add_task(
-                _process_email_background,
-                full_email_text,
-                subject,
-                sender,
-                gmail_credentials, # Pass credentials explicitly
-                calendar_credentials # Pass credentials explicitly
-            )
-        
-        return {"message": f"Processing of {len(messages)} messages initiated in background."}
+        # Offload heavy processing (analysis + calendar events) to the durable job queue
+        jobs = await _schedule_inbox(user, emails)
+        created = sum(job['created'] for job in jobs)
+        # The jobs are durable from here on, so the messages need not be synced again
+        await _save_sync_checkpoint(sync)
+
+        return {
+            "message": f"Processing of {created} messages initiated in background "
+                       f"({len(emails) - created} already had a job).",
+            "jobs": [
+                {"job_id": job['job_id'], "id": email['id'], "subject": email['subject'],
+                 "prescore": job['prescore'], "created": job['created']}
+                for email, job in sorted(zip(emails, jobs), key=lambda pair: -pair[1]['prescore'])
+            ],
+        }
 
     except HttpError as error:
         raise HTTPException(status_code=error.resp.status, detail=f"Gmail API error: {error.content.decode()}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@router.post("/backfill")
+async def start_backfill(
+    restart: bool = False,
+    query: Optional[str] = None,
+    credentials: Credentials = Depends(get_google_credentials)
+):
+    """
+    Starts (or resumes from its checkpoint) a backfill job that analyzes the whole mailbox,
+    page by page. restart=true discards the checkpoint; query restricts it to a Gmail search.
+    """
+    try:
+        gmail_service = await run_in_threadpool(get_gmail_service, credentials)
+        user = (await run_in_threadpool(get_profile, gmail_service))['emailAddress']
+
+        task = _backfill_tasks.get(user)
+        if task is not None and not task.done():
+            return {"message": "Backfill already running.", **_backfill_jobs[user].status()}
+
+        loop = asyncio.get_running_loop()
+
+        def _analyze(texts: List[str], headers: Optional[List[Optional[Dict]]] = None) -> List[EmailAnalysis]:
+            # Called from the job's thread; the analysis itself runs in the inference workers
+            return asyncio.run_coroutine_threadsafe(
+                inference_executor.analyze(texts, timeout=None, headers=headers), loop
+            ).result()
+
+        job = await run_in_threadpool(
+            lambda: BackfillJob(gmail_service, _analyze, query=query, restart=restart, store=analysis_store)
+        )
+        _backfill_jobs[user] = job
+        _backfill_tasks[user] = asyncio.create_task(run_in_threadpool(job.run))
+        return {"message": "Backfill started.", **job.status()}
+
+    except HttpError as error:
+        raise HTTPException(status_code=error.resp.status, detail=f"Gmail API error: {error.content.decode()}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+async def _backfill_job_for(credentials: Credentials) -> BackfillJob:
+    gmail_service = await run_in_threadpool(get_gmail_service, credentials)
+    user = (await run_in_threadpool(get_profile, gmail_service))['emailAddress']
+    job = _backfill_jobs.get(user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No backfill has been started in this session.")
+    return job
+
+@router.get("/backfill")
+async def backfill_status(credentials: Credentials = Depends(get_google_credentials)):
+    """Reports the backfill's progress: messages processed, pages, msgs/s and ETA."""
+    return (await _backfill_job_for(credentials)).status()
+
+@router.post("/backfill/stop")
+async def stop_backfill(credentials: Credentials = Depends(get_google_credentials)):
+    """Stops the backfill after its current batch; POST /backfill resumes it."""
+    job = await _backfill_job_for(credentials)
+    job.stop()
+    return {"message": "Backfill stopping after the current batch.", **job.status()}
+
+async def stop_backfills():
+    """Stops every running backfill at its next checkpoint (called on app shutdown)."""
+    for job in _backfill_jobs.values():
+        job.stop()
+    await asyncio.gather(*_backfill_tasks.values(), return_exceptions=True)
+
+@router.get("/analyses")
+async def query_analyses(
+    urgency: Optional[List[str]] = Query(None, description="Urgency levels, e.g. urgency=Very Urgent&urgency=Urgent"),
+    deadline_within_days: Optional[int] = Query(None, ge=0, le=366, description="Deadline between now and N days from now"),
+    deadline_from: Optional[datetime] = None,
+    deadline_to: Optional[datetime] = None,
+    sender: Optional[str] = None,
+    received_after: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    credentials: Credentials = Depends(get_google_credentials)
+):
+    """
+    Stored analyses of the user's mail (from every analyze/process/stream/backfill run), without
+    touching Gmail or the models. E.g. very urgent mail due this week:
+    /analyses?urgency=Very Urgent&deadline_within_days=7
+    """
+    if deadline_within_days is not None:
+        deadline_from = datetime.now()
+        deadline_to = deadline_from + timedelta(days=deadline_within_days)
+    user = await account_for(credentials)
+    return await run_in_threadpool(
+        analysis_store.query, user,
+        urgency_levels=urgency, deadline_from=deadline_from, deadline_to=deadline_to,
+        sender=sender, received_after=received_after, limit=limit, offset=offset
+    )
+
+@router.get("/analyses/summary")
+async def analyses_summary(credentials: Credentials = Depends(get_google_credentials)):
+    """Counts of stored analyses per urgency level, of upcoming deadlines and of mail never scanned for one."""
+    user = await account_for(credentials)
+    return await run_in_threadpool(analysis_store.summary, user)
+
+@router.get("/analyses/{message_id}")
+async def get_analysis(message_id: str, credentials: Credentials = Depends(get_google_credentials)):
+    """The stored analysis of one message."""
+    user = await account_for(credentials)
+    stored = await run_in_threadpool(analysis_store.get, user, message_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"No stored analysis for message {message_id}.")
+    return stored
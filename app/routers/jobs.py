@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Literal, Optional
+from google.oauth2.credentials import Credentials
+
+from app.accounts import account_for
+from app.routers.auth import get_google_credentials
+from src.job_queue import job_queue
+
+router = APIRouter()
+
+@router.get("", response_model=List[Dict])
+async def list_jobs(
+    status: Optional[Literal["queued", "running", "done", "failed"]] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    credentials: Credentials = Depends(get_google_credentials)
+):
+    """Background jobs of the authenticated account (newest first), optionally with a given status."""
+    user = await account_for(credentials)
+    return await run_in_threadpool(job_queue.list, user, status, limit, offset)
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, credentials: Credentials = Depends(get_google_credentials)):
+    """
+    Status of one background job: attempts, next retry time, last error, the analysis and
+    the result of its action (e.g. the calendar event created).
+    """
+    user = await account_for(credentials)
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None or job['user'] != user:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}.")
+    return job
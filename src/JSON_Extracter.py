@@ -1,88 +1,73 @@
 import re
-import spacy
-import pickle
-import os
+import time
 import numpy as np
 from pydantic import BaseModel, Field
-from typing import Optional, List, Tuple
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-
-# Load the spaCy medium model
-try:
-    nlp = spacy.load("en_core_web_md")
-except OSError:
-    print("Downloading spaCy model 'en_core_web_md'...")
-    # Using spacy.cli.download directly
-    spacy.cli.download("en_core_web_md")
-    nlp = spacy.load("en_core_web_md")
-
-# Global variables for lazy loading
-_clf = None
-_vectorizer = None
-
-# New terms for stronger signals (must match trainer)
-STRONG_URGENT_TERMS_SIGNAL = ["urgent", "asap", "immediate", "critical", "deadline"]
-APPLICATION_TERMS = ["application", "applicant", "admissions", "apply", "form"]
+from typing import TYPE_CHECKING, Dict, Optional, List, Tuple
+from src.keyword_matcher import KEYWORD_MATCHER, VERY_URGENT_TERMS, URGENT_TERMS, PROMO_TERMS
+from src.model_registry import registry
+from src.cascade import screen_emails, CASCADE_ENABLED, CASCADE_CONFIDENCE
+
+if TYPE_CHECKING:
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+# Words that make a DATE entity a deadline, and the phrase after a deadline cue as fallback
+DEADLINE_DATE_WORDS = ["tomorrow", "friday", "monday", "week", "day", "eod"]
+DEADLINE_PHRASE_RE = re.compile(r'(?:deadline|due|by)\s+(.*?)(?:\.|\n|$)', re.IGNORECASE)
 
 class EmailAnalysis(BaseModel):
     """
     Represents the sentiment analysis, keyword extraction, and NLP-based entity recognition from an email.
     """
-    sentiment: str = "neutral"
-    sentiment_score: float = 0.0
+    # The NLP fields (sentiment, entities, dates, deadline) are None when they were not computed,
+    # e.g. for tier-0 emails; an empty list or a None deadline from the full pipeline means "none found"
+    sentiment: Optional[str] = "neutral"
+    sentiment_score: Optional[float] = 0.0
     urgency_level: str = "Regular"
     ml_urgency_score: Optional[int] = None # Urgency score predicted by ML model
     keywords: List[str] = Field(default_factory=list)
     deadline: Optional[str] = None
-    named_entities: List[str] = Field(default_factory=list) # New field for named entities
-    dates: List[str] = Field(default_factory=list) # New field for dates
+    deadline_span: Optional[Tuple[int, int]] = None # (start, end) char offsets of the deadline in the analyzed text
+    named_entities: Optional[List[str]] = Field(default_factory=list) # New field for named entities
+    dates: Optional[List[str]] = Field(default_factory=list) # New field for dates
+    tier: int = 1 # 0 = settled as Regular by the cascade screen (NLP fields not computed), 1 = full pipeline
+
+    @property
+    def nlp_analyzed(self) -> bool:
+        """Whether sentiment, entities, dates and the deadline were extracted from the text."""
+        return self.named_entities is not None
 
-def check_semantic_similarity(text_lower: str, doc, target_words: List[str], threshold: float = 0.7) -> bool:
+def extract_deadline(email_body: str, doc, date_ents: list) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
     """
-    Checks for semantic similarity or exact regex match.
-    Uses 'text_lower' for fast regex check and 'doc' for semantic similarity.
+    Finds the deadline in an already-parsed email: the first DATE entity that names a deadline
+    day, else the phrase after "deadline"/"due"/"by" (or the DATE entity inside it).
+    Works on spans of 'doc' only, so no second spaCy call is needed.
+    Returns the deadline text and its (start, end) char offsets in 'email_body'.
     """
-    # Fast regex check first
-    if any(re.search(r'\b' + re.escape(word) + r'\b', text_lower) for word in target_words):
-        return True
-
-    # Semantic check
-    for token in doc:
-        # filter out stops and punctuation for efficiency
-        if token.is_stop or token.is_punct:
-            continue
-            
-        for target_word in target_words:
-            if token.has_vector and nlp.vocab[target_word].has_vector:
-                if token.similarity(nlp.vocab[target_word]) > threshold:
-                    return True
-    return False
-
-def analyze_email_sentiment(email_body: str) -> EmailAnalysis:
+    for ent in date_ents:
+        if any(word in ent.text.lower() for word in DEADLINE_DATE_WORDS):
+            return ent.text, (ent.start_char, ent.end_char)
+
+    deadline_match = DEADLINE_PHRASE_RE.search(email_body)
+    if not deadline_match:
+        return None, None
+    start, end = deadline_match.span(1)
+    # Offsets of the stripped phrase
+    phrase = email_body[start:end]
+    start += len(phrase) - len(phrase.lstrip())
+    end -= len(phrase) - len(phrase.rstrip())
+
+    phrase_span = doc.char_span(start, end, alignment_mode="expand") if end > start else None
+    if phrase_span is not None:
+        for ent in phrase_span.ents:
+            if ent.label_ == "DATE":
+                return ent.text, (ent.start_char, ent.end_char)
+    return email_body[start:end], (start, end)
+
+def _analyze_doc(email_body: str, doc, analyzer: "SentimentIntensityAnalyzer") -> Tuple[EmailAnalysis, List[float]]:
     """
-    Analyzes the email body for sentiment, urgency keywords, deadlines, and named entities using spaCy.
+    Runs the rule-based analysis for one already-parsed email.
+    Returns the analysis (without the ML prediction) and its 6 heuristic features.
     """
-    global _clf, _vectorizer
-
-    # Lazy load models
-    if _clf is None or _vectorizer is None:
-        MODEL_PATH = 'models/urgency_model.pkl'
-        VECTORIZER_PATH = 'models/vectorizer.pkl'
-        if os.path.exists(MODEL_PATH) and os.path.exists(VECTORIZER_PATH):
-            try:
-                with open(MODEL_PATH, 'rb') as f:
-                    _clf = pickle.load(f)
-                with open(VECTORIZER_PATH, 'rb') as f:
-                    _vectorizer = pickle.load(f)
-            except Exception as e:
-                print(f"Error loading models: {e}")
-                _clf = None
-                _vectorizer = None
-        else:
-            # Models not found, proceed without ML
-            pass
-
-    analyzer = SentimentIntensityAnalyzer()
     sentiment_scores = analyzer.polarity_scores(email_body)
 
     # Determine sentiment based on compound score
@@ -93,46 +78,37 @@ def analyze_email_sentiment(email_body: str) -> EmailAnalysis:
     else:
         sentiment = "neutral"
 
-    # Urgency keyword detection (now enhanced with semantic similarity)
-    very_urgent_terms = ["critical", "immediate", "asap", "urgent", "now", "crucial"]
-    urgent_terms = ["important", "deadline", "soon", "tomorrow", "end of day", "eod", "priority"]
-    promo_terms = ["newsletter", "promo", "discount", "offer", "sale", "free"]
-
     found_keywords = []
     urgency_level = "Regular"
 
-    # Use spaCy for more advanced NLP
-    doc = nlp(email_body) # This is the doc for the full email_body
-    email_lower = email_body.lower() # For regex checks
+    email_lower = email_body.lower() # For keyword checks
+    # All keyword categories in one pass (same matcher as the trainer)
+    keyword_hits = KEYWORD_MATCHER.match(email_lower)
 
+    # Entities indexed by label once; everything below reuses this single parse of the email
+    ents_by_label: Dict[str, list] = {}
+    for ent in doc.ents:
+        ents_by_label.setdefault(ent.label_, []).append(ent)
+    date_ents = ents_by_label.get("DATE", [])
     named_entities = [ent.text for ent in doc.ents]
-    dates = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
+    dates = [ent.text for ent in date_ents]
 
     # --- Rule-based urgency calculation (for initial urgency_level & heuristic features) ---
     
     # 1. Has Explicit Deadline
-    has_date_entity = any(ent.label_ == "DATE" for ent in doc.ents)
-    has_deadline_keyword = bool(re.search(r'\b(deadline|due by|due on|submit by|before)\b', email_lower))
+    has_date_entity = bool(date_ents)
+    has_deadline_keyword = "deadline_keyword" in keyword_hits
     has_explicit_deadline = 1.0 if (has_date_entity and has_deadline_keyword) else 0.0
     
-    # 2. Keywords Count (general intensity)
-    keyword_intensity = 0.0
-    if check_semantic_similarity(email_lower, doc, very_urgent_terms):
-        keyword_intensity += 1.0
-    if check_semantic_similarity(email_lower, doc, urgent_terms):
-        keyword_intensity += 1.0
-    if check_semantic_similarity(email_lower, doc, promo_terms):
-        keyword_intensity += 1.0
+    # 2. Keywords Count (general intensity), enhanced with semantic similarity
+    # One call scores all categories (very urgent, urgent, promo) at once
+    keyword_intensity = float(len(registry.semantic_lexicon.match(doc, keyword_hits)))
 
     # 3. Has Strong Urgent Word (specific)
-    has_strong_urgent_word = 0.0
-    if any(re.search(r'\b' + re.escape(word) + r'\b', email_lower) for word in STRONG_URGENT_TERMS_SIGNAL):
-        has_strong_urgent_word = 1.0
+    has_strong_urgent_word = 1.0 if "strong_urgent" in keyword_hits else 0.0
 
     # 4. Has Application Word
-    has_application_word = 0.0
-    if any(re.search(r'\b' + re.escape(word) + r'\b', email_lower) for word in APPLICATION_TERMS):
-        has_application_word = 1.0
+    has_application_word = 1.0 if "application" in keyword_hits else 0.0
 
     # Set rule-based urgency_level based on new features
     if has_strong_urgent_word or (has_explicit_deadline and keyword_intensity >= 1.0):
@@ -144,64 +120,138 @@ def analyze_email_sentiment(email_body: str) -> EmailAnalysis:
 
     # Populate found_keywords based on categories
     if urgency_level == "Very Urgent":
-        found_keywords.extend(very_urgent_terms)
+        found_keywords.extend(VERY_URGENT_TERMS)
     elif urgency_level == "Urgent":
-        found_keywords.extend(urgent_terms)
+        found_keywords.extend(URGENT_TERMS)
     elif urgency_level == "Newsletter/Promo":
-        found_keywords.extend(promo_terms)
-
-    # Basic deadline extraction
-    deadline = next((d for d in dates if any(keyword in d.lower() for keyword in ["tomorrow", "friday", "monday", "week", "day", "eod"])), None)
-    if not deadline:
-        deadline_match = re.search(r'(?:deadline|due|by)\s+(.*?)(?:\.|\n|$)', email_body, re.IGNORECASE)
-        if deadline_match:
-            deadline_phrase = deadline_match.group(1).strip()
-            deadline_doc = nlp(deadline_phrase)
-            date_ents = [ent.text for ent in deadline_doc.ents if ent.label_ == "DATE"]
-            deadline = date_ents[0] if date_ents else deadline_phrase
-    
+        found_keywords.extend(PROMO_TERMS)
+
+    deadline, deadline_span = extract_deadline(email_body, doc, date_ents)
+
+    # Heuristic features (must match trainer's order and count: 6 features)
+    h_features = [
+        sentiment_scores['compound'],
+        has_explicit_deadline,
+        keyword_intensity,
+        float(len(named_entities)),
+        has_strong_urgent_word,
+        has_application_word
+    ]
+
+    analysis = EmailAnalysis(
+        sentiment=sentiment,
+        sentiment_score=sentiment_scores['compound'],
+        urgency_level=urgency_level,
+        keywords=found_keywords,
+        deadline=deadline,
+        deadline_span=deadline_span,
+        named_entities=named_entities,
+        dates=dates
+    )
+
+    return analysis, h_features
+
+def analyze_emails_batch(
+    texts: List[str],
+    batch_size: int = 64,
+    n_process: int = 1,
+    headers: Optional[List[Optional[Dict]]] = None,
+    cascade: bool = CASCADE_ENABLED,
+    cascade_confidence: float = CASCADE_CONFIDENCE
+) -> List[EmailAnalysis]:
+    """
+    Analyzes many emails at once. Documents are streamed through nlp.pipe, and the
+    ML urgency model scores the whole batch with a single TF-IDF matrix and a single predict call.
+    With the cascade on (PARTISH_CASCADE=1) and a trained screen, emails the tier-0 screen
+    settles as Regular skip spaCy, VADER and the urgency model, and their NLP fields are None;
+    'headers' (one dict per email, optional) lets the screen recognize bulk mail.
+    Returns one EmailAnalysis per input text, in the same order.
+    """
+    if not texts:
+        return []
+
+    nlp = registry.nlp
+    analyzer = registry.sentiment_analyzer
+    predictor = registry.predictor
+    vectorizer = registry.vectorizer
+    screen = registry.screen if cascade else None
+
+    # Tier 0: the TF-IDF matrix is computed once for the whole batch and reused by the urgency model
+    X_text_all = None
+    settled = np.zeros(len(texts), dtype=bool)
+    if screen is not None and vectorizer is not None:
+        try:
+            X_text_all = vectorizer.transform(texts)
+            keyword_hits = [KEYWORD_MATCHER.match(text.lower()) for text in texts]
+            settled = screen_emails(screen, X_text_all, keyword_hits, headers, cascade_confidence)
+        except Exception as e:
+            print(f"Cascade screen failed: {e}")
+    escalated = np.flatnonzero(~settled)
+    escalated_texts = [texts[i] for i in escalated]
+
+    # Tier 1: the full pipeline
+    analyses = []
+    h_rows = []
+    for email_body, doc in zip(escalated_texts, nlp.pipe(escalated_texts, batch_size=batch_size, n_process=n_process)):
+        analysis, h_features = _analyze_doc(email_body, doc, analyzer)
+        analyses.append(analysis)
+        h_rows.append(h_features)
+
     # ML-based Urgency Prediction
-    ml_urgency_score = None
-    if _clf and _vectorizer:
+    if analyses and predictor is not None and vectorizer is not None:
+        # Deferred import; scipy is already loaded along with the unpickled vectorizer
+        from scipy import sparse
         try:
-            # TF-IDF Features (Subject + Body) - Assuming email_body represents full text here
-            X_text = _vectorizer.transform([email_body]).toarray()
+            # TF-IDF Features (Subject + Body) - Assuming each text represents the full email here
+            X_text = X_text_all[escalated] if X_text_all is not None else vectorizer.transform(escalated_texts)
             
-            # Heuristic features (must match trainer's order and count: 6 features)
-            h_features = np.array([[
-                sentiment_scores['compound'],
-                has_explicit_deadline,
-                keyword_intensity,
-                float(len(named_entities)),
-                has_strong_urgent_word,
-                has_application_word
-            ]])
-            
-            # Combine TF-IDF (94) + Heuristic (6) = 100 features
-            X = np.hstack([X_text, h_features])
+            # Combine TF-IDF + Heuristic (6) features, kept sparse (must match trainer's layout)
+            X = sparse.hstack([X_text, sparse.csr_matrix(np.array(h_rows))], format='csr')
             
             # Predict
-            ml_urgency_score = int(_clf.predict(X)[0])
+            ml_urgency_scores = predictor.predict(X)
             
             # Override or combine with heuristic urgency
             ml_urgency_map = {0: "Regular", 1: "Urgent", 2: "Very Urgent"}
-            urgency_level = ml_urgency_map.get(ml_urgency_score, urgency_level)
+            for analysis, score in zip(analyses, ml_urgency_scores):
+                analysis.ml_urgency_score = int(score)
+                analysis.urgency_level = ml_urgency_map.get(analysis.ml_urgency_score, analysis.urgency_level)
             
         except Exception as e:
             print(f"ML prediction failed: {e}")
-            ml_urgency_score = None
+            for analysis in analyses:
+                analysis.ml_urgency_score = None
+
+    if not settled.any():
+        return analyses
+    results: List[EmailAnalysis] = [
+        EmailAnalysis(
+            sentiment=None, sentiment_score=None, urgency_level="Regular", ml_urgency_score=0,
+            named_entities=None, dates=None, tier=0
+        )
+        for _ in texts
+    ]
+    for i, analysis in zip(escalated, analyses):
+        results[i] = analysis
+    return results
 
-    analysis = EmailAnalysis(
-        sentiment=sentiment,
-        sentiment_score=sentiment_scores['compound'],
-        urgency_level=urgency_level,
-        ml_urgency_score=ml_urgency_score,
-        keywords=found_keywords,
-        deadline=deadline,
-        named_entities=named_entities,
-        dates=dates
-    )
+def analyze_email_sentiment(email_body: str) -> EmailAnalysis:
+    """
+    Analyzes the email body for sentiment, urgency keywords, deadlines, and named entities using spaCy.
+    """
+    return analyze_emails_batch([email_body])[0]
+
+WARMUP_EMAIL = "URGENT: please review the attached contract and reply by Friday. Thanks!"
 
+def warmup() -> EmailAnalysis:
+    """
+    Loads every model through the registry and runs one throwaway analysis, so the
+    first real request does not pay for lazy initialization. Records the warmup time.
+    """
+    registry.load()
+    start = time.perf_counter()
+    analysis = analyze_email_sentiment(WARMUP_EMAIL)
+    registry.record_warmup((time.perf_counter() - start) * 1000)
     return analysis
 
 if __name__ == '__main__':
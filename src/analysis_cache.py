@@ -0,0 +1,323 @@
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from src.cascade import bulk_sender
+
+# Cache in front of the analyzer for templated mail (newsletters, invoices, recruiter pings):
+# an exact content-hash LRU, plus a SimHash index that reuses the urgency of a near-duplicate
+# email (same template, different greeting or signature). Fields that depend on the exact text
+# (entities, dates, deadline and its span, sentiment) are only ever reused from an exact hit.
+
+# Cached analyses (0 disables the cache)
+ANALYSIS_CACHE_SIZE = int(os.getenv("PARTISH_ANALYSIS_CACHE_SIZE", "10000"))
+# Max differing SimHash bits (of 64) for a near-duplicate hit (negative = exact hits only,
+# at most MAX_NEAR_DUP_DISTANCE)
+NEAR_DUP_DISTANCE = int(os.getenv("PARTISH_NEAR_DUP_DISTANCE", "3"))
+
+SIMHASH_BITS = 64
+# The 64-bit SimHash is split into 4 bands of 16 bits: two hashes within 3 differing bits
+# share at least one band exactly, so only emails in the same bucket need to be compared
+_SIMHASH_BANDS = 4
+# A larger distance could miss near-duplicates that share no band, so it is refused
+MAX_NEAR_DUP_DISTANCE = _SIMHASH_BANDS - 1
+_BAND_BITS = SIMHASH_BITS // _SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+# Tokens that decide the deadline and dates of an analysis: a near-duplicate must have exactly
+# the same ones, so "due by Friday" never reuses the analysis of "due by Monday"
+_DATE_WORDS = {
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun',
+    'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+    'september', 'october', 'november', 'december',
+    'today', 'tonight', 'tomorrow', 'yesterday', 'eod', 'eow', 'week', 'month', 'year',
+}
+
+# Fields of an analysis computed from the exact text; a near-duplicate hit leaves them None
+# ("not computed"), like an email settled by the cascade screen
+_TEXT_FIELDS = ("sentiment", "sentiment_score", "deadline", "deadline_span", "named_entities", "dates")
+
+def header_signature(headers: Optional[Dict]) -> str:
+    """The part of an email's headers that can change its analysis (the cascade screen's bulk-mail check)."""
+    return "bulk" if bulk_sender(headers) else ""
+
+def content_key(text: str, signature: str = "") -> bytes:
+    h = hashlib.blake2b(text.encode('utf-8'), digest_size=16)
+    h.update(b'\0' + signature.encode('utf-8'))
+    return h.digest()
+
+def _tokens(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash over the word unigrams and bigrams of an email."""
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not features:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little') for f in features],
+        dtype=np.uint64
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    # Each bit of the SimHash is the majority vote of that bit over all features
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    return int(np.packbits(votes > 0, bitorder='little').view('<u8')[0])
+
+def _volatile_signature(tokens: List[str]) -> Tuple[str, ...]:
+    return tuple(t for t in tokens if t in _DATE_WORDS or any(c.isdigit() for c in t))
+
+def _copy(analysis):
+    # Callers may modify the analysis they get; its list fields are the only mutable parts
+    return analysis.model_copy(update={k: list(v) for k, v in analysis.__dict__.items() if isinstance(v, list)})
+
+def _near_copy(analysis):
+    """The urgency part of another email's analysis (level, ML score, keywords)."""
+    update = {field: None for field in _TEXT_FIELDS}
+    update["keywords"] = list(analysis.keywords)
+    return analysis.model_copy(update=update)
+
+class AnalysisCache:
+    """
+    LRU of analyses keyed by the exact email text and header signature (bounded to
+    'max_entries', least recently used evicted first), with a banded SimHash index for
+    near-duplicates: an email within 'max_distance' bits of a cached one, with the same numbers,
+    date words and header signature, gets that email's urgency (see _near_copy). Analyses with a
+    deadline are never served to near-duplicates, so a deadline is not lost to a near hit.
+    Tracks hits, misses and the analysis time they saved.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE, max_distance: int = NEAR_DUP_DISTANCE):
+        self.max_entries = max(0, max_entries)
+        if max_distance > MAX_NEAR_DUP_DISTANCE:
+            raise ValueError(
+                f"Near-duplicate distance {max_distance} is above the supported maximum of "
+                f"{MAX_NEAR_DUP_DISTANCE} bits (PARTISH_NEAR_DUP_DISTANCE / --max-distance)."
+            )
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        # key -> (analysis, simhash, volatile signature)
+        self._entries: "OrderedDict[bytes, Tuple[object, int, Tuple[str, ...]]]" = OrderedDict()
+        self._bands: Dict[Tuple[int, int], Set[bytes]] = {}
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.analysis_seconds = 0.0 # Time spent analyzing misses
+        self.analyzed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _band_keys(self, fingerprint: int):
+        for band in range(_SIMHASH_BANDS):
+            yield band, (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK
+
+    def _probe(self, text: str, key: bytes, signature: str) -> Tuple[bytes, int, Tuple[str, ...]]:
+        tokens = _tokens(text)
+        return key, simhash(tokens), (signature,) + _volatile_signature(tokens)
+
+    def lookup(self, text: str, headers: Optional[Dict] = None):
+        """
+        Returns (analysis, probe): a copy of the cached analysis of 'text' (or the urgency part
+        of a near-duplicate's), or None, and the email's fingerprints to hand to put() after a miss.
+        """
+        if not self.enabled:
+            return None, None
+        signature = header_signature(headers)
+        key = content_key(text, signature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return _copy(entry[0]), None
+
+        probe = self._probe(text, key, signature)
+        with self._lock:
+            if self.max_distance >= 0:
+                _, fingerprint, volatile = probe
+                best_key, best_distance = None, self.max_distance + 1
+                for band_key in self._band_keys(fingerprint):
+                    for candidate in self._bands.get(band_key, ()):
+                        candidate_analysis, candidate_hash, candidate_volatile = self._entries[candidate]
+                        distance = bin(fingerprint ^ candidate_hash).count('1')
+                        if (distance < best_distance and candidate_volatile == volatile
+                                and candidate_analysis.deadline is None):
+                            best_key, best_distance = candidate, distance
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.near_hits += 1
+                    return _near_copy(self._entries[best_key][0]), probe
+
+            self.misses += 1
+            return None, probe
+
+    def get(self, text: str, headers: Optional[Dict] = None):
+        """A copy of the cached analysis of 'text' (or the urgency part of a near-duplicate's), or None."""
+        return self.lookup(text, headers)[0]
+
+    def put(self, text: str, analysis, probe: Optional[Tuple] = None, headers: Optional[Dict] = None):
+        if not self.enabled:
+            return
+        if probe is None:
+            signature = header_signature(headers)
+            probe = self._probe(text, content_key(text, signature), signature)
+        key, fingerprint, volatile = probe
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (_copy(analysis), fingerprint, volatile)
+            for band_key in self._band_keys(fingerprint):
+                self._bands.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, old_hash, _) = self._entries.popitem(last=False)
+                for band_key in self._band_keys(old_hash):
+                    bucket = self._bands.get(band_key)
+                    if bucket is not None:
+                        bucket.discard(old_key)
+                        if not bucket:
+                            del self._bands[band_key]
+                self.evictions += 1
+
+    def record_batch_duplicates(self, n_emails: int):
+        """Misses that repeat a text of the same batch are analyzed once: count them as exact hits."""
+        with self._lock:
+            self.misses -= n_emails
+            self.exact_hits += n_emails
+
+    def record_analysis_time(self, n_emails: int, seconds: float):
+        """Analysis time of a batch of misses; its mean per email values the time saved by hits."""
+        self.analyzed += n_emails
+        self.analysis_seconds += seconds
+
+    def _begin_batch(self, texts: List[str], headers: Optional[List[Optional[Dict]]]):
+        """Looks up a batch; returns the lookups and the distinct misses as {key: (text, headers, probe)}."""
+        headers = headers if headers is not None else [None] * len(texts)
+        lookups = [self.lookup(text, email_headers) for text, email_headers in zip(texts, headers)]
+        # Each distinct missing email is analyzed once, even if it repeats within the batch
+        missing: Dict[bytes, Tuple] = {}
+        for text, email_headers, (result, probe) in zip(texts, headers, lookups):
+            if result is None:
+                missing.setdefault(probe[0], (text, email_headers, probe))
+        self.record_batch_duplicates(sum(result is None for result, _ in lookups) - len(missing))
+        return lookups, missing
+
+    @staticmethod
+    def _missing_inputs(missing: Dict[bytes, Tuple], headers: Optional[List]) -> Tuple[List[str], Optional[List]]:
+        texts = [text for text, _, _ in missing.values()]
+        return texts, [email_headers for _, email_headers, _ in missing.values()] if headers is not None else None
+
+    def _finish_batch(self, lookups: List[Tuple], missing: Dict[bytes, Tuple], analyses: List) -> List:
+        by_key = {}
+        for (key, (text, _, probe)), analysis in zip(missing.items(), analyses):
+            self.put(text, analysis, probe)
+            by_key[key] = analysis
+        return [result if result is not None else _copy(by_key[probe[0]]) for result, probe in lookups]
+
+    def analyze_batch(
+        self,
+        texts: List[str],
+        analyze_fn: Callable[..., List],
+        headers: Optional[List[Optional[Dict]]] = None
+    ) -> List:
+        """
+        Analyzes 'texts' with analyze_fn(texts, headers), which only receives the emails that
+        are not cached. 'headers' (one dict per email, optional) is part of the cache key.
+        """
+        if not self.enabled:
+            return analyze_fn(texts, headers)
+        lookups, missing = self._begin_batch(texts, headers)
+        if not missing:
+            return [result for result, _ in lookups]
+        start = time.perf_counter()
+        analyses = analyze_fn(*self._missing_inputs(missing, headers))
+        self.record_analysis_time(len(missing), time.perf_counter() - start)
+        return self._finish_batch(lookups, missing, analyses)
+
+    async def analyze_batch_async(
+        self,
+        texts: List[str],
+        analyze_fn: Callable[..., Awaitable[List]],
+        headers: Optional[List[Optional[Dict]]] = None
+    ) -> List:
+        """analyze_batch() for a coroutine analyze_fn (e.g. the inference executor's)."""
+        if not self.enabled:
+            return await analyze_fn(texts, headers)
+        lookups, missing = self._begin_batch(texts, headers)
+        if not missing:
+            return [result for result, _ in lookups]
+        start = time.perf_counter()
+        analyses = await analyze_fn(*self._missing_inputs(missing, headers))
+        self.record_analysis_time(len(missing), time.perf_counter() - start)
+        return self._finish_batch(lookups, missing, analyses)
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        hits = self.exact_hits + self.near_hits
+        mean_s = self.analysis_seconds / self.analyzed if self.analyzed else 0.0
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "mean_analysis_ms": round(mean_s * 1000, 2),
+            "time_saved_s": round(hits * mean_s, 2),
+        }
+
+# The cache used by the inference executor
+analysis_cache = AnalysisCache()
+
+if __name__ == "__main__":
+    import pandas as pd
+    from src.JSON_Extracter import analyze_emails_batch
+
+    parser = argparse.ArgumentParser(description="Replay a mail corpus through the analysis cache.")
+    parser.add_argument("--csv", default='dataset/synthetic_emails_500.csv')
+    parser.add_argument("--max-distance", type=int, default=NEAR_DUP_DISTANCE,
+                        help=f"Near-duplicate SimHash distance in bits (at most {MAX_NEAR_DUP_DISTANCE}, negative = exact only).")
+    parser.add_argument("--batch-size", type=int, default=20, help="Emails per analysis call, like the inbox endpoints.")
+    args = parser.parse_args()
+    if args.max_distance > MAX_NEAR_DUP_DISTANCE:
+        parser.error(f"--max-distance must be at most {MAX_NEAR_DUP_DISTANCE}")
+
+    df = pd.read_csv(args.csv)
+    texts = [f"{subject} {body}" for subject, body in zip(df['subject'].astype(str), df['body'].astype(str))]
+
+    # Reference: every email analyzed from scratch in the same batches (after loading the models)
+    analyze_emails_batch(texts[:1])
+    start = time.perf_counter()
+    fresh = []
+    for i in range(0, len(texts), args.batch_size):
+        fresh.extend(analyze_emails_batch(texts[i:i + args.batch_size]))
+    fresh_s = time.perf_counter() - start
+
+    cache = AnalysisCache(max_entries=ANALYSIS_CACHE_SIZE or 10000, max_distance=args.max_distance)
+    start = time.perf_counter()
+    cached = []
+    for i in range(0, len(texts), args.batch_size):
+        cached.extend(cache.analyze_batch(texts[i:i + args.batch_size], lambda batch, headers: analyze_emails_batch(batch, headers=headers)))
+    cached_s = time.perf_counter() - start
+
+    stats = cache.stats()
+    same = sum(a.model_dump() == b.model_dump() for a, b in zip(fresh, cached))
+    same_urgency = sum(a.urgency_level == b.urgency_level and a.deadline == b.deadline for a, b in zip(fresh, cached))
+    print(f"{len(texts)} emails ({len(set(texts))} distinct texts)")
+    print(f"Hits: {stats['exact_hits']} exact + {stats['near_hits']} near-duplicate, {stats['misses']} misses "
+          f"(hit rate {stats['hit_rate']:.1%})")
+    print(f"Time: {fresh_s:.2f}s uncached -> {cached_s:.2f}s cached (estimated saving {stats['time_saved_s']:.2f}s)")
+    print(f"Results identical to a fresh analysis: {same / len(texts):.1%}; "
+          f"same urgency and deadline: {same_urgency / len(texts):.1%}")
@@ -0,0 +1,247 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+from src.date_parser import parse_deadline_string
+
+# Embedded store of every analysis result, so dashboards and notifications query precomputed
+# results ("very urgent with a deadline this week", "everything from this sender") instead of
+# re-fetching and re-analyzing the inbox.
+ANALYSIS_DB_PATH = os.getenv("PARTISH_ANALYSIS_DB", "cache/analyses.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    user TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    thread_id TEXT,
+    internal_date INTEGER,          -- ms since epoch, as reported by Gmail
+    sender TEXT,
+    sender_address TEXT,            -- lowercased address part of the sender, for lookups
+    subject TEXT,
+    urgency_level TEXT,
+    ml_urgency_score INTEGER,
+    sentiment TEXT,
+    sentiment_score REAL,
+    deadline TEXT,
+    deadline_start TEXT,            -- naive UTC ISO datetimes (sortable) parsed from the deadline
+    deadline_end TEXT,
+    analysis TEXT NOT NULL,         -- the full EmailAnalysis as JSON
+    analyzed_at REAL NOT NULL,
+    deadline_checked INTEGER NOT NULL DEFAULT 1, -- 0 = no NLP ran (e.g. tier-0 screen), so no deadline was looked for
+    PRIMARY KEY (user, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_urgency ON analyses (user, urgency_level, deadline_start);
+CREATE INDEX IF NOT EXISTS idx_analyses_urgency_date ON analyses (user, urgency_level, internal_date);
+CREATE INDEX IF NOT EXISTS idx_analyses_deadline ON analyses (user, deadline_start);
+CREATE INDEX IF NOT EXISTS idx_analyses_sender ON analyses (user, sender_address, internal_date);
+CREATE INDEX IF NOT EXISTS idx_analyses_date ON analyses (user, internal_date);
+"""
+
+_ADDRESS_RE = re.compile(r'<([^>]+)>')
+
+# PRAGMA user_version of the current layout; 1 = deadlines stored as UTC (before: server local time)
+_SCHEMA_VERSION = 1
+
+def to_utc_naive(dt: datetime) -> datetime:
+    """
+    The naive UTC datetime deadlines are stored and compared as. A naive 'dt' is taken as
+    server local time (like datetime.now()), an aware one is converted from its own zone.
+    """
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def sender_address(sender: str) -> str:
+    """'Jane Doe <Jane@Example.com>' -> 'jane@example.com'."""
+    match = _ADDRESS_RE.search(sender or '')
+    return (match.group(1) if match else (sender or '')).strip().lower()
+
+class AnalysisStore:
+    """
+    SQLite table of analyses, one row per (account, message id); re-analyzing a message
+    replaces its row. Deadlines are parsed once on write (relative to when the email was
+    received), so queries by deadline range are plain index scans.
+    """
+
+    def __init__(self, path: str = ANALYSIS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers (e.g. other server workers) query while a batch is written
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # Stores created before the cascade lack the column; all their rows went through NLP
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(analyses)")}
+            if "deadline_checked" not in columns:
+                conn.execute("ALTER TABLE analyses ADD COLUMN deadline_checked INTEGER NOT NULL DEFAULT 1")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                self._migrate_deadlines_to_utc(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _migrate_deadlines_to_utc(conn: sqlite3.Connection):
+        # Deadlines used to be stored in server local time
+        rows = conn.execute(
+            "SELECT rowid, deadline_start, deadline_end FROM analyses WHERE deadline_start IS NOT NULL"
+        ).fetchall()
+        with conn:
+            conn.executemany(
+                "UPDATE analyses SET deadline_start = ?, deadline_end = ? WHERE rowid = ?",
+                [(to_utc_naive(datetime.fromisoformat(start)).isoformat(),
+                  to_utc_naive(datetime.fromisoformat(end)).isoformat() if end else None, rowid)
+                 for rowid, start, end in rows]
+            )
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def save(self, user: str, emails: List[Dict], analyses: List) -> int:
+        """Records the analyses of parsed emails (see gmail_access.parse_message). Returns the rows written."""
+        rows = []
+        now = time.time()
+        for email, analysis in zip(emails, analyses):
+            internal_date = int(email['internalDate']) if email.get('internalDate') else None
+            deadline_start = deadline_end = None
+            if analysis.deadline:
+                # "by Friday" means the Friday after the email arrived, not after it was analyzed
+                # (in server local time, like every other deadline the app parses)
+                base_date = datetime.fromtimestamp(internal_date / 1000) if internal_date else None
+                start_dt, end_dt = parse_deadline_string(analysis.deadline, base_date)
+                if start_dt and end_dt:
+                    deadline_start, deadline_end = to_utc_naive(start_dt).isoformat(), to_utc_naive(end_dt).isoformat()
+            rows.append((
+                user, email['id'], email.get('threadId'), internal_date,
+                email.get('sender'), sender_address(email.get('sender')), email.get('subject'),
+                analysis.urgency_level, analysis.ml_urgency_score, analysis.sentiment, analysis.sentiment_score,
+                analysis.deadline, deadline_start, deadline_end,
+                json.dumps(analysis.model_dump()), now, int(analysis.nlp_analyzed),
+            ))
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO analyses (user, message_id, thread_id, internal_date, sender, sender_address, "
+                    "subject, urgency_level, ml_urgency_score, sentiment, sentiment_score, deadline, deadline_start, "
+                    "deadline_end, analysis, analyzed_at, deadline_checked) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+        return len(rows)
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["message_id"],
+            "threadId": row["thread_id"],
+            "internalDate": row["internal_date"],
+            "sender": row["sender"],
+            "subject": row["subject"],
+            "urgency_level": row["urgency_level"],
+            "deadline": row["deadline"],
+            "deadline_start": row["deadline_start"],
+            "deadline_end": row["deadline_end"],
+            "analysis": json.loads(row["analysis"]),
+            "analyzed_at": row["analyzed_at"],
+            "deadline_checked": bool(row["deadline_checked"]),
+        }
+
+    def query(
+        self,
+        user: str,
+        urgency_levels: Optional[List[str]] = None,
+        deadline_from: Optional[datetime] = None,
+        deadline_to: Optional[datetime] = None,
+        sender: Optional[str] = None,
+        received_after: Optional[datetime] = None,
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Dict]:
+        """
+        Analyses of one account matching every given filter. With a deadline filter the results
+        are ordered by deadline (soonest first), otherwise by received date (newest first).
+        Datetimes may be naive (server local time) or timezone-aware; deadlines are compared in UTC.
+        Deadline filters only match analyses whose deadline was extracted: mail settled by the
+        cascade screen was never scanned for one, see summary()['unscanned_for_deadlines'].
+        """
+        where = ["user = ?"]
+        params: List = [user]
+        if urgency_levels:
+            where.append(f"urgency_level IN ({', '.join('?' * len(urgency_levels))})")
+            params.extend(urgency_levels)
+        if deadline_from is not None:
+            where.append("deadline_start >= ?")
+            params.append(to_utc_naive(deadline_from).isoformat())
+        if deadline_to is not None:
+            where.append("deadline_start < ?")
+            params.append(to_utc_naive(deadline_to).isoformat())
+        if sender:
+            where.append("sender_address = ?")
+            params.append(sender_address(sender))
+        if received_after is not None:
+            where.append("internal_date >= ?")
+            params.append(int(received_after.timestamp() * 1000))
+        by_deadline = deadline_from is not None or deadline_to is not None
+        order = "deadline_start ASC" if by_deadline else "internal_date DESC"
+        sql = f"SELECT * FROM analyses WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def get(self, user: str, message_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT * FROM analyses WHERE user = ? AND message_id = ?", (user, message_id)
+            ).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def urgent_senders(self, user: str) -> Set[str]:
+        """Addresses of the senders of this account's stored Very Urgent mail."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT sender_address FROM analyses WHERE user = ? AND urgency_level = 'Very Urgent'", (user,)
+            ).fetchall()
+        return {row[0] for row in rows if row[0]}
+
+    def summary(self, user: str) -> Dict:
+        """
+        Number of stored analyses per urgency level, how many have an upcoming deadline, and how
+        were never scanned for a deadline (settled by the cascade screen without NLP).
+        """
+        with self._lock:
+            conn = self._connect()
+            counts = conn.execute(
+                "SELECT urgency_level, COUNT(*) FROM analyses WHERE user = ? GROUP BY urgency_level", (user,)
+            ).fetchall()
+            upcoming = conn.execute(
+                "SELECT COUNT(*) FROM analyses WHERE user = ? AND deadline_start >= ?",
+                (user, to_utc_naive(datetime.now()).isoformat())
+            ).fetchone()[0]
+            unscanned = conn.execute(
+                "SELECT COUNT(*) FROM analyses WHERE user = ? AND deadline_checked = 0", (user,)
+            ).fetchone()[0]
+        by_level = {level: count for level, count in counts}
+        return {
+            "total": sum(by_level.values()),
+            "urgency_counts": by_level,
+            "upcoming_deadlines": upcoming,
+            "unscanned_for_deadlines": unscanned,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# The store shared by the API and the backfill job
+analysis_store = AnalysisStore()
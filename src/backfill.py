@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from src.gmail_access import get_profile, list_message_page, fetch_messages, DEFAULT_BATCH_SIZE
+
+# Checkpoints and results of backfill jobs, one pair of files per Gmail account
+BACKFILL_DIR = os.getenv("PARTISH_BACKFILL_DIR", "cache/backfill")
+BACKFILL_PAGE_SIZE = 100
+
+def _write_json_atomic(path: str, data: Dict):
+    """Writes JSON through a temp file + rename, so a crash never leaves a half-written file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class BackfillJob:
+    """
+    Walks a whole mailbox page by page (newest first) and analyzes every message in batches.
+
+    After every batch the job checkpoints the current page token and the ids already processed
+    on that page to '<state_dir>/<account>.json', and appends the analyses to
+    '<account>.results.ndjson'. A crashed or stopped job started again with the same account
+    resumes from that checkpoint. At most the batch in flight at the crash is analyzed twice
+    (results are written before the checkpoint), so consumers should de-duplicate by id.
+
+    'analyze_fn' takes a list of email texts and a 'headers' keyword (one header dict per email,
+    for the cascade's bulk-mail check and the analysis cache) and returns their EmailAnalysis
+    objects; the CLI uses analyze_emails_batch directly, the API passes the inference executor.
+    With a 'store' (AnalysisStore) the analyses are recorded there as well.
+    """
+
+    def __init__(
+        self,
+        service,
+        analyze_fn: Callable[..., List],
+        page_size: int = BACKFILL_PAGE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        query: Optional[str] = None,
+        state_dir: str = BACKFILL_DIR,
+        restart: bool = False,
+        store=None
+    ):
+        self.service = service
+        self.analyze_fn = analyze_fn
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.query = query
+        self.store = store
+
+        profile = get_profile(service)
+        self.user = profile['emailAddress']
+        self.messages_total = int(profile.get('messagesTotal', 0))
+
+        os.makedirs(state_dir, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.@-]', '_', self.user)
+        self.checkpoint_path = os.path.join(state_dir, f"{safe_name}.json")
+        self.results_path = os.path.join(state_dir, f"{safe_name}.results.ndjson")
+        if restart:
+            for path in (self.checkpoint_path, self.results_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        self.checkpoint = self._load_checkpoint()
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self._stop = threading.Event()
+        self._run_started: Optional[float] = None
+        self._run_processed = 0
+
+    def _load_checkpoint(self) -> Dict:
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('query') == self.query:
+                return checkpoint
+            print(f"Backfill checkpoint for {self.user} was for another query, starting over.")
+        except (OSError, ValueError):
+            pass
+        return {
+            'user': self.user,
+            'query': self.query,
+            'page_token': None, # Token of the page being processed (None = first page)
+            'page_processed_ids': [], # Ids of that page that are already analyzed
+            'pages_done': 0,
+            'processed': 0,
+            'urgency_counts': {},
+            'done': False,
+            'updated_at': None,
+        }
+
+    def _save_checkpoint(self):
+        self.checkpoint['updated_at'] = time.time()
+        _write_json_atomic(self.checkpoint_path, self.checkpoint)
+
+    def _write_results(self, emails: List[Dict], analyses: List):
+        with open(self.results_path, 'a') as f:
+            for email, analysis in zip(emails, analyses):
+                f.write(json.dumps({
+                    "id": email['id'],
+                    "threadId": email['threadId'],
+                    "internalDate": email['internalDate'],
+                    "sender": email['sender'],
+                    "subject": email['subject'],
+                    "analysis": analysis.model_dump(),
+                }) + "\n")
+
+    def _process_batch(self, msg_ids: List[str]):
+        emails = fetch_messages(self.service, msg_ids)
+        analyses = self.analyze_fn(
+            [f"{e['subject']} {e['body']}" for e in emails], headers=[e.get('headers') for e in emails]
+        ) if emails else []
+        self._write_results(emails, analyses)
+        if self.store is not None:
+            self.store.save(self.user, emails, analyses)
+
+        counts = self.checkpoint['urgency_counts']
+        for analysis in analyses:
+            counts[analysis.urgency_level] = counts.get(analysis.urgency_level, 0) + 1
+        # Ids that could not be fetched count as processed too, so they are not retried forever
+        self.checkpoint['page_processed_ids'].extend(msg_ids)
+        self.checkpoint['processed'] += len(msg_ids)
+        self._run_processed += len(msg_ids)
+        self._save_checkpoint()
+
+    def run(self) -> Dict:
+        """Runs (or resumes) the backfill until the mailbox is done or stop() is called."""
+        if self.checkpoint['done']:
+            self.state = "done"
+            return self.status()
+
+        self.state = "running"
+        self._stop.clear()
+        self._run_started = time.perf_counter()
+        self._run_processed = 0
+        try:
+            while not self._stop.is_set():
+                page_ids, next_token = list_message_page(
+                    self.service, page_size=self.page_size, page_token=self.checkpoint['page_token'], query=self.query
+                )
+                already_done = set(self.checkpoint['page_processed_ids'])
+                todo = [msg_id for msg_id in page_ids if msg_id not in already_done]
+
+                for start in range(0, len(todo), self.batch_size):
+                    if self._stop.is_set():
+                        break
+                    self._process_batch(todo[start:start + self.batch_size])
+                    self._report()
+                if self._stop.is_set():
+                    break
+
+                # Page finished: move the checkpoint to the next one
+                self.checkpoint['page_token'] = next_token
+                self.checkpoint['page_processed_ids'] = []
+                self.checkpoint['pages_done'] += 1
+                self.checkpoint['done'] = next_token is None
+                self._save_checkpoint()
+                if self.checkpoint['done']:
+                    break
+
+            self.state = "done" if self.checkpoint['done'] else "stopped"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Backfill for {self.user} failed (resumable from its checkpoint): {e}")
+        self._report()
+        return self.status()
+
+    def stop(self):
+        """Asks the job to stop after the current batch; it can be resumed later."""
+        self._stop.set()
+
+    def rate(self) -> float:
+        """Messages per second processed since this run started."""
+        if not self._run_started:
+            return 0.0
+        elapsed = time.perf_counter() - self._run_started
+        return self._run_processed / elapsed if elapsed > 0 else 0.0
+
+    def _report(self):
+        total = f"/{self.messages_total}" if self.messages_total else ""
+        print(f"Backfill {self.user} [{self.state}]: {self.checkpoint['processed']}{total} messages, "
+              f"{self.checkpoint['pages_done']} pages, {self.rate():.1f} msgs/s")
+
+    def status(self) -> Dict:
+        rate = self.rate()
+        remaining = max(0, self.messages_total - self.checkpoint['processed'])
+        return {
+            "user": self.user,
+            "state": self.state,
+            "processed": self.checkpoint['processed'],
+            "messages_total": self.messages_total,
+            "pages_done": self.checkpoint['pages_done'],
+            "msgs_per_s": round(rate, 1),
+            "eta_s": round(remaining / rate, 1) if rate and self.state == "running" else None,
+            "urgency_counts": self.checkpoint['urgency_counts'],
+            "error": self.error,
+            "results_path": self.results_path,
+        }
+
+if __name__ == "__main__":
+    from googleapiclient.discovery import build
+    from src.JSON_Extracter import analyze_emails_batch
+    from src.analysis_store import analysis_store
+
+    parser = argparse.ArgumentParser(description="Backfill: analyze a whole Gmail mailbox, resumably.")
+    parser.add_argument("--token", help="Authorized user token file (google.oauth2 JSON) for a real mailbox.")
+    parser.add_argument("--fake", action="store_true", help="Use the local fake Gmail API filled from the dataset.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Gmail latency per round trip (s).")
+    parser.add_argument("--query", default=None, help="Gmail search query to restrict the backfill.")
+    parser.add_argument("--page-size", type=int, default=BACKFILL_PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over.")
+    args = parser.parse_args()
+
+    if args.fake:
+        from src.fake_gmail import FakeGmailHttp
+        gmail_service = build('gmail', 'v1', http=FakeGmailHttp.from_csv(latency=args.latency), static_discovery=True)
+    elif args.token:
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        from src.gmail_access import get_gmail_service, SCOPES
+        credentials = Credentials.from_authorized_user_file(args.token, SCOPES)
+        if credentials.expired and credentials.refresh_token:
+            credentials.refresh(GoogleAuthRequest())
+        gmail_service = get_gmail_service(credentials)
+    else:
+        parser.error("Pass --token <file> or --fake.")
+
+    job = BackfillJob(
+        gmail_service,
+        analyze_emails_batch,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        query=args.query,
+        restart=args.restart,
+        store=analysis_store
+    )
+    try:
+        print(json.dumps(job.run(), indent=2))
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume from the checkpoint.")
@@ -0,0 +1,100 @@
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from src.date_parser import (
+    parse_deadline_string, parse_deadlines_batch, deadline_cache_info, _parse_deadline_cached,
+    _parse_deadline_dateutil, _fast_parse, _normalize_deadline, EXAMPLE_DEADLINES
+)
+
+# Benchmarks the deadline parser (fast path + memo + batch API) against the plain dateutil
+# path, which is the parser's original algorithm, and checks that both give identical
+# results on the __main__ examples and on a large synthetic set of deadline phrases.
+
+_PREFIXES = ["", "by ", "due ", "on ", "before ", "until ", "by this ", "due by ", "please reply by "]
+_DAYS = ["Friday", "monday", "Tue", "wednesday", "Thursday", "sat", "Sunday", "next Tuesday", "this Friday"]
+_RELATIVE = ["tomorrow", "today", "EOD", "EOD tomorrow", "end of day", "end of week", "EOW", "next week", "next month"]
+_TIMES = ["", " 3pm", " at 5pm", " 9am", " 12pm", " 11am", " 3 PM", " at 10:30", " 6:15pm", " noon"]
+_MONTHS = ["October", "Oct", "january", "Feb", "March", "dec", "June", "Sept"]
+_RARE = [
+    "due 2 days from now", "6pm (UK time) on 22 October 2025", "the end of the month", "asap",
+    "in two weeks", "2025-10-22", "10/22", "22/10/2025", "Q4", "first thing Monday morning",
+    "February 30", "31 April 2026", "the 15th", "1530", "this week", "May", "noon tomorrow",
+]
+
+def synthetic_deadlines(n: int, seed: int = 0) -> list:
+    """Deadline phrases with the skewed recurrence of real mail: a few forms very often, a long tail rarely."""
+    rng = random.Random(seed)
+    phrases = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.4:
+            phrase = rng.choice(_PREFIXES) + rng.choice(_DAYS) + rng.choice(_TIMES)
+        elif kind < 0.7:
+            phrase = rng.choice(_PREFIXES) + rng.choice(_RELATIVE) + rng.choice(_TIMES)
+        elif kind < 0.9:
+            day, month = rng.randint(1, 31), rng.choice(_MONTHS)
+            year = rng.choice(["", " 2025", " 2026", ", 2027"])
+            phrase = rng.choice(_PREFIXES) + rng.choice([f"{day} {month}{year}", f"{month} {day}{year}", f"{day}th {month}"])
+        else:
+            phrase = rng.choice(_RARE)
+        if rng.random() < 0.1:
+            phrase = phrase.upper()
+        phrases.append(phrase)
+    return phrases
+
+def check_equivalence(phrases: list, base_dates: list) -> int:
+    """Compares the optimized parser with the dateutil path on every distinct phrase and base date."""
+    mismatches = 0
+    for base_date in base_dates:
+        for phrase in sorted(set(phrases)):
+            expected = _parse_deadline_dateutil(phrase, base_date)
+            got = parse_deadline_string(phrase, base_date)
+            if got != expected:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"  MISMATCH '{phrase}' (base {base_date.date()}): {got} != {expected}")
+    return mismatches
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and check the memoized deadline parser.")
+    parser.add_argument("--n", type=int, default=20000, help="Size of the synthetic deadline set.")
+    args = parser.parse_args()
+
+    base = datetime.now().replace(hour=14, minute=30)
+    # Every weekday plus month and year boundaries, to catch date arithmetic differences
+    base_dates = [base + timedelta(days=i) for i in range(7)] + [
+        datetime(2026, 1, 31, 8), datetime(2026, 2, 28, 23), datetime(2026, 12, 31, 12), datetime(2028, 2, 29, 9)
+    ]
+    synthetic = synthetic_deadlines(args.n)
+
+    print(f"Equivalence check on {len(set(EXAMPLE_DEADLINES + synthetic))} distinct phrases x {len(base_dates)} base dates...")
+    mismatches = check_equivalence(EXAMPLE_DEADLINES + synthetic, base_dates)
+    print(f"  {mismatches} mismatches")
+
+    for name, phrases in (("__main__ examples", EXAMPLE_DEADLINES), (f"synthetic ({args.n})", synthetic)):
+        # Repeat the small set so its timings are measurable
+        if len(phrases) < 1000:
+            phrases = phrases * (1000 // len(phrases))
+        t_dateutil = _timed(lambda: [_parse_deadline_dateutil(p, base) for p in phrases])
+        _parse_deadline_cached.cache_clear()
+        t_cold = _timed(lambda: [parse_deadline_string(p, base) for p in phrases])
+        t_warm = _timed(lambda: [parse_deadline_string(p, base) for p in phrases])
+        _parse_deadline_cached.cache_clear()
+        t_batch = _timed(lambda: parse_deadlines_batch(phrases, base))
+        info = deadline_cache_info()
+        fast = sum(_fast_parse(_normalize_deadline(p), base) is not None for p in phrases)
+        print(f"\n{name}: {len(phrases)} strings, {len(set(phrases))} distinct, {fast / len(phrases):.0%} on the fast path")
+        print(f"  dateutil path       {t_dateutil * 1000:9.1f} ms  ({len(phrases) / t_dateutil:10.0f} /s)")
+        print(f"  fast path + memo    {t_cold * 1000:9.1f} ms  ({len(phrases) / t_cold:10.0f} /s)  {t_dateutil / t_cold:6.1f}x")
+        print(f"  warm memo           {t_warm * 1000:9.1f} ms  ({len(phrases) / t_warm:10.0f} /s)  {t_dateutil / t_warm:6.1f}x")
+        print(f"  batch (cold memo)   {t_batch * 1000:9.1f} ms  ({len(phrases) / t_batch:10.0f} /s)  {t_dateutil / t_batch:6.1f}x")
+        print(f"  memo: {info.currsize} entries, {info.hits} hits, {info.misses} misses")
+
+    sys.exit(1 if mismatches else 0)
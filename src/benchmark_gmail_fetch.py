@@ -0,0 +1,48 @@
+import argparse
+import time
+from googleapiclient.discovery import build
+from src.fake_gmail import FakeGmailHttp
+from src.gmail_access import get_email_details, list_message_ids, fetch_messages, DEFAULT_BATCH_SIZE
+
+# Offline comparison of the two ways of pulling N messages from Gmail:
+#   naive:   messages.list (full response) + one messages.get per message (N+1 round trips)
+#   batched: messages.list (ids only) + batch requests with partial responses
+# Runs against FakeGmailHttp, so the numbers depend only on the simulated latency/bandwidth.
+
+def _run(name: str, fake: FakeGmailHttp, fetch) -> list:
+    fake.reset_stats()
+    start = time.perf_counter()
+    emails = fetch()
+    elapsed = time.perf_counter() - start
+    stats = fake.stats()
+    print(f"{name:8s} {len(emails):5d} msgs  {stats['round_trips']:5d} round trips  "
+          f"{stats['api_calls']:5d} API calls  {stats['bytes_received'] / 1024:9.1f} KiB  {elapsed:7.2f} s")
+    return emails
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Gmail fetch strategies against a local fake Gmail API.")
+    parser.add_argument("--csv", default='dataset/synthetic_emails_500.csv', help="Dataset used to fill the fake mailbox.")
+    parser.add_argument("--messages", type=int, default=500, help="Number of recent messages to fetch.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip.")
+    parser.add_argument("--bandwidth", type=float, default=5_000_000, help="Simulated bytes per second (0 = unlimited).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Messages per batch request.")
+    args = parser.parse_args()
+
+    fake = FakeGmailHttp.from_csv(args.csv, latency=args.latency, bytes_per_second=args.bandwidth or None)
+    service = build('gmail', 'v1', http=fake, static_discovery=True)
+
+    def naive():
+        results = service.users().messages().list(userId='me', maxResults=args.messages).execute()
+        return [get_email_details(service, msg['id']) for msg in results.get('messages', [])]
+
+    def batched():
+        msg_ids = list_message_ids(service, max_results=args.messages)
+        return [(m['sender'], m['subject'], m['body']) for m in fetch_messages(service, msg_ids, batch_size=args.batch_size)]
+
+    print(f"Fetching {args.messages} messages (latency {args.latency * 1000:.0f} ms/round trip)")
+    naive_emails = _run("naive", fake, naive)
+    batched_emails = _run("batched", fake, batched)
+    print("Same emails:", naive_emails == batched_emails)
+
+if __name__ == "__main__":
+    main()
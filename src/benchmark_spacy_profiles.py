@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+import pandas as pd
+from src.model_registry import SPACY_MODEL_TIERS
+
+# Compares spaCy model tiers and pipeline profiles on what matters for serving:
+# startup (model load) time, per-email analysis latency, process memory and the test accuracy
+# of a Decision Tree trained on that configuration's features. Every configuration runs in a
+# fresh subprocess so load times and memory are not polluted by the previous one.
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MiB."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _measure(csv_path: str, n_emails: int) -> dict:
+    """
+    Runs in the child process; the model, profile and vector store come from the PARTISH_SPACY_*
+    and PARTISH_VECTOR_STORE env vars. Memory is the RSS growth from loading the models.
+    """
+    import spacy
+    from src.model_registry import registry, SPACY_MODEL_NAME, SPACY_PROFILE
+
+    # Never download models from a benchmark
+    if not spacy.util.is_package(SPACY_MODEL_NAME):
+        return {"error": f"{SPACY_MODEL_NAME} is not installed (python -m spacy download {SPACY_MODEL_NAME})"}
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    registry.load()
+    startup_ms = (time.perf_counter() - start) * 1000
+
+    # Per-email latency through the serving path (one email per call, like the API)
+    from src.JSON_Extracter import analyze_email_sentiment
+    df = pd.read_csv(csv_path).head(n_emails)
+    texts = [f"{subject} {body}" for subject, body in zip(df['subject'].astype(str), df['body'].astype(str))]
+    analyze_email_sentiment(texts[0])
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        analyze_email_sentiment(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    rss_loaded = _rss_mb()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    # Accuracy of a tree trained on this configuration's features (nothing is written to models/)
+    from src.DecisionTree_Trainer import train_decision_tree
+    accuracy = train_decision_tree(csv_path, use_cache=False, save=False)
+
+    return {
+        "model": SPACY_MODEL_NAME,
+        "profile": SPACY_PROFILE,
+        "vector_store": registry.vector_store_path,
+        "vector_table_rows": int(registry.nlp.vocab.vectors.shape[0]),
+        "pipeline": registry.nlp.pipe_names,
+        "startup_ms": round(startup_ms, 1),
+        "latency_p50_ms": round(statistics.median(latencies), 2),
+        "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "models_rss_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "accuracy": round(accuracy, 4) if accuracy is not None else None,
+    }
+
+def measure_configuration(
+    model: str,
+    profile: str,
+    vector_store: Optional[str] = None,
+    csv_path: str = 'dataset/synthetic_emails_500.csv',
+    n_emails: int = 200
+) -> dict:
+    """Measures one configuration in a fresh subprocess; returns its results or {"error": ...}."""
+    env = dict(os.environ, PARTISH_SPACY_MODEL=model, PARTISH_SPACY_PROFILE=profile)
+    env.pop("PARTISH_SPACY_TIER", None)
+    env.pop("PARTISH_VECTOR_STORE", None)
+    if vector_store:
+        env["PARTISH_VECTOR_STORE"] = vector_store
+    proc = subprocess.run(
+        [sys.executable, "-m", "src.benchmark_spacy_profiles", "--child", "--csv", csv_path, "--emails", str(n_emails)],
+        env=env, capture_output=True, text=True
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    if not lines:
+        return {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1][len("RESULT "):])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark spaCy model tiers and pipeline profiles.")
+    parser.add_argument("--tiers", default="sm,md,lg", help="Comma-separated model tiers.")
+    parser.add_argument("--profiles", default="full,lean", help="Comma-separated pipeline profiles.")
+    parser.add_argument("--csv", default='dataset/synthetic_emails_500.csv', help="Emails used for latency and accuracy.")
+    parser.add_argument("--emails", type=int, default=200, help="Emails timed for the latency percentiles.")
+    parser.add_argument("--vector-store", help="Also measure every configuration with this compact vector store "
+                                               "(see src.compact_vectors).")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = _measure(args.csv, args.emails)
+        print("RESULT " + json.dumps(result))
+        return
+
+    rows = []
+    for tier in args.tiers.split(','):
+        for profile in args.profiles.split(','):
+            for vector_store in [None] + ([args.vector_store] if args.vector_store else []):
+                print(f"Measuring tier={tier} profile={profile} vector store={vector_store or 'no'}...")
+                result = measure_configuration(
+                    SPACY_MODEL_TIERS.get(tier, tier), profile, vector_store, args.csv, args.emails
+                )
+                rows.append({"tier": tier, "profile": profile, "store": "yes" if vector_store else "no", **result})
+
+    print()
+    print(f"{'tier':4s} {'profile':7s} {'store':5s} {'startup ms':>10s} {'p50 ms':>7s} {'p95 ms':>7s} "
+          f"{'models MiB':>10s} {'peak MiB':>9s} {'accuracy':>8s}")
+    for row in rows:
+        if "error" in row:
+            print(f"{row['tier']:4s} {row['profile']:7s} {row['store']:5s} skipped: {row['error']}")
+            continue
+        print(f"{row['tier']:4s} {row['profile']:7s} {row['store']:5s} {row['startup_ms']:10.1f} {row['latency_p50_ms']:7.2f} "
+              f"{row['latency_p95_ms']:7.2f} {row['models_rss_mb']:10.1f} {row['peak_rss_mb']:9.1f} {row['accuracy']:8.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import os
 from datetime import datetime, timedelta
-from googleapiclient.discovery import build
+from typing import Optional
 from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleAuthRequest
+from src.google_services import service_cache
 
 # If modifying these scopes, delete the file token.pickle.
 # 'offline_access' is important for long-lived access tokens
@@ -17,12 +17,15 @@ def get_calendar_service(credentials: Credentials):
     if not credentials or not credentials.valid:
         raise ValueError("Invalid or expired Google credentials provided.")
     
+    # Slow to import, so only loaded when a token needs refreshing
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+
     # Refresh token if expired
     if credentials.expired and credentials.refresh_token:
         credentials.refresh(GoogleAuthRequest())
 
-    service = build('calendar', 'v3', credentials=credentials)
-    return service
+    # Built once per account and reused, along with its keep-alive connections
+    return service_cache.get('calendar', 'v3', credentials)
 
 def create_calendar_event(
     service,
@@ -31,7 +34,8 @@ def create_calendar_event(
     end_datetime: datetime,
     description: str = '',
     calendar_id: str = 'primary',
-    time_zone: str = 'America/New_York' # Default timezone
+    time_zone: str = 'America/New_York', # Default timezone
+    event_id: Optional[str] = None
 ):
     """
     Creates a Google Calendar event.
@@ -44,6 +48,8 @@ def create_calendar_event(
         description: Description of the event.
         calendar_id: The ID of the calendar to create the event on (e.g., 'primary').
         time_zone: The timezone for the event.
+        event_id: Optional client-chosen event id (lowercase a-v and 0-9). Creating an event
+            whose id already exists returns the existing event instead of a duplicate.
     """
     event = {
         'summary': summary,
@@ -58,11 +64,20 @@ def create_calendar_event(
         },
     }
 
+    if event_id:
+        event['id'] = event_id
+
     try:
         event = service.events().insert(calendarId=calendar_id, body=event).execute()
         print(f"Event created: {event.get('htmlLink')}")
         return event
     except HttpError as error:
+        if event_id and error.resp.status == 409:
+            # Created by an earlier attempt
+            try:
+                return service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+            except HttpError as get_error:
+                error = get_error
         print(f"An error occurred: {error}")
         return None
 
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Set
+from src.keyword_matcher import KEYWORD_CATEGORIES
+from src.tree_predictor import CompiledTree
+
+# Tier 0 of the analysis cascade: a screen that costs microseconds per email (TF-IDF row,
+# keyword categories, sender headers and a shallow Decision Tree with leaf confidences).
+# Emails it confidently calls Regular get their analysis without spaCy, the semantic index
+# or VADER; ambiguous and likely-urgent emails escalate to the full pipeline (tier 1).
+
+# Written by `python -m src.cascade`; tied to the vectorizer it was trained with
+SCREEN_PATH = 'models/urgency_screen.npz'
+# Opt-in (PARTISH_CASCADE=1): settled emails get no sentiment, entities, dates or deadline
+CASCADE_ENABLED = os.getenv("PARTISH_CASCADE", "0") == "1"
+# Min share of Regular training emails at the screen's leaf to settle an email at tier 0
+CASCADE_CONFIDENCE = float(os.getenv("PARTISH_CASCADE_CONFIDENCE", "0.95"))
+# Bulk mail (mailing-list headers, no-reply senders) is settled at this lower confidence
+BULK_CONFIDENCE = 0.8
+
+SCREEN_MAX_DEPTH = 8
+SCREEN_MIN_SAMPLES_LEAF = 5
+
+# Keyword categories used as screen features, and the ones that always escalate
+SCREEN_CATEGORIES = sorted(KEYWORD_CATEGORIES)
+ESCALATE_CATEGORIES = {"strong_urgent"}
+
+BULK_PRECEDENCE = {"bulk", "list", "junk"}
+_BULK_LOCAL_RE = re.compile(
+    r'^(no-?reply|do-?not-?reply|newsletters?|news|marketing|promos?|promotions|offers|deals|'
+    r'notifications?|mailer-daemon|digest|updates)([.+_-]|$)'
+)
+# First label of subdomains that bulk mail services send from ("news.example.com")
+_BULK_SUBDOMAINS = {"news", "newsletter", "email", "mail", "mailer", "marketing", "promo", "em", "mg", "bounce"}
+_ADDRESS_RE = re.compile(r'<([^>]+)>')
+
+def vectorizer_sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def bulk_sender(headers: Optional[Dict]) -> bool:
+    """True for mailing-list or automated mail: List-Unsubscribe/List-Id, bulk Precedence, no-reply style senders."""
+    if not headers:
+        return False
+    headers = {name.lower(): value for name, value in headers.items()}
+    if "list-unsubscribe" in headers or "list-id" in headers:
+        return True
+    if headers.get("precedence", "").strip().lower() in BULK_PRECEDENCE:
+        return True
+    sender = headers.get("from", "")
+    match = _ADDRESS_RE.search(sender)
+    address = (match.group(1) if match else sender).strip().lower()
+    local, _, domain = address.partition("@")
+    return bool(_BULK_LOCAL_RE.match(local)) or (domain.count(".") >= 2 and domain.split(".")[0] in _BULK_SUBDOMAINS)
+
+def screen_matrix(X_text, keyword_hits: Sequence[Set[str]]):
+    """The screen's features: the TF-IDF rows plus one column per keyword category."""
+    from scipy import sparse
+    categories = np.array([[name in hits for name in SCREEN_CATEGORIES] for hits in keyword_hits], dtype=np.float64)
+    return sparse.hstack([X_text, sparse.csr_matrix(categories.reshape(len(keyword_hits), -1))], format='csr')
+
+def screen_emails(
+    screen: CompiledTree,
+    X_text,
+    keyword_hits: Sequence[Set[str]],
+    headers: Optional[Sequence[Optional[Dict]]] = None,
+    confidence: float = CASCADE_CONFIDENCE
+) -> np.ndarray:
+    """
+    Returns a boolean mask of the emails settled at tier 0 as Regular: the screen predicts
+    Regular with at least 'confidence' (BULK_CONFIDENCE for bulk mail) and no strong urgent
+    keyword is present. Everything else must go through the full pipeline.
+    """
+    labels, leaf_confidence = screen.predict_with_confidence(screen_matrix(X_text, keyword_hits))
+    headers = headers if headers is not None else [None] * len(keyword_hits)
+    required = np.array([
+        min(confidence, BULK_CONFIDENCE) if bulk_sender(h) else confidence for h in headers
+    ])
+    no_strong_signal = np.array([not (hits & ESCALATE_CATEGORIES) for hits in keyword_hits], dtype=bool)
+    return (labels == 0) & (leaf_confidence >= required) & no_strong_signal
+
+def train_screen(texts: List[str], labels: np.ndarray, vectorizer, vectorizer_hash: str = "") -> CompiledTree:
+    """Fits the screen tree on the TF-IDF + keyword features of labeled emails."""
+    from sklearn.tree import DecisionTreeClassifier
+    from src.keyword_matcher import KEYWORD_MATCHER
+    X = screen_matrix(vectorizer.transform(texts), [KEYWORD_MATCHER.match(text.lower()) for text in texts])
+    clf = DecisionTreeClassifier(max_depth=SCREEN_MAX_DEPTH, min_samples_leaf=SCREEN_MIN_SAMPLES_LEAF, random_state=42)
+    clf.fit(X, labels)
+    return CompiledTree.from_classifier(clf, model_sha256=vectorizer_hash)
+
+def _evaluate(texts: List[str], labels: np.ndarray, thresholds: List[float]):
+    """
+    Per-tier traffic share, accuracy and time of the cascade vs the full pipeline, for each
+    threshold, and the deadline and date recall: of the emails in which the full pipeline finds
+    a deadline (dates), the share that still has the same deadline (dates) with the cascade.
+    """
+    from src.JSON_Extracter import analyze_emails_batch
+    level_to_label = {"Regular": 0, "Newsletter/Promo": 0, "Urgent": 1, "Very Urgent": 2}
+
+    analyze_emails_batch(texts[:1], cascade=False)
+    start = time.perf_counter()
+    full = analyze_emails_batch(texts, cascade=False)
+    full_s = time.perf_counter() - start
+    full_pred = np.array([level_to_label.get(a.urgency_level, 0) for a in full])
+    with_deadline = [i for i, a in enumerate(full) if a.deadline]
+    with_dates = [i for i, a in enumerate(full) if a.dates]
+    print(f"\nFull pipeline: accuracy {(full_pred == labels).mean():.1%}, {full_s / len(texts) * 1000:.2f} ms/email, "
+          f"{len(with_deadline)} emails with a deadline, {len(with_dates)} with dates")
+
+    print(f"{'confidence':>10} {'tier 0':>7} {'tier 1':>7} {'accuracy':>9} {'delta':>7} {'agree':>7} "
+          f"{'VU recall':>9} {'DL recall':>9} {'date rec.':>9} {'ms/email':>9} {'speedup':>7}")
+    for threshold in thresholds:
+        start = time.perf_counter()
+        cascaded = analyze_emails_batch(texts, cascade=True, cascade_confidence=threshold)
+        elapsed = time.perf_counter() - start
+        pred = np.array([level_to_label.get(a.urgency_level, 0) for a in cascaded])
+        tier0 = np.mean([a.tier == 0 for a in cascaded])
+        very_urgent = labels == 2
+        recall = (pred[very_urgent] == 2).mean() if very_urgent.any() else 1.0
+        deadline_recall = np.mean([cascaded[i].deadline == full[i].deadline for i in with_deadline]) if with_deadline else 1.0
+        dates_recall = np.mean([cascaded[i].dates == full[i].dates for i in with_dates]) if with_dates else 1.0
+        accuracy = (pred == labels).mean()
+        print(f"{threshold:>10.2f} {tier0:>7.1%} {1 - tier0:>7.1%} {accuracy:>9.1%} "
+              f"{accuracy - (full_pred == labels).mean():>+7.1%} {(pred == full_pred).mean():>7.1%} "
+              f"{recall:>9.1%} {deadline_recall:>9.1%} {dates_recall:>9.1%} "
+              f"{elapsed / len(texts) * 1000:>9.2f} {full_s / elapsed:>6.1f}x")
+
+if __name__ == "__main__":
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from src.model_registry import registry
+    from src.DecisionTree_Trainer import INTENT_URGENCY_MAP, VECTORIZER_PATH
+
+    parser = argparse.ArgumentParser(description="Train the tier-0 cascade screen and report its traffic share and accuracy impact.")
+    parser.add_argument("--csv", default='dataset/synthetic_emails_500.csv')
+    parser.add_argument("--out", default=SCREEN_PATH)
+    parser.add_argument("--thresholds", default="0.8,0.9,0.95,1.0", help="Screen confidences to evaluate.")
+    parser.add_argument("--no-save", action="store_true", help="Evaluate only, do not write the screen.")
+    args = parser.parse_args()
+
+    if registry.vectorizer is None:
+        raise SystemExit("No trained vectorizer found; run `python -m src.DecisionTree_Trainer` first.")
+    df = pd.read_csv(args.csv)
+    texts = [f"{subject} {body}" for subject, body in zip(df['subject'].astype(str), df['body'].astype(str))]
+    labels = df['intent'].map(INTENT_URGENCY_MAP).fillna(0).astype(int).to_numpy()
+    # Same split as the trainer, so the held-out emails are unseen by both tiers
+    train_idx, test_idx = train_test_split(np.arange(len(texts)), test_size=0.2, random_state=42, stratify=labels)
+
+    screen = train_screen([texts[i] for i in train_idx], labels[train_idx], registry.vectorizer,
+                          vectorizer_sha256(VECTORIZER_PATH))
+    registry.set_screen(screen)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    for name, idx in (("Held-out split", test_idx), ("Whole corpus", np.arange(len(texts)))):
+        print(f"\n=== {name}: {len(idx)} emails ===")
+        _evaluate([texts[i] for i in idx], labels[idx], thresholds)
+
+    if not args.no_save:
+        screen.save(args.out)
+        print(f"\nSaved the screen to {args.out} (used when PARTISH_CASCADE=1, "
+              f"settling at PARTISH_CASCADE_CONFIDENCE={CASCADE_CONFIDENCE})")
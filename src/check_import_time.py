@@ -0,0 +1,83 @@
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+# Import-time budgets in ms (cumulative time of 'import <module>', as reported by
+# python -X importtime). Importing the app or a library module must not load any model or
+# heavy dependency; that cost belongs to the explicit, measured warmup (registry.load()).
+IMPORT_BUDGETS_MS = {
+    "app.main": 900,
+    "src.JSON_Extracter": 400,
+    "src.model_registry": 300,
+    "src.inference_executor": 500,
+    "src.gmail_access": 300,
+    "src.calendar_api": 300,
+    "src.backfill": 300,
+    "src.DecisionTree_Trainer": 2500,
+}
+
+# Heavy packages that must only be imported on first use, never as an import side effect
+DEFERRED_MODULES = ["spacy", "thinc", "sklearn", "pandas", "googleapiclient.discovery", "google_auth_oauthlib"]
+
+# The trainer needs pandas/sklearn at module level for its own work; spaCy still loads lazily
+ALLOWED_HEAVY_IMPORTS = {
+    "src.DecisionTree_Trainer": {"sklearn", "pandas"},
+}
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """
+    Imports 'module' in a fresh interpreter with -X importtime. Returns its cumulative import
+    time in ms and every imported module as (name, self ms, cumulative ms).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"'import {module}' failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+
+    total = next((cumulative for name, _, cumulative in entries if name == module), 0.0)
+    return total, entries
+
+def check_module(module: str, budget_ms: float, repeat: int = 3, top: int = 5) -> bool:
+    """Measures a module (best of 'repeat' runs) and prints whether it meets its budget."""
+    runs = [measure_import(module) for _ in range(repeat)]
+    total, entries = min(runs, key=lambda run: run[0])
+    imported = {name for name, _, _ in entries}
+
+    allowed = ALLOWED_HEAVY_IMPORTS.get(module, set())
+    leaked = [name for name in DEFERRED_MODULES if name in imported and name not in allowed]
+    ok = total <= budget_ms and not leaked
+
+    print(f"{'OK  ' if ok else 'FAIL'} {module:28s} {total:8.1f} ms (budget {budget_ms:.0f} ms)")
+    if leaked:
+        print(f"     imports heavy modules eagerly: {', '.join(leaked)}")
+    if not ok:
+        for name, self_ms, _ in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]:
+            print(f"     {self_ms:8.1f} ms  {name}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import times against budgets (python -X importtime).")
+    parser.add_argument("modules", nargs="*", help="Modules to check (default: every module with a budget).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module; the fastest one counts.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget (e.g. 2 on slow CI machines).")
+    args = parser.parse_args()
+
+    modules = args.modules or list(IMPORT_BUDGETS_MS)
+    results = [
+        check_module(module, IMPORT_BUDGETS_MS.get(module, 1000) * args.scale, repeat=args.repeat)
+        for module in modules
+    ]
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
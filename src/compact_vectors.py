@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+# Compact, pruned word-vector table for the semantic keyword matching.
+#
+# A token only ever produces a semantic hit if its cosine similarity with one of the ~19
+# category target words is above the lexicon threshold (0.7). Every other row of the spaCy
+# vector table is dead weight for that path, so the store keeps only the rows within a safety
+# margin of the threshold, L2-normalized and quantized to float16 or int8, and memory-maps
+# them from disk.
+#
+# The md/lg pipelines keep their full vector table loaded anyway (NER reads static vectors as
+# features), so there the store is loaded in addition to the table and saves no memory. The
+# configuration that saves memory is the sm tier (no vector table) plus the store, which gives
+# sm the semantic matching it otherwise lacks. Build the store (and measure the process RSS
+# and accuracy of each configuration) with:
+#
+#   python -m src.compact_vectors --dtype int8
+#
+# then train and serve with PARTISH_SPACY_TIER=sm PARTISH_VECTOR_STORE=models/semantic_vectors.
+
+VECTOR_STORE_DIR = os.path.join('models', 'semantic_vectors')
+VECTOR_STORE_DTYPES = ("float16", "int8")
+# Rows are kept if their similarity to some target is above (threshold - margin); the margin
+# covers the quantization error, so pruning never drops a row that could still match
+PRUNE_MARGIN = 0.05
+
+class CompactVectorStore:
+    """
+    Read-only vector table: sorted uint64 orth keys, the row of each key, and the quantized
+    rows (plus one float32 scale per row for int8). find() has the semantics of spaCy's
+    Vectors.find(keys=...) (-1 for unknown keys), so SemanticLexicon can use either table.
+    """
+
+    def __init__(self, keys: np.ndarray, key_rows: np.ndarray, vectors: np.ndarray,
+                 scales: Optional[np.ndarray], meta: Dict):
+        self.keys = keys
+        self.key_rows = key_rows
+        self.vectors = vectors
+        self.scales = scales
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path: str = VECTOR_STORE_DIR, mmap: bool = True) -> "CompactVectorStore":
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode=mmap_mode)
+        key_rows = np.load(os.path.join(path, 'key_rows.npy'), mmap_mode=mmap_mode)
+        vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode=mmap_mode)
+        scales = None
+        if meta['dtype'] == 'int8':
+            scales = np.load(os.path.join(path, 'scales.npy'), mmap_mode=mmap_mode)
+        return cls(keys, key_rows, vectors, scales, meta)
+
+    def save(self, path: str = VECTOR_STORE_DIR):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'keys.npy'), self.keys)
+        np.save(os.path.join(path, 'key_rows.npy'), self.key_rows)
+        np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        if self.scales is not None:
+            np.save(os.path.join(path, 'scales.npy'), self.scales)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.keys, self.key_rows, self.vectors] + ([self.scales] if self.scales is not None else [])
+        return sum(array.nbytes for array in arrays)
+
+    def find(self, *, keys) -> np.ndarray:
+        """Returns the row of every key, -1 for keys that are not in the store."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if len(self.keys) == 0:
+            return np.full(keys.shape, -1, dtype=np.intp)
+        idx = np.searchsorted(self.keys, keys)
+        idx = np.minimum(idx, len(self.keys) - 1)
+        found = self.keys[idx] == keys
+        return np.where(found, self.key_rows[idx], -1).astype(np.intp)
+
+    def get_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Dequantized float32 vectors of the given rows (unit length up to quantization error)."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows], dtype=np.float32)[:, None]
+        return vectors
+
+    def check_compatible(self, categories: Dict[str, List[str]], threshold: float):
+        """Raises ValueError if the store was pruned for other target words or a higher threshold."""
+        target_words = set(self.meta['target_words'])
+        missing = {word for words in categories.values() for word in words} - target_words
+        if missing:
+            raise ValueError(f"Vector store was built without the target words {sorted(missing)}; rebuild it.")
+        if threshold < self.meta['min_threshold']:
+            raise ValueError(f"Vector store only keeps rows above similarity {self.meta['min_threshold']}, "
+                             f"the lexicon threshold is {threshold}; rebuild it with a lower threshold.")
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def build_vector_store(vocab, categories: Dict[str, List[str]], threshold: float = 0.7,
+                       dtype: str = "int8", margin: float = PRUNE_MARGIN, source: str = "",
+                       chunk_size: int = 50000) -> CompactVectorStore:
+    """Prunes and quantizes the spaCy vector table of 'vocab' for the given keyword categories."""
+    if dtype not in VECTOR_STORE_DTYPES:
+        raise ValueError(f"Unknown dtype '{dtype}', expected one of {VECTOR_STORE_DTYPES}.")
+    vectors = vocab.vectors
+    data = np.asarray(vectors.data)
+    target_words = sorted({word for words in categories.values() for word in words})
+    target_rows = vectors.find(keys=np.array([vocab.strings[word] for word in target_words], dtype=np.uint64))
+    target_rows = target_rows[target_rows >= 0]
+
+    # Rows that can come close enough to a target word (the targets themselves included)
+    min_threshold = round(threshold - margin, 4)
+    keep = np.zeros(data.shape[0], dtype=bool)
+    if target_rows.size:
+        targets = _normalize(data[target_rows].astype(np.float32))
+        for start in range(0, data.shape[0], chunk_size):
+            chunk = _normalize(data[start:start + chunk_size].astype(np.float32))
+            keep[start:start + chunk_size] = (chunk @ targets.T).max(axis=1) > min_threshold
+    kept_rows = np.flatnonzero(keep)
+    new_row = np.full(data.shape[0], -1, dtype=np.int64)
+    new_row[kept_rows] = np.arange(kept_rows.size)
+
+    # Every key (orth hash) that points at a kept row, sorted for searchsorted
+    all_keys = np.fromiter(vectors.key2row.keys(), dtype=np.uint64, count=len(vectors.key2row))
+    all_rows = np.fromiter(vectors.key2row.values(), dtype=np.int64, count=len(vectors.key2row))
+    kept_keys = new_row[all_rows] >= 0
+    order = np.argsort(all_keys[kept_keys])
+    keys = all_keys[kept_keys][order]
+    key_rows = new_row[all_rows[kept_keys]][order].astype(np.int32)
+
+    unit = _normalize(data[kept_rows].astype(np.float32)) if kept_rows.size else np.zeros((0, data.shape[1]), np.float32)
+    scales = None
+    if dtype == "float16":
+        quantized = unit.astype(np.float16)
+    else:
+        scales = np.abs(unit).max(axis=1) / 127.0 if kept_rows.size else np.zeros(0, np.float32)
+        scales[scales == 0] = 1.0
+        quantized = np.round(unit / scales[:, None]).astype(np.int8)
+        scales = scales.astype(np.float32)
+
+    meta = {
+        "source": source,
+        "dtype": dtype,
+        "dim": int(data.shape[1]),
+        "rows": int(kept_rows.size),
+        "keys": int(keys.size),
+        "threshold": threshold,
+        "min_threshold": min_threshold,
+        "target_words": target_words,
+        "full_rows": int(data.shape[0]),
+        "full_keys": len(vectors.key2row),
+        "full_table_bytes": int(data.nbytes),
+    }
+    return CompactVectorStore(keys, key_rows, quantized, scales, meta)
+
+def _evaluate_matching(csv_path: str, store: CompactVectorStore) -> Dict:
+    """
+    Semantic hits and urgency predictions of the configured model with its full table vs the
+    store (same pipeline, same trained model), i.e. how faithful the pruned, quantized rows are.
+    """
+    import pandas as pd
+    from src.model_registry import registry
+    from src.semantic_matcher import SemanticLexicon, SEMANTIC_CATEGORIES
+    from src.JSON_Extracter import analyze_emails_batch
+
+    df = pd.read_csv(csv_path)
+    texts = [f"{subject} {body}" for subject, body in zip(df['subject'].astype(str), df['body'].astype(str))]
+
+    full_lexicon = registry.semantic_lexicon
+    compact_lexicon = SemanticLexicon(registry.nlp.vocab, SEMANTIC_CATEGORIES, full_lexicon.threshold, vectors=store)
+    docs = list(registry.nlp.pipe(texts))
+    same_hits = sum(full_lexicon.semantic_hits(doc) == compact_lexicon.semantic_hits(doc) for doc in docs)
+
+    predictions = {}
+    try:
+        for name, lexicon in (("full", full_lexicon), ("compact", compact_lexicon)):
+            registry.set_semantic_lexicon(lexicon)
+            predictions[name] = [a.urgency_level for a in analyze_emails_batch(texts, cascade=False)]
+    finally:
+        registry.set_semantic_lexicon(full_lexicon)
+
+    return {
+        "emails": len(texts),
+        "semantic_hits_agreement": same_hits / len(docs) if docs else 1.0,
+        "prediction_agreement": float(np.mean([a == b for a, b in zip(predictions["full"], predictions["compact"])])),
+    }
+
+def _measure_configurations(csv_path: str, store_path: str, source_model: str, profile: str) -> List[Dict]:
+    """
+    Process RSS growth from loading the models, and the accuracy of a tree retrained on that
+    configuration's features, each measured in a fresh process: the source model with its full
+    table, the same model with the store (the table stays loaded for NER), and sm with the store.
+    """
+    from src.benchmark_spacy_profiles import measure_configuration
+    from src.model_registry import SPACY_MODEL_TIERS
+
+    configurations = [
+        (f"{source_model}", source_model, None),
+        (f"{source_model} + store", source_model, store_path),
+        (f"{SPACY_MODEL_TIERS['sm']} + store", SPACY_MODEL_TIERS['sm'], store_path),
+    ]
+    rows = []
+    for name, model, vector_store in configurations:
+        print(f"Measuring {name}...")
+        rows.append({"name": name, **measure_configuration(model, profile, vector_store, csv_path)})
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the compact semantic vector store and report its accuracy and memory.")
+    parser.add_argument("--dtype", choices=VECTOR_STORE_DTYPES, default="int8")
+    parser.add_argument("--out", default=VECTOR_STORE_DIR, help="Directory the store is written to.")
+    parser.add_argument("--margin", type=float, default=PRUNE_MARGIN, help="Similarity margin below the threshold that is kept.")
+    parser.add_argument("--csv", default='dataset/synthetic_emails_500.csv', help="Labeled emails for the accuracy check.")
+    parser.add_argument("--no-eval", action="store_true", help="Only build the store.")
+    args = parser.parse_args()
+
+    from src.model_registry import registry
+    from src.semantic_matcher import SEMANTIC_CATEGORIES
+
+    # The store is always built from (and compared against) the full table of the configured model
+    registry.vector_store_path = None
+    nlp = registry.nlp
+    if nlp.vocab.vectors.shape[0] == 0:
+        parser.error(f"{registry.spacy_model} has no word vectors to build the store from (use the md or lg tier).")
+
+    start = time.perf_counter()
+    store = build_vector_store(nlp.vocab, SEMANTIC_CATEGORIES, registry.semantic_lexicon.threshold,
+                               dtype=args.dtype, margin=args.margin, source=registry.spacy_model)
+    store.save(args.out)
+    store = CompactVectorStore.load(args.out)
+    meta = store.meta
+    print(f"Built {args.out} from {meta['source']} in {time.perf_counter() - start:.1f}s: "
+          f"{meta['rows']}/{meta['full_rows']} rows, {meta['keys']}/{meta['full_keys']} keys, {meta['dtype']}")
+    full_mb = meta['full_table_bytes'] / 1024 ** 2
+    store_mb = store.nbytes / 1024 ** 2
+    print(f"Vector table of {meta['source']}: {full_mb:.2f} MiB; store: {store_mb:.3f} MiB on disk (memory-mapped). "
+          f"With {meta['source']} the table stays loaded for NER, so only the sm tier + store saves memory.")
+
+    if not args.no_eval:
+        report = _evaluate_matching(args.csv, store)
+        print(f"Semantic hits identical on {report['semantic_hits_agreement']:.2%} of {report['emails']} emails, "
+              f"urgency predictions identical on {report['prediction_agreement']:.2%}")
+
+        rows = _measure_configurations(args.csv, args.out, meta['source'], registry.spacy_profile)
+        print(f"\n{'configuration':32s} {'vector rows':>11s} {'models RSS MiB':>14s} {'peak MiB':>9s} {'accuracy':>8s}")
+        for row in rows:
+            if "error" in row:
+                print(f"{row['name']:32s} skipped: {row['error']}")
+                continue
+            print(f"{row['name']:32s} {row['vector_table_rows']:11d} {row['models_rss_mb']:14.1f} "
+                  f"{row['peak_rss_mb']:9.1f} {row['accuracy']:8.4f}")
+        baseline, shipped = rows[0], rows[-1]
+        if "error" not in baseline and "error" not in shipped:
+            print(f"sm + store vs {meta['source']}: {baseline['models_rss_mb'] - shipped['models_rss_mb']:+.1f} MiB RSS saved, "
+                  f"accuracy {shipped['accuracy'] - baseline['accuracy']:+.4f} (each tree retrained on its own features)")
@@ -0,0 +1,96 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+from google.oauth2.credentials import Credentials
+
+# Google credentials shared by every server process (e.g. the workers of src.prefork_server):
+# whichever worker handles the OAuth callback or refreshes a token writes it here, and every
+# other worker reads it from here. The file holds OAuth tokens; it is created readable by its
+# owner only.
+CREDENTIALS_DB_PATH = os.getenv("PARTISH_CREDENTIALS_DB", "cache/credentials.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS credentials (
+    key TEXT PRIMARY KEY,           -- "session:<name>" (logged-in session) or "account:<gmail address>"
+    credentials BLOB NOT NULL,      -- pickled google.oauth2 Credentials
+    updated_at REAL NOT NULL
+);
+"""
+
+class CredentialStore:
+    """
+    SQLite table of pickled Credentials by key. Reads unpickle a row only when it changed since
+    this process last read it, so the same Credentials object is returned until another process
+    (or set()) replaces it.
+    """
+
+    def __init__(self, path: str = CREDENTIALS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._cache: Dict[str, Tuple[float, Credentials]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid != os.getpid():
+            # Opened before a fork: SQLite connections must not be shared across processes
+            self._conn = None
+            self._cache.clear()
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            if not os.path.exists(self.path):
+                os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Credentials]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT updated_at, credentials FROM credentials WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._cache.pop(key, None)
+                return None
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1]
+            credentials = pickle.loads(row[1])
+            self._cache[key] = (row[0], credentials)
+            return credentials
+
+    def set(self, key: str, credentials: Credentials):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO credentials (key, credentials, updated_at) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(credentials), now)
+                )
+            self._cache[key] = (now, credentials)
+
+    def keys(self, prefix: str = "") -> Set[str]:
+        """Stored keys starting with 'prefix'."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key FROM credentials WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._cache.clear()
+
+# The store shared by the auth router and the background jobs
+credential_store = CredentialStore()
@@ -1,9 +1,50 @@
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import re
 
+# Define default times for events without explicit time
+DEFAULT_START_TIME = time(9, 0, 0) # 9 AM
+DEFAULT_END_TIME = time(17, 0, 0)  # 5 PM (for full-day events)
+EOD_OVERRIDE_TIME = time(17, 0, 0) # 5 PM for explicit EOD
+
+# Parsed deadlines memoized per (normalized string, base date); the same phrases recur constantly
+DEADLINE_CACHE_SIZE = 4096
+
+# Date words stripped from the string to isolate its time part (see _parse_deadline_dateutil)
+_TIME_STRIP_RE = re.compile(r'\b(?:' + '|'.join([
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december',
+    'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun',
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'today', 'tomorrow', 'next week', 'next month', 'eod', 'eow',
+    r'\d{1,2}(?:st|nd|rd|th)?', # day of month
+    r'\d{4}', # year
+]) + r')\b', re.IGNORECASE)
+_YEAR_RE = re.compile(r'\d{4}')
+
+# --- Fast path vocabulary (the forms dateutil would parse the same way) ---
+_WEEKDAYS = {
+    'monday': MO, 'mon': MO, 'tuesday': TU, 'tue': TU, 'wednesday': WE, 'wed': WE,
+    'thursday': TH, 'thu': TH, 'friday': FR, 'fri': FR, 'saturday': SA, 'sat': SA, 'sunday': SU, 'sun': SU,
+}
+_MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4,
+    'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sep': 9, 'sept': 9, 'october': 10, 'oct': 10, 'november': 11, 'nov': 11,
+    'december': 12, 'dec': 12,
+}
+# Words that carry no date or time for dateutil (fuzzy mode skips them)
+_FILLER_WORDS = {'by', 'on', 'at', 'due', 'before', 'until', 'the', 'this', 'next', 'please'}
+# Words of the relative terms understood by _parse_common_relative_date
+_RELATIVE_WORDS = {'today', 'tomorrow', 'eod', 'eow', 'end', 'of', 'day', 'week', 'month'}
+_TOKEN_RE = re.compile(r'[a-z]+|\d+(?:st|nd|rd|th|am|pm)?|\S')
+_CLOCK_RE = re.compile(r'(\d{1,2})(am|pm)')
+_DAY_RE = re.compile(r'(\d{1,2})(?:st|nd|rd|th)?')
+_ISO_DATE_RE = re.compile(r'(?:(?:by|on|due|before|until)\s+)*(\d{4})-(\d{2})-(\d{2})')
+
 def _parse_common_relative_date(text: str, base_date: datetime) -> Optional[datetime.date]:
     """Helper to parse common relative date terms."""
     text_lower = text.lower()
@@ -26,43 +67,116 @@ def _parse_common_relative_date(text: str, base_date: datetime) -> Optional[date
 
     return None
 
-def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tuple[datetime, datetime]:
-    """
-    Parses a natural language deadline string into start and end datetime objects for a calendar event.
+def _event_window(deadline_lower: str, parsed_date: date, parsed_time: Optional[time]) -> Tuple[datetime, datetime]:
+    """Start and end of the calendar event for a parsed date and (optional) time."""
+    start_dt = datetime.combine(parsed_date, parsed_time if parsed_time else DEFAULT_START_TIME)
 
-    Args:
-        deadline_str: The string extracted as a deadline (e.g., "by Friday", "22 October 2025", "EOD tomorrow").
-        base_date: The reference date for relative deadlines (e.g., 'today', 'tomorrow'). Defaults to now.
+    # Adjust for 'EOD' override
+    if "eod" in deadline_lower or "end of day" in deadline_lower:
+        start_dt = start_dt.replace(hour=EOD_OVERRIDE_TIME.hour, minute=EOD_OVERRIDE_TIME.minute)
+        end_dt = start_dt + timedelta(hours=1) # EOD is typically a point, assume 1hr event
+    elif parsed_time: # If a specific time was parsed
+        end_dt = start_dt + timedelta(hours=1) # Assume 1 hour event
+    else: # No specific time, use default workday
+        end_dt = start_dt.replace(hour=DEFAULT_END_TIME.hour, minute=DEFAULT_END_TIME.minute)
+    return start_dt, end_dt
 
-    Returns:
-        A tuple of (start_datetime, end_datetime) for the event.
-        Returns (None, None) if the string cannot be reliably parsed into a date.
+def _fast_parse(deadline_lower: str, base_date: datetime) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
     """
-    if base_date is None:
-        base_date = datetime.now()
-    
-    # Define default times for events without explicit time
-    default_start_time = time(9, 0, 0) # 9 AM
-    default_end_time = time(17, 0, 0)  # 5 PM (for full-day events)
-    eod_override_time = time(17, 0, 0) # 5 PM for explicit EOD
+    Hand-rolled parser for the common forms: relative terms ("EOD tomorrow", "next week"),
+    weekdays ("by Friday"), a clock time ("3pm") on either, and absolute dates with or without
+    a year ("22 October 2025", "Oct 22", "2025-10-22"). Gives exactly what the dateutil path
+    gives for these forms; returns None for anything else, which then goes to dateutil.
+    """
+    base_day = base_date.date()
+
+    iso = _ISO_DATE_RE.fullmatch(deadline_lower)
+    if iso:
+        try:
+            parsed_date = date(int(iso.group(1)), int(iso.group(2)), int(iso.group(3)))
+        except ValueError:
+            return None
+        # Explicit year: a past date stays in the past (missed deadline)
+        return _event_window(deadline_lower, parsed_date, None)
+
+    weekday = None
+    clock = None
+    month = None
+    day = None
+    year = None
+    has_relative_word = False
+    for token in _TOKEN_RE.findall(deadline_lower):
+        if token in _FILLER_WORDS or token == ',':
+            continue
+        if token in _RELATIVE_WORDS:
+            has_relative_word = True
+        elif token in _WEEKDAYS and weekday is None:
+            weekday = _WEEKDAYS[token]
+        elif token in _MONTHS and month is None:
+            month = _MONTHS[token]
+        elif _CLOCK_RE.fullmatch(token) and clock is None:
+            hour, meridiem = _CLOCK_RE.fullmatch(token).groups()
+            hour = int(hour)
+            if not 1 <= hour <= 12:
+                return None
+            clock = time(hour % 12 + (12 if meridiem == 'pm' else 0))
+        elif len(token) == 4 and token.isdigit() and year is None:
+            year = int(token)
+        elif _DAY_RE.fullmatch(token) and day is None:
+            day = int(_DAY_RE.fullmatch(token).group(1))
+        else:
+            return None
+
+    # A 9 AM time equals dateutil's default time, which the slow path reads as "no time given"
+    if clock == DEFAULT_START_TIME:
+        clock = None
 
+    relative_date = _parse_common_relative_date(deadline_lower, base_date)
+    if month is not None or day is not None or year is not None:
+        # Absolute date: "22 October", "October 22nd 2025" (nothing relative mixed in)
+        if relative_date is not None or has_relative_word or weekday is not None or clock is not None:
+            return None
+        if month is None or day is None:
+            return None
+        try:
+            parsed_date = date(year if year is not None else base_day.year, month, day)
+        except ValueError:
+            return None
+        if parsed_date < base_day and year is None:
+            # No explicit year: treated as an upcoming date, like the dateutil path
+            parsed_date += timedelta(weeks=1)
+        return _event_window(deadline_lower, parsed_date, None)
+
+    if relative_date is not None:
+        return _event_window(deadline_lower, relative_date, clock)
+    if has_relative_word:
+        return None
+    if weekday is not None:
+        # dateutil resolves a bare weekday to the next such day (today if it is that day)
+        return _event_window(deadline_lower, base_day + relativedelta(weekday=weekday), clock)
+    if clock is not None:
+        return _event_window(deadline_lower, base_day, clock)
+    return None
+
+def _parse_deadline_dateutil(deadline_str: str, base_date: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """General path for any deadline string, built on dateutil's fuzzy parser."""
     # Prepare a default datetime object for parse() call
     # This provides a base date and default time for missing components
     default_dt_for_parse_call = base_date.replace(
-        hour=default_start_time.hour,
-        minute=default_start_time.minute,
+        hour=DEFAULT_START_TIME.hour,
+        minute=DEFAULT_START_TIME.minute,
         second=0, microsecond=0
     )
 
     deadline_lower = deadline_str.lower()
-    
+
     try:
         # --- 1. Determine the Date Component ---
         parsed_date_component = None
-        
+
         # First, try explicit relative date keywords
         parsed_date_component = _parse_common_relative_date(deadline_str, base_date)
-        
+
         # If not found by helper, use dateutil.parser for the date part
         temp_parsed_dt = None
         if parsed_date_component is None:
@@ -85,16 +199,8 @@ def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tupl
             parsed_time_component = temp_parsed_dt.time()
         else: # Try to parse time from string after date part is "removed"
             # Attempt to strip date info from string to isolate time
-            time_str_candidate = re.sub(r'\b(?:' + '|'.join([
-                'january', 'february', 'march', 'april', 'may', 'june',
-                'july', 'august', 'september', 'october', 'november', 'december',
-                'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun',
-                'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
-                'today', 'tomorrow', 'next week', 'next month', 'eod', 'eow',
-                r'\d{1,2}(?:st|nd|rd|th)?', # day of month
-                r'\d{4}', # year
-            ]) + r')\b', '', deadline_lower, flags=re.IGNORECASE).strip()
-            
+            time_str_candidate = _TIME_STRIP_RE.sub('', deadline_lower).strip()
+
             # Now try to parse time from the cleaned string
             try:
                 time_only_dt = parse(time_str_candidate, fuzzy=True, default=default_dt_for_parse_call)
@@ -105,16 +211,7 @@ def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tupl
 
 
         # --- 3. Construct start_dt and end_dt ---
-        start_dt = datetime.combine(parsed_date_component, parsed_time_component if parsed_time_component else default_start_time)
-        
-        # Adjust for 'EOD' override
-        if "eod" in deadline_lower or "end of day" in deadline_lower:
-            start_dt = start_dt.replace(hour=eod_override_time.hour, minute=eod_override_time.minute)
-            end_dt = start_dt + timedelta(hours=1) # EOD is typically a point, assume 1hr event
-        elif parsed_time_component: # If a specific time was parsed
-            end_dt = start_dt + timedelta(hours=1) # Assume 1 hour event
-        else: # No specific time, use default workday
-            end_dt = start_dt.replace(hour=default_end_time.hour, minute=default_end_time.minute)
+        start_dt, end_dt = _event_window(deadline_lower, parsed_date_component, parsed_time_component)
 
         # --- 4. Heuristic: Ensure future-oriented dates are in the future ---
         # If the parsed date (ignoring time) is before the base date, and it's a relative term (e.g. "Friday")
@@ -122,8 +219,8 @@ def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tupl
         if start_dt.date() < base_date.date():
             # Avoid advancing explicit dates like "22 October 2025" if they are in the past (missed deadline).
             # This is a bit tricky, but we can check if the original string explicitly contains a year.
-            has_explicit_year = bool(re.search(r'\d{4}', deadline_str))
-            
+            has_explicit_year = bool(_YEAR_RE.search(deadline_str))
+
             if not has_explicit_year: # If no explicit year, it's likely a relative term that needs advancing
                 start_dt += relativedelta(weeks=+1)
                 end_dt += relativedelta(weeks=+1)
@@ -134,29 +231,79 @@ def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tupl
         print(f"Could not parse deadline string '{deadline_str}': {e}")
         return None, None
 
+def _normalize_deadline(deadline_str: str) -> str:
+    """Cache key form of a deadline string: lowercase, single spaces (parsing is case-insensitive)."""
+    return " ".join(deadline_str.lower().split())
+
+@lru_cache(maxsize=DEADLINE_CACHE_SIZE)
+def _parse_deadline_cached(normalized: str, base_day: date) -> Tuple[Optional[datetime], Optional[datetime]]:
+    # The result only depends on the base date's day, not its time of day
+    base_date = datetime.combine(base_day, time())
+    result = _fast_parse(normalized, base_date)
+    if result is None:
+        result = _parse_deadline_dateutil(normalized, base_date)
+    return result
+
+def parse_deadline_string(deadline_str: str, base_date: datetime = None) -> Tuple[datetime, datetime]:
+    """
+    Parses a natural language deadline string into start and end datetime objects for a calendar event.
+
+    Args:
+        deadline_str: The string extracted as a deadline (e.g., "by Friday", "22 October 2025", "EOD tomorrow").
+        base_date: The reference date for relative deadlines (e.g., 'today', 'tomorrow'). Defaults to now.
+
+    Returns:
+        A tuple of (start_datetime, end_datetime) for the event.
+        Returns (None, None) if the string cannot be reliably parsed into a date.
+    """
+    if base_date is None:
+        base_date = datetime.now()
+    return _parse_deadline_cached(_normalize_deadline(deadline_str), base_date.date())
+
+def parse_deadlines_batch(deadline_strs: List[str], base_date: datetime = None) -> List[Tuple[datetime, datetime]]:
+    """
+    Parses many deadline strings against one base date (default: now), parsing each distinct
+    phrase once. Returns one (start, end) tuple per input, in the same order.
+    """
+    if base_date is None:
+        base_date = datetime.now()
+    base_day = base_date.date()
+    parsed: Dict[str, Tuple[Optional[datetime], Optional[datetime]]] = {}
+    results = []
+    for deadline_str in deadline_strs:
+        normalized = _normalize_deadline(deadline_str)
+        if normalized not in parsed:
+            parsed[normalized] = _parse_deadline_cached(normalized, base_day)
+        results.append(parsed[normalized])
+    return results
+
+def deadline_cache_info():
+    """Hits, misses and size of the parsed-deadline memo."""
+    return _parse_deadline_cached.cache_info()
+
+EXAMPLE_DEADLINES = [
+    "by Friday",
+    "22 October 2025",
+    "EOD tomorrow",
+    "next Tuesday 3 PM",
+    "due 2 days from now",
+    "next week",
+    "next month",
+    "tomorrow",
+    "6pm (UK time) on 22 October 2025" # From Cambridge email
+]
+
 # --- Example Usage (for testing the parser) ---
 if __name__ == "__main__":
     print("Script started.")
     print("--- Date Parser Test ---")
     print(f"Base Date: {datetime.now()}\n")
 
-    test_deadlines = [
-        "by Friday",
-        "22 October 2025",
-        "EOD tomorrow",
-        "next Tuesday 3 PM",
-        "due 2 days from now",
-        "next week",
-        "next month",
-        "tomorrow",
-        "6pm (UK time) on 22 October 2025" # From Cambridge email
-    ]
-
-    for dl_str in test_deadlines:
+    for dl_str in EXAMPLE_DEADLINES:
         print(f"Testing: '{dl_str}'")
         start_dt, end_dt = parse_deadline_string(dl_str)
         if start_dt and end_dt:
             print(f"  -> Start: {start_dt.isoformat()}, End: {end_dt.isoformat()}")
         else:
             print(f"  -> Could not parse.")
-        print("-" * 30)
\ No newline at end of file
+        print("-" * 30)
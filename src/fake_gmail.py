@@ -0,0 +1,320 @@
+import base64
+import email
+import json
+import re
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httplib2
+
+# Headers a real Gmail message typically carries besides From/Subject; they make the
+# fake 'full' payload about as heavy as a real one.
+_FILLER_HEADERS = [
+    ("Delivered-To", "me@example.com"),
+    ("Received", "by 2002:a05:6a10:9e8b:b0:4a1:1f0e:2c3d with SMTP id ab11csp123456pxb; Mon, 1 Jan 2024 09:00:00 -0800 (PST)"),
+    ("X-Received", "by 2002:a17:90a:e7c4:b0:2a1:3b2c:4d5e with SMTP id w4mr123456pjy.1; Mon, 1 Jan 2024 09:00:00 -0800 (PST)"),
+    ("ARC-Seal", "i=1; a=rsa-sha256; t=1704128400; cv=none; d=google.com; s=arc-20160816; b=" + "A" * 340),
+    ("ARC-Message-Signature", "i=1; a=rsa-sha256; c=relaxed/relaxed; d=google.com; s=arc-20160816; bh=" + "B" * 340),
+    ("ARC-Authentication-Results", "i=1; mx.google.com; dkim=pass header.i=@example.com; spf=pass smtp.mailfrom=example.com"),
+    ("Return-Path", "<bounce@example.com>"),
+    ("Received-SPF", "pass (google.com: domain of bounce@example.com designates 192.0.2.1 as permitted sender)"),
+    ("Authentication-Results", "mx.google.com; dkim=pass header.i=@example.com; spf=pass; dmarc=pass"),
+    ("DKIM-Signature", "v=1; a=rsa-sha256; c=relaxed/relaxed; d=example.com; s=s1; h=from:to:subject:date; b=" + "C" * 340),
+    ("MIME-Version", "1.0"),
+    ("Message-ID", "<0000000000001234@example.com>"),
+    ("To", "me@example.com"),
+    ("Content-Type", 'multipart/alternative; boundary="000000000000abcd"'),
+]
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+def make_message(index: int, sender: str, subject: str, body: str, sent_at: datetime) -> Dict:
+    """Builds a Gmail message resource (multipart/alternative with text and HTML parts)."""
+    headers = [{"name": name, "value": value} for name, value in _FILLER_HEADERS]
+    headers += [
+        {"name": "From", "value": sender},
+        {"name": "Subject", "value": subject},
+        {"name": "Date", "value": sent_at.strftime("%a, %d %b %Y %H:%M:%S +0000")},
+    ]
+    html = f"<html><body><div dir=\"ltr\"><p>{body}</p></div></body></html>"
+    return {
+        "id": f"{index:016x}",
+        "threadId": f"{index:016x}",
+        "labelIds": ["INBOX", "UNREAD", "CATEGORY_PERSONAL"],
+        "snippet": body[:100],
+        "historyId": str(1000 + index),
+        "internalDate": str(int(sent_at.timestamp() * 1000)),
+        "sizeEstimate": len(body) * 3 + 4000,
+        "payload": {
+            "partId": "",
+            "mimeType": "multipart/alternative",
+            "filename": "",
+            "headers": headers,
+            "body": {"size": 0},
+            "parts": [
+                {"partId": "0", "mimeType": "text/plain", "filename": "",
+                 "headers": [{"name": "Content-Type", "value": 'text/plain; charset="UTF-8"'}],
+                 "body": {"size": len(body), "data": _b64(body)}},
+                {"partId": "1", "mimeType": "text/html", "filename": "",
+                 "headers": [{"name": "Content-Type", "value": 'text/html; charset="UTF-8"'}],
+                 "body": {"size": len(html), "data": _b64(html)}},
+            ],
+        },
+    }
+
+def _parse_field_list(spec: str, pos: int) -> Tuple[Dict, int]:
+    """Parses a Google 'fields' selector such as 'a,b/c,d(e,f)' into a nested dict (None = whole value)."""
+    tree: Dict = {}
+    while pos < len(spec):
+        char = spec[pos]
+        if char == ')':
+            return tree, pos + 1
+        if char == ',':
+            pos += 1
+            continue
+        path = re.match(r'[^,()]+', spec[pos:]).group(0)
+        pos += len(path)
+        sub = None
+        if pos < len(spec) and spec[pos] == '(':
+            sub, pos = _parse_field_list(spec, pos + 1)
+        _merge_path(tree, path.strip().split('/'), sub)
+    return tree, pos
+
+def _merge_path(tree: Dict, path: List[str], sub: Optional[Dict]):
+    node = tree
+    for name in path[:-1]:
+        if name in node and node[name] is None:
+            return # Already selecting the whole value
+        node = node.setdefault(name, {})
+    last = path[-1]
+    if sub is None:
+        node[last] = None
+    elif node.get(last, {}) is not None:
+        node.setdefault(last, {}).update(sub)
+
+def _apply_fields(value, tree: Optional[Dict]):
+    """Keeps only the selected fields of a JSON value (lists apply the selector to every item)."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_apply_fields(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _apply_fields(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+class FakeGmailHttp:
+    """
+    Offline, httplib2.Http-compatible fake of the Gmail REST API, for tests and benchmarks.
+
+    Pass it to googleapiclient.discovery.build('gmail', 'v1', http=FakeGmailHttp(...)).
+    It serves users.getProfile, users.messages.list (with paging), users.messages.get
+    (full/metadata/minimal formats and 'fields' partial responses), users.history.list
+    (messageAdded records) and multipart batch requests. Every HTTP round
+    trip sleeps 'latency' seconds (plus transfer time when 'bytes_per_second' is set) and is
+    counted in stats(), so fetch strategies can be compared without network access.
+    """
+
+    def __init__(
+        self,
+        messages: List[Dict],
+        latency: float = 0.0,
+        bytes_per_second: Optional[float] = None,
+        email_address: str = "me@example.com"
+    ):
+        self.messages = messages
+        self._by_id = {msg['id']: msg for msg in messages}
+        self.email_address = email_address
+        self.history_id = max((int(msg['historyId']) for msg in messages), default=1000)
+        # History older than this answers 404, like Gmail after roughly a week
+        self.min_history_id = 0
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        # messages.get of these ids answers this status (e.g. 429 for a rate limit)
+        self.failing_ids: Dict[str, int] = {}
+
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.api_calls = 0
+        self.bytes_received = 0
+
+    @classmethod
+    def from_csv(cls, csv_path: str = 'dataset/synthetic_emails_500.csv', limit: Optional[int] = None, **kwargs) -> "FakeGmailHttp":
+        """Builds a fake mailbox from the synthetic email dataset (newest message first, like Gmail)."""
+        import pandas as pd
+        df = pd.read_csv(csv_path)
+        if limit is not None:
+            df = df.head(limit)
+
+        messages = []
+        for i, row in enumerate(df.itertuples(index=False)):
+            sent_at = datetime.fromisoformat(str(row.date))
+            messages.append(make_message(
+                i + 1, f"{row.sender_name} <{row.sender_email}>", str(row.subject), str(row.body), sent_at
+            ))
+        messages.sort(key=lambda msg: int(msg['internalDate']), reverse=True)
+        return cls(messages, **kwargs)
+
+    def stats(self) -> Dict:
+        return {"round_trips": self.round_trips, "api_calls": self.api_calls, "bytes_received": self.bytes_received}
+
+    def reset_stats(self):
+        with self._lock:
+            self.round_trips = 0
+            self.api_calls = 0
+            self.bytes_received = 0
+
+    def add_email(self, sender: str, subject: str, body: str, sent_at: Optional[datetime] = None) -> Dict:
+        """Delivers a new message to the top of the inbox and advances the mailbox historyId."""
+        with self._lock:
+            message = make_message(len(self.messages) + 1, sender, subject, body, sent_at or datetime.now())
+            self.history_id = max(self.history_id + 1, int(message['historyId']))
+            message['historyId'] = str(self.history_id)
+            self.messages.insert(0, message)
+            self._by_id[message['id']] = message
+        return message
+
+    def expire_history(self):
+        """Forgets all history up to now, so older startHistoryIds answer 404."""
+        self.min_history_id = self.history_id
+
+    # --- API handlers -------------------------------------------------------------------
+
+    def _list_messages(self, params: Dict) -> Tuple[int, Dict]:
+        max_results = int(params.get('maxResults', ['100'])[0])
+        offset = int(params.get('pageToken', ['0'])[0])
+        page = self.messages[offset:offset + max_results]
+        result = {
+            "messages": [{"id": msg['id'], "threadId": msg['threadId']} for msg in page],
+            "resultSizeEstimate": len(self.messages),
+        }
+        if offset + max_results < len(self.messages):
+            result["nextPageToken"] = str(offset + max_results)
+        return 200, result
+
+    def _get_message(self, msg_id: str, params: Dict) -> Tuple[int, Dict]:
+        if msg_id in self.failing_ids:
+            status = self.failing_ids[msg_id]
+            return status, {"error": {"code": status, "message": "Simulated failure."}}
+        message = self._by_id.get(msg_id)
+        if message is None:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+
+        msg_format = params.get('format', ['full'])[0]
+        if msg_format == 'minimal':
+            message = {key: value for key, value in message.items() if key != 'payload'}
+        elif msg_format == 'metadata':
+            wanted = set(params.get('metadataHeaders', []))
+            headers = [h for h in message['payload']['headers'] if not wanted or h['name'] in wanted]
+            payload = {"partId": "", "mimeType": message['payload']['mimeType'], "headers": headers}
+            message = dict(message, payload=payload)
+        return 200, message
+
+    def _list_history(self, params: Dict) -> Tuple[int, Dict]:
+        start = int(params['startHistoryId'][0])
+        if start < self.min_history_id:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+
+        label_id = params.get('labelId', [None])[0]
+        added = sorted(
+            (msg for msg in self.messages
+             if int(msg['historyId']) > start and (label_id is None or label_id in msg['labelIds'])),
+            key=lambda msg: int(msg['historyId'])
+        )
+        max_results = int(params.get('maxResults', ['100'])[0])
+        offset = int(params.get('pageToken', ['0'])[0])
+        page = added[offset:offset + max_results]
+        result = {"historyId": str(self.history_id)}
+        if page:
+            result["history"] = [
+                {"id": msg['historyId'],
+                 "messages": [{"id": msg['id'], "threadId": msg['threadId']}],
+                 "messagesAdded": [{"message": {"id": msg['id'], "threadId": msg['threadId'], "labelIds": msg['labelIds']}}]}
+                for msg in page
+            ]
+        if offset + max_results < len(added):
+            result["nextPageToken"] = str(offset + max_results)
+        return 200, result
+
+    def _dispatch(self, method: str, uri: str) -> Tuple[int, Dict]:
+        parsed = urllib.parse.urlparse(uri)
+        params = urllib.parse.parse_qs(parsed.query)
+        path = parsed.path
+
+        with self._lock:
+            self.api_calls += 1
+
+        if method == 'GET' and re.fullmatch(r'/gmail/v1/users/me/profile', path):
+            status, result = 200, {
+                "emailAddress": self.email_address,
+                "messagesTotal": len(self.messages),
+                "threadsTotal": len(self.messages),
+                "historyId": str(self.history_id),
+            }
+        elif method == 'GET' and re.fullmatch(r'/gmail/v1/users/me/history', path):
+            status, result = self._list_history(params)
+        elif method == 'GET' and re.fullmatch(r'/gmail/v1/users/me/messages', path):
+            status, result = self._list_messages(params)
+        elif method == 'GET' and re.fullmatch(r'/gmail/v1/users/me/messages/[^/]+', path):
+            status, result = self._get_message(urllib.parse.unquote(path.rsplit('/', 1)[1]), params)
+        else:
+            status, result = 404, {"error": {"code": 404, "message": f"Not found: {method} {path}"}}
+
+        if status == 200 and 'fields' in params:
+            result = _apply_fields(result, _parse_field_list(params['fields'][0], 0)[0])
+        return status, result
+
+    def _batch(self, body: str, content_type: str) -> Tuple[int, str, str]:
+        request = email.message_from_string(f"Content-Type: {content_type}\r\n\r\n{body}")
+        parts = request.get_payload()
+        if len(parts) > 100:
+            return 400, "application/json", json.dumps({"error": {"code": 400, "message": "Too many requests in batch."}})
+
+        boundary = "batch_fake_gmail_boundary"
+        chunks = []
+        for part in parts:
+            request_line = part.get_payload().lstrip().split('\n', 1)[0].strip()
+            method, uri, _ = request_line.split(' ', 2)
+            status, result = self._dispatch(method, uri)
+            content_id = part['Content-ID'].strip()[1:-1]
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(result)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return 200, f"multipart/mixed; boundary={boundary}", "".join(chunks)
+
+    # --- httplib2.Http interface ----------------------------------------------------------
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        path = urllib.parse.urlparse(uri).path
+
+        if method == 'POST' and (path == '/batch' or path.startswith('/batch/')):
+            if isinstance(body, bytes):
+                body = body.decode('utf-8')
+            status, content_type, content = self._batch(body, headers.get('content-type', ''))
+        else:
+            status, result = self._dispatch(method, uri)
+            content_type, content = "application/json; charset=UTF-8", json.dumps(result)
+
+        content = content.encode('utf-8')
+        with self._lock:
+            self.round_trips += 1
+            self.bytes_received += len(content)
+
+        delay = self.latency
+        if self.bytes_per_second:
+            delay += len(content) / self.bytes_per_second
+        if delay:
+            time.sleep(delay)
+
+        response = httplib2.Response({"status": str(status), "content-type": content_type})
+        return response, content
@@ -1,12 +1,45 @@
 from __future__ import print_function
 import base64
-from googleapiclient.discovery import build
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials # Import Credentials class
-from google.auth.transport.requests import Request as GoogleAuthRequest
+from src.google_services import service_cache
+
+try:
+    import fcntl
+except ImportError: # Windows: checkpoint writes are only serialized within one process
+    fcntl = None
 
 # Permission scope (ensure these match the scopes requested in app/routers/auth.py)
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Gmail accepts up to 100 calls per batch request, but batches larger than 50
+# are likely to trigger rate limiting.
+GMAIL_BATCH_LIMIT = 100
+DEFAULT_BATCH_SIZE = 50
+# Batch items that fail with a rate limit or server error are retried this many times,
+# after 0.5s, 1s, 2s, ... (rate limiting is the expected failure of large batches)
+FETCH_RETRIES = 3
+FETCH_BACKOFF_BASE = 0.5
+_RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+# Partial responses: only download the parts of a message each format is used for.
+# 'full' is needed for the body, 'metadata' when only the headers matter.
+MESSAGE_FIELDS = {
+    'full': 'id,threadId,historyId,internalDate,payload(mimeType,headers,body/data,parts(mimeType,body/data))',
+    'metadata': 'id,threadId,historyId,internalDate,payload/headers',
+}
+DEFAULT_METADATA_HEADERS = ('From', 'Subject')
+
+# Last synced historyId per Gmail account, for incremental sync (see sync_inbox)
+SYNC_STATE_PATH = os.getenv("PARTISH_SYNC_STATE", "cache/gmail_sync_state.json")
+
 def get_gmail_service(credentials: Credentials):
     """
     Returns a Google Gmail API service object using provided credentials.
@@ -14,34 +47,28 @@ def get_gmail_service(credentials: Credentials):
     if not credentials or not credentials.valid:
         raise ValueError("Invalid or expired Google credentials provided.")
     
+    # The requests transport is slow to import, so only load it when needed
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+
     # Refresh token if expired
     if credentials.expired and credentials.refresh_token:
         credentials.refresh(GoogleAuthRequest()) # Needs Request from google.auth.transport.requests
 
-    service = build('gmail', 'v1', credentials=credentials)
-    return service
-
-def get_email_details(service, msg_id):
-    message = service.users().messages().get(
-        userId='me',
-        id=msg_id,
-        format='full'
-    ).execute()
-
-    headers = message['payload']['headers']
-
-    subject = ""
-    sender = ""
+    # Built once per account and reused, along with its keep-alive connections
+    return service_cache.get('gmail', 'v1', credentials)
 
-    for header in headers:
-        if header['name'] == 'Subject':
-            subject = header['value']
-        if header['name'] == 'From':
-            sender = header['value']
+def _get_headers(payload: Dict) -> Dict[str, str]:
+    """Returns the message headers as a {name: value} dict (the last occurrence of a repeated header wins)."""
+    headers = {}
+    for header in payload.get('headers', []):
+        headers[header['name']] = header['value']
+    return headers
 
+def _get_body(payload: Dict) -> str:
+    """Returns the decoded text/plain body of a message payload."""
     body = ""
 
-    parts = message['payload'].get('parts')
+    parts = payload.get('parts')
 
     if parts:
         for part in parts:
@@ -50,8 +77,332 @@ def get_email_details(service, msg_id):
                 body = base64.urlsafe_b64decode(data).decode('utf-8')
                 break
     else:
-        data = message['payload']['body'].get('data')
+        data = payload.get('body', {}).get('data')
         if data:
             body = base64.urlsafe_b64decode(data).decode('utf-8')
 
-    return sender, subject, body
\ No newline at end of file
+    return body
+
+def parse_message(message: Dict) -> Dict:
+    """
+    Flattens a Gmail message resource into the fields the app uses:
+    id, threadId, historyId, internalDate, sender, subject, body and headers.
+    """
+    payload = message.get('payload', {})
+    headers = _get_headers(payload)
+    return {
+        'id': message.get('id'),
+        'threadId': message.get('threadId'),
+        'historyId': message.get('historyId'),
+        'internalDate': message.get('internalDate'),
+        'sender': headers.get('From', ""),
+        'subject': headers.get('Subject', ""),
+        'body': _get_body(payload),
+        'headers': headers,
+    }
+
+def get_email_details(service, msg_id):
+    message = service.users().messages().get(
+        userId='me',
+        id=msg_id,
+        format='full'
+    ).execute()
+
+    email_data = parse_message(message)
+    return email_data['sender'], email_data['subject'], email_data['body']
+
+def list_message_page(
+    service,
+    page_size: int = 100,
+    page_token: Optional[str] = None,
+    query: Optional[str] = None,
+    label_ids: Optional[List[str]] = None
+) -> Tuple[List[str], Optional[str]]:
+    """Lists one page of message ids (newest first) and returns it with the next page token."""
+    kwargs = {
+        'userId': 'me',
+        'maxResults': min(500, page_size),
+        'fields': 'messages/id,nextPageToken',
+    }
+    if query:
+        kwargs['q'] = query
+    if label_ids:
+        kwargs['labelIds'] = label_ids
+    if page_token:
+        kwargs['pageToken'] = page_token
+
+    results = service.users().messages().list(**kwargs).execute()
+    return [msg['id'] for msg in results.get('messages', [])], results.get('nextPageToken')
+
+def list_message_ids(service, max_results: int = 5, query: Optional[str] = None, label_ids: Optional[List[str]] = None) -> List[str]:
+    """
+    Lists the ids of the most recent messages, following nextPageToken until
+    'max_results' ids are collected. Only the ids are requested.
+    """
+    msg_ids = []
+    page_token = None
+    while len(msg_ids) < max_results:
+        page_ids, page_token = list_message_page(
+            service, page_size=max_results - len(msg_ids), page_token=page_token, query=query, label_ids=label_ids
+        )
+        msg_ids.extend(page_ids)
+        if not page_token:
+            break
+    return msg_ids[:max_results]
+
+def _retryable(exception: Exception) -> bool:
+    """True for rate limit (429, 403 rateLimitExceeded) and server errors, which may succeed later."""
+    if not isinstance(exception, HttpError):
+        return False
+    status = exception.resp.status
+    if status == 403:
+        content = exception.content.decode('utf-8', 'replace') if isinstance(exception.content, bytes) else str(exception.content)
+        return any(reason in content for reason in _RATE_LIMIT_REASONS)
+    return status == 429 or status >= 500
+
+def fetch_messages(
+    service,
+    msg_ids: Sequence[str],
+    format: str = 'full',
+    metadata_headers: Sequence[str] = DEFAULT_METADATA_HEADERS,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> List[Dict]:
+    """
+    Fetches many messages with Gmail batch HTTP requests: one round trip per 'batch_size'
+    messages instead of one per message. Each GET asks for the minimal 'format' and a
+    partial response ('fields'), so unused parts of the payload are never downloaded.
+
+    Returns parsed messages (see parse_message) in the order of 'msg_ids'. Messages that fail
+    with a rate limit or server error are retried with exponential backoff (FETCH_RETRIES
+    times); messages that still fail, or fail for another reason, are skipped.
+    """
+    return fetch_messages_reporting_failures(service, msg_ids, format, metadata_headers, batch_size)[0]
+
+def fetch_messages_reporting_failures(
+    service,
+    msg_ids: Sequence[str],
+    format: str = 'full',
+    metadata_headers: Sequence[str] = DEFAULT_METADATA_HEADERS,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Tuple[List[Dict], List[str]]:
+    """
+    Like fetch_messages, but also returns the ids that still failed with a rate limit or server
+    error after the retries (worth fetching again later). Messages that fail for another
+    reason (e.g. deleted meanwhile) are skipped, not reported.
+    """
+    if format not in MESSAGE_FIELDS:
+        raise ValueError(f"Unsupported format '{format}', expected one of {list(MESSAGE_FIELDS)}.")
+    batch_size = max(1, min(batch_size, GMAIL_BATCH_LIMIT))
+
+    messages: Dict[str, Dict] = {}
+    failed: List[str] = []
+
+    def _callback(request_id, response, exception):
+        if exception is None:
+            messages[request_id] = response
+        elif _retryable(exception):
+            failed.append(request_id)
+        else:
+            reason = f"HTTP {exception.resp.status}" if isinstance(exception, HttpError) else repr(exception)
+            print(f"Could not fetch message {request_id} ({reason}), skipping it.")
+
+    def _run_batches(ids: Sequence[str]):
+        for start in range(0, len(ids), batch_size):
+            batch = service.new_batch_http_request(callback=_callback)
+            for msg_id in ids[start:start + batch_size]:
+                kwargs = {'userId': 'me', 'id': msg_id, 'format': format, 'fields': MESSAGE_FIELDS[format]}
+                if format == 'metadata':
+                    kwargs['metadataHeaders'] = list(metadata_headers)
+                batch.add(service.users().messages().get(**kwargs), request_id=msg_id)
+            batch.execute()
+
+    unique_ids = list(dict.fromkeys(msg_ids))
+    _run_batches(unique_ids)
+    for attempt in range(FETCH_RETRIES):
+        if not failed:
+            break
+        retry_ids = list(failed)
+        failed.clear()
+        time.sleep(FETCH_BACKOFF_BASE * 2 ** attempt)
+        _run_batches(retry_ids)
+    for msg_id in failed:
+        print(f"Could not fetch message {msg_id} after {FETCH_RETRIES} retries, skipping it.")
+
+    return [parse_message(messages[msg_id]) for msg_id in unique_ids if msg_id in messages], list(failed)
+
+def fetch_recent_messages(service, max_results: int = 5, format: str = 'full', query: Optional[str] = None) -> List[Dict]:
+    """Lists and batch-fetches the most recent messages."""
+    msg_ids = list_message_ids(service, max_results=max_results, query=query)
+    if not msg_ids:
+        return []
+    return fetch_messages(service, msg_ids, format=format)
+
+def iter_message_chunks(
+    service,
+    msg_ids: Sequence[str],
+    format: str = 'full',
+    first_chunk: int = 2,
+    max_chunk: int = DEFAULT_BATCH_SIZE
+) -> Iterator[List[Dict]]:
+    """
+    Fetches messages in growing batches (first_chunk, 2x, 4x, ... up to max_chunk) and yields
+    each batch as soon as it arrives, so a consumer can start on the first messages after a
+    single small round trip while the rest are still being fetched.
+    """
+    start = 0
+    chunk = max(1, first_chunk)
+    while start < len(msg_ids):
+        yield fetch_messages(service, msg_ids[start:start + chunk], format=format)
+        start += chunk
+        chunk = min(chunk * 2, max_chunk)
+
+def get_profile(service) -> Dict:
+    """Returns the mailbox profile: emailAddress, messagesTotal and the current historyId."""
+    return service.users().getProfile(userId='me', fields='emailAddress,messagesTotal,historyId').execute()
+
+def list_history_message_ids(service, start_history_id: str, label_id: str = 'INBOX') -> Tuple[Optional[List[str]], str]:
+    """
+    Lists the ids of messages added to 'label_id' since 'start_history_id', newest first,
+    and returns them with the mailbox's latest historyId.
+
+    Returns (None, start_history_id) when the start point is too old (Gmail keeps history
+    for about a week and answers 404), in which case a full resync is needed.
+    """
+    msg_ids: List[str] = []
+    latest_history_id = start_history_id
+    page_token = None
+    while True:
+        kwargs = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'historyTypes': ['messageAdded'],
+            'labelId': label_id,
+            'fields': 'history/messagesAdded/message/id,historyId,nextPageToken',
+        }
+        if page_token:
+            kwargs['pageToken'] = page_token
+        try:
+            results = service.users().history().list(**kwargs).execute()
+        except HttpError as error:
+            if error.resp.status == 404:
+                return None, start_history_id
+            raise
+
+        for record in results.get('history', []):
+            msg_ids.extend(added['message']['id'] for added in record.get('messagesAdded', []))
+        latest_history_id = results.get('historyId', latest_history_id)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+    # History is returned oldest first; match messages.list, which is newest first
+    return list(reversed(list(dict.fromkeys(msg_ids)))), latest_history_id
+
+class SyncCheckpointStore:
+    """
+    Small JSON file mapping each checkpoint key ("<email>:<consumer>") to the last historyId synced.
+    Writes are atomic (unique temp file + rename) so a crash never leaves a half-written
+    checkpoint, and hold an exclusive lock on '<path>.lock' across the read-modify-write, so
+    processes sharing the file (e.g. prefork workers) never lose each other's keys.
+    """
+
+    def __init__(self, path: str = SYNC_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._read().get(key, {}).get('historyId')
+
+    def set(self, key: str, history_id: str):
+        with self._locked():
+            state = self._read()
+            state[key] = {'historyId': str(history_id), 'updated_at': time.time()}
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(state, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+# Checkpoints shared by the whole process
+sync_checkpoints = SyncCheckpointStore()
+
+def sync_inbox(
+    service,
+    max_results: int = 5,
+    format: str = 'full',
+    consumer: str = 'inbox',
+    checkpoints: Optional[SyncCheckpointStore] = None
+) -> Dict:
+    """
+    Incrementally syncs the inbox. With a stored historyId checkpoint only the messages added
+    since then are fetched (users.history.list), so polling costs one or two small calls when
+    nothing changed. Without a checkpoint, or when Gmail reports it as expired, it falls back
+    to a full resync of the 'max_results' most recent messages.
+
+    Checkpoints are kept per account and per 'consumer', so independent callers (e.g. the
+    analyze and process endpoints) each see every new message once. The new checkpoint is not
+    saved here: the caller saves it with checkpoints.set(sync['checkpoint_key'], sync['history_id'])
+    once it has handled the messages, so messages whose analysis failed are returned again.
+    Messages that could not be fetched (rate limit or server error after the retries) are
+    listed in 'failed_ids', and the checkpoint stays where it was, so the next sync returns
+    them again (along with the messages already returned this time).
+
+    Returns {'messages': [...parsed messages, newest first...], 'mode': 'incremental' | 'full',
+    'history_id': the new checkpoint (None: nothing to save), 'checkpoint_key': where to save it,
+    'failed_ids': ids that could not be fetched, 'user': the account's email address}.
+    """
+    checkpoints = checkpoints or sync_checkpoints
+    # The profile's historyId is read before listing, so nothing added meanwhile is skipped
+    profile = get_profile(service)
+    user = profile['emailAddress']
+    checkpoint_key = f"{user}:{consumer}"
+    current_history_id = profile['historyId']
+
+    start_history_id = checkpoints.get(checkpoint_key)
+    if start_history_id is not None:
+        if int(start_history_id) >= int(current_history_id):
+            return {'messages': [], 'mode': 'incremental', 'history_id': start_history_id,
+                    'checkpoint_key': checkpoint_key, 'failed_ids': [], 'user': user}
+
+        msg_ids, latest_history_id = list_history_message_ids(service, start_history_id)
+        if msg_ids is not None:
+            mode, history_id = 'incremental', latest_history_id
+        else:
+            print(f"History for {user} expired at {start_history_id}, running a full resync.")
+    if start_history_id is None or msg_ids is None:
+        msg_ids = list_message_ids(service, max_results=max_results)
+        mode, history_id = 'full', current_history_id
+
+    messages, failed_ids = fetch_messages_reporting_failures(service, msg_ids, format=format) if msg_ids else ([], [])
+    if failed_ids:
+        print(f"{len(failed_ids)} messages of {user} could not be fetched, keeping the checkpoint at {start_history_id}.")
+        history_id = start_history_id
+    return {'messages': messages, 'mode': mode, 'history_id': history_id,
+            'checkpoint_key': checkpoint_key, 'failed_ids': failed_ids, 'user': user}
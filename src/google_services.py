@@ -0,0 +1,292 @@
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from google.oauth2.credentials import Credentials
+
+# Google API service objects, built once per (API, account) instead of on every request.
+# discovery.build() parses the discovery document and generates the resource classes each
+# time, and creates a fresh HTTP transport whose TLS connections are thrown away with it.
+# Cached services share one keep-alive transport per account instead, with one httplib2
+# connection pool per thread (httplib2.Http is not thread-safe).
+
+# Cached service objects (least recently used dropped first)
+SERVICE_CACHE_SIZE = int(os.getenv("PARTISH_SERVICE_CACHE_SIZE", "64"))
+
+def _default_http():
+    # Same transport build() would create: 60 s timeout, 308 not followed as a redirect
+    from googleapiclient.http import build_http
+    return build_http()
+
+def credentials_key(credentials: Credentials) -> str:
+    return credentials.refresh_token or credentials.token
+
+class ThreadLocalAuthorizedHttp:
+    """
+    Acts like one google_auth_httplib2.AuthorizedHttp for a service object, but each thread
+    that uses it gets its own AuthorizedHttp over its own httplib2.Http. The per-thread
+    instances live as long as this object, so their keep-alive connections are reused by
+    every later request served by the same thread.
+    """
+
+    def __init__(self, credentials: Credentials, http_factory: Callable = _default_http):
+        self._credentials = credentials
+        self._http_factory = http_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._instances = []
+
+    @property
+    def credentials(self) -> Credentials:
+        return self._credentials
+
+    @credentials.setter
+    def credentials(self, credentials: Credentials):
+        # e.g. the account logged in again: every thread switches to the new credentials
+        self._credentials = credentials
+        with self._lock:
+            for instance in self._instances:
+                instance.credentials = credentials
+
+    @property
+    def http(self):
+        """This thread's AuthorizedHttp."""
+        instance = getattr(self._local, "http", None)
+        if instance is None:
+            from google_auth_httplib2 import AuthorizedHttp
+            instance = AuthorizedHttp(self._credentials, http=self._http_factory())
+            self._local.http = instance
+            with self._lock:
+                self._instances.append(instance)
+        return instance
+
+    @property
+    def threads(self) -> int:
+        """Threads that have their own transport so far."""
+        return len(self._instances)
+
+    def request(self, *args, **kwargs):
+        return self.http.request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Anything else the client library reads (e.g. redirect_codes) comes from this thread's transport
+        return getattr(self.http, name)
+
+    def close(self):
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for instance in instances:
+            instance.close()
+
+class ServiceCache:
+    """
+    LRU of built service objects keyed by (API, version, account), all built from the
+    static discovery documents bundled with google-api-python-client. Services of the same
+    account share its ThreadLocalAuthorizedHttp, so Gmail and Calendar calls made by one
+    thread reuse that thread's connections. Safe to use from the threads of the executor.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SERVICE_CACHE_SIZE,
+        http_factory: Callable = _default_http,
+        client_options: Optional[Dict] = None
+    ):
+        self.max_entries = max(1, max_entries)
+        self.http_factory = http_factory
+        self.client_options = client_options
+        self._lock = threading.Lock()
+        self._services: "OrderedDict[Tuple[str, str, str], object]" = OrderedDict()
+        self._transports: Dict[str, ThreadLocalAuthorizedHttp] = {}
+
+        self.hits = 0
+        self.builds = 0
+        self.build_seconds = 0.0
+
+    def _transport(self, credentials: Credentials) -> ThreadLocalAuthorizedHttp:
+        key = credentials_key(credentials)
+        transport = self._transports.get(key)
+        if transport is None:
+            transport = ThreadLocalAuthorizedHttp(credentials, self.http_factory)
+            self._transports[key] = transport
+        elif transport.credentials is not credentials:
+            transport.credentials = credentials
+        return transport
+
+    def get(self, api: str, version: str, credentials: Credentials):
+        """The service object for 'api'/'version' acting as the owner of 'credentials'."""
+        key = (api, version, credentials_key(credentials))
+        with self._lock:
+            service = self._services.get(key)
+            if service is not None:
+                self._services.move_to_end(key)
+                self._transport(credentials)
+                self.hits += 1
+                return service
+            transport = self._transport(credentials)
+
+        from googleapiclient.discovery import build
+        start = time.perf_counter()
+        service = build(
+            api, version, http=transport, static_discovery=True, cache_discovery=False,
+            client_options=self.client_options
+        )
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            # Another thread may have built it meanwhile; either copy works
+            service = self._services.setdefault(key, service)
+            self._services.move_to_end(key)
+            self.builds += 1
+            self.build_seconds += elapsed
+            while len(self._services) > self.max_entries:
+                (_, _, old_account), _ = self._services.popitem(last=False)
+                if not any(account == old_account for _, _, account in self._services):
+                    self._transports.pop(old_account).close()
+        return service
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.builds
+        mean_build_ms = self.build_seconds / self.builds * 1000 if self.builds else 0.0
+        return {
+            "services": len(self._services),
+            "accounts": len(self._transports),
+            "transports": sum(transport.threads for transport in list(self._transports.values())),
+            "hits": self.hits,
+            "builds": self.builds,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "mean_build_ms": round(mean_build_ms, 2),
+            # Every hit would have been a build() without the cache
+            "build_time_saved_s": round(self.hits * mean_build_ms / 1000, 2),
+        }
+
+    def clear(self):
+        with self._lock:
+            transports = list(self._transports.values())
+            self._services.clear()
+            self._transports.clear()
+        for transport in transports:
+            transport.close()
+
+# The cache used by get_gmail_service and get_calendar_service
+service_cache = ServiceCache()
+
+def _local_tls_server():
+    """HTTPS server on localhost answering every GET like messages.get, counting the TLS connections it accepts."""
+    import json
+    import ssl
+    import tempfile
+    from datetime import datetime, timedelta, timezone
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_dir = tempfile.mkdtemp()
+    cert_path, key_path = os.path.join(cert_dir, "cert.pem"), os.path.join(cert_dir, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+    counts = {"connections": 0}
+    body = json.dumps({"id": "0000000000000001", "threadId": "0000000000000001", "labelIds": ["INBOX"]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            counts["connections"] += 1
+            super().setup()
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counts
+
+def _run_requests(n: int, threads: int, get_service) -> float:
+    """Runs n (get service + messages.get) requests on a thread pool like run_in_threadpool; returns seconds."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def one_request(_):
+        get_service().users().messages().get(userId='me', id='0000000000000001', format='minimal').execute()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one_request, range(n)))
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    import httplib2
+    from googleapiclient.discovery import build
+    from google_auth_httplib2 import AuthorizedHttp
+
+    parser = argparse.ArgumentParser(description="Measure the per-request overhead removed by cached services and pooled transports.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=4, help="Like the threads of run_in_threadpool.")
+    args = parser.parse_args()
+
+    server, counts = _local_tls_server()
+    endpoint = {"api_endpoint": f"https://localhost:{server.server_address[1]}/"}
+    credentials = Credentials(token="benchmark-token")
+
+    def local_http():
+        # The self-signed local server stands in for googleapis.com
+        http = httplib2.Http(timeout=60, disable_ssl_certificate_validation=True)
+        http.redirect_codes = http.redirect_codes - {308}
+        return http
+
+    # Before: build() with a fresh transport on every request
+    def fresh_service():
+        return build('gmail', 'v1', http=AuthorizedHttp(credentials, http=local_http()), static_discovery=True,
+                     cache_discovery=False, client_options=endpoint)
+
+    cache = ServiceCache(http_factory=local_http, client_options=endpoint)
+    results = {}
+    for name, get_service in (("build per request", fresh_service),
+                              ("cached service", lambda: cache.get('gmail', 'v1', credentials))):
+        _run_requests(args.threads, args.threads, get_service) # warm up imports and thread transports
+        counts["connections"] = 0
+        seconds = _run_requests(args.requests, args.threads, get_service)
+        results[name] = (seconds, counts["connections"])
+
+    build_ms = min(
+        (lambda start: (fresh_service(), time.perf_counter() - start)[1])(time.perf_counter()) for _ in range(20)
+    ) * 1000
+    hit_us = min(
+        (lambda start: (cache.get('gmail', 'v1', credentials), time.perf_counter() - start)[1])(time.perf_counter())
+        for _ in range(1000)
+    ) * 1e6
+
+    print(f"{args.requests} Gmail requests over {args.threads} threads against a local TLS server:")
+    for name, (seconds, connections) in results.items():
+        print(f"  {name:<18} {seconds / args.requests * 1000:7.2f} ms/request  {connections:4d} TLS connections opened")
+    before, after = results["build per request"][0], results["cached service"][0]
+    print(f"Overhead removed: {(before - after) / args.requests * 1000:.2f} ms/request ({before / after:.1f}x faster)")
+    print(f"  discovery.build(): {build_ms:.2f} ms; cache hit: {hit_us:.1f} us")
+    print(f"Cache: {cache.stats()}")
+    server.shutdown()
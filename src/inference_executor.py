@@ -0,0 +1,221 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from src.model_registry import registry
+from src.JSON_Extracter import analyze_emails_batch, warmup, EmailAnalysis
+from src.analysis_cache import AnalysisCache, analysis_cache
+
+# Worker processes that run the analysis (0 = run it in a thread of the server process)
+INFERENCE_WORKERS = int(os.getenv("PARTISH_INFERENCE_WORKERS", "2"))
+# Analysis jobs that may be running or waiting at once; further jobs wait for a slot
+INFERENCE_QUEUE_SIZE = int(os.getenv("PARTISH_INFERENCE_QUEUE_SIZE", "16"))
+# Seconds a request waits for a free slot before it is rejected (503)
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("PARTISH_INFERENCE_QUEUE_TIMEOUT", "5"))
+# 'spawn' starts clean workers; 'fork' is faster but copies the server's threads state
+INFERENCE_START_METHOD = os.getenv("PARTISH_INFERENCE_START_METHOD", "spawn")
+
+class InferenceBusyError(Exception):
+    """Raised when every inference slot stays taken for longer than the queue timeout."""
+
+# Set in each worker process by _init_worker (see InferenceExecutor.start)
+_start_barrier = None
+
+def _init_worker(start_barrier=None):
+    """Runs once in every worker process: loads the models and warms them up."""
+    global _start_barrier
+    _start_barrier = start_barrier
+    registry.load()
+    if os.getenv("PARTISH_WARMUP", "1") == "1":
+        warmup()
+
+def _worker_status(wait_for_all: bool = False) -> Dict:
+    if wait_for_all and _start_barrier is not None:
+        # Every worker blocks here until all of them are up, so each one answers exactly once
+        _start_barrier.wait(timeout=300)
+    status = registry.status()
+    status["pid"] = os.getpid()
+    return status
+
+def _analyze_in_worker(texts: List[str], headers: Optional[List[Optional[Dict]]] = None) -> List[EmailAnalysis]:
+    return analyze_emails_batch(texts, headers=headers)
+
+class InferenceExecutor:
+    """
+    Runs email analysis (spaCy + VADER + classifier) off the event loop.
+
+    With workers > 0 the analysis runs in a pool of worker processes, each holding its own
+    loaded models; with workers == 0 it runs in a thread of the server process instead.
+    At most 'queue_size' jobs are running or queued at any time: further callers wait up to
+    'queue_timeout' seconds for a slot and then get InferenceBusyError, so a burst of requests
+    is pushed back to the clients instead of piling up in memory.
+    Emails found in the analysis cache (same or near-duplicate text) never take a slot.
+    Counts how many analyses the cascade screen settled at tier 0.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        queue_timeout: float = INFERENCE_QUEUE_TIMEOUT,
+        start_method: str = INFERENCE_START_METHOD,
+        cache: AnalysisCache = analysis_cache
+    ):
+        self.workers = max(0, workers)
+        self.queue_size = max(1, queue_size)
+        self.queue_timeout = queue_timeout
+        self.start_method = start_method
+        self.cache = cache
+        # Set when the models were already loaded and warmed up in this process before start()
+        # (e.g. inherited from the master of src.prefork_server); start() then skips that step
+        self.preloaded = False
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.worker_status: List[Dict] = []
+        self._status_task: Optional[asyncio.Task] = None
+        self.pool_restarts = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.tier_counts = {0: 0, 1: 0}
+        self.started_at: Optional[float] = None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(self.start_method)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.Barrier(self.workers),)
+        )
+
+    async def start(self):
+        """Starts the worker processes and waits until each has loaded its models."""
+        self._slots = asyncio.Semaphore(self.queue_size)
+        if self.workers == 0:
+            if not self.preloaded:
+                await run_in_threadpool(_init_worker)
+            self.worker_status = [_worker_status()]
+        else:
+            self._pool = self._new_pool()
+            await self._record_worker_status(self._pool)
+        self.started_at = time.time()
+
+    async def _record_worker_status(self, pool: ProcessPoolExecutor):
+        """Waits until every worker of 'pool' is up and records their status (if it is still the current pool)."""
+        loop = asyncio.get_running_loop()
+        # One call per worker at once makes the pool start all of them now, not on first use
+        status = await asyncio.gather(*(loop.run_in_executor(pool, _worker_status, True) for _ in range(self.workers)))
+        if self._pool is pool:
+            self.worker_status = status
+
+    async def _refresh_worker_status(self, pool: ProcessPoolExecutor):
+        try:
+            await self._record_worker_status(pool)
+        except Exception as e:
+            print(f"Could not read the status of the restarted inference workers: {e}")
+
+    async def analyze(
+        self,
+        texts: List[str],
+        timeout: Optional[float] = -1,
+        headers: Optional[List[Optional[Dict]]] = None
+    ) -> List[EmailAnalysis]:
+        """
+        Analyzes a batch of email texts without blocking the event loop.
+        'timeout' is how long to wait for a free slot (-1 = the executor's queue_timeout,
+        None = wait as long as needed, e.g. for background jobs).
+        'headers' (one dict per email, optional) lets the cascade screen recognize bulk mail.
+        Cached emails are answered directly; only the others are sent to the workers.
+        """
+        if self._slots is None:
+            raise RuntimeError("InferenceExecutor is not running (start() not called or already shut down).")
+        if not texts:
+            return []
+
+        return await self.cache.analyze_batch_async(
+            texts, lambda missing, missing_headers: self._analyze_uncached(missing, timeout, missing_headers), headers
+        )
+
+    async def _analyze_uncached(
+        self,
+        texts: List[str],
+        timeout: Optional[float],
+        headers: Optional[List[Optional[Dict]]] = None
+    ) -> List[EmailAnalysis]:
+        slots = self._slots
+        if slots is None:
+            raise RuntimeError("InferenceExecutor is not running (start() not called or already shut down).")
+
+        timeout = self.queue_timeout if timeout == -1 else timeout
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise InferenceBusyError(f"All {self.queue_size} inference slots are busy.")
+
+        self.in_flight += 1
+        try:
+            if self._pool is None:
+                results = await run_in_threadpool(analyze_emails_batch, texts, headers=headers)
+            else:
+                pool = self._pool
+                loop = asyncio.get_running_loop()
+                try:
+                    results = await loop.run_in_executor(pool, _analyze_in_worker, texts, headers)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory): replace the pool once so later calls work
+                    if self._pool is pool:
+                        print("Inference worker pool broke, restarting it.")
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        self._pool = self._new_pool()
+                        self.pool_restarts += 1
+                        # The listed processes are gone; the new ones are listed once they are up
+                        self.worker_status = []
+                        self._status_task = asyncio.create_task(self._refresh_worker_status(self._pool))
+                    raise
+            self.completed += 1
+            for result in results:
+                self.tier_counts[result.tier] += 1
+            return results
+        finally:
+            self.in_flight -= 1
+            slots.release()
+
+    async def shutdown(self):
+        """Lets submitted jobs finish, then stops the worker processes. New jobs are refused."""
+        self._slots = None
+        if self._status_task is not None:
+            self._status_task.cancel()
+            self._status_task = None
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await run_in_threadpool(pool.shutdown, True)
+
+    def status(self) -> Dict:
+        analyzed = self.tier_counts[0] + self.tier_counts[1]
+        return {
+            "mode": "process" if self.workers else "thread",
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "started_at": self.started_at,
+            "worker_pids": [status["pid"] for status in self.worker_status],
+            "pool_restarts": self.pool_restarts,
+            "cache": self.cache.stats(),
+            "cascade": {
+                "tier0": self.tier_counts[0],
+                "tier1": self.tier_counts[1],
+                "tier0_share": round(self.tier_counts[0] / analyzed, 4) if analyzed else 0.0,
+            },
+        }
+
+# The executor shared by the FastAPI app (started and stopped by its lifespan)
+inference_executor = InferenceExecutor()
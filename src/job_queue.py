@@ -0,0 +1,295 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Durable queue of per-message background jobs (analysis + calendar action of fetched mail).
+# Jobs survive restarts, are retried with exponential backoff, and are idempotent by Gmail
+# message id: queuing the same message again returns the existing job.
+JOB_DB_PATH = os.getenv("PARTISH_JOB_DB", "cache/jobs.sqlite3")
+# Attempts before a job is marked failed
+JOB_MAX_ATTEMPTS = int(os.getenv("PARTISH_JOB_MAX_ATTEMPTS", "5"))
+# Delay before the first retry; doubled on every further attempt, up to JOB_BACKOFF_MAX
+JOB_BACKOFF_BASE = float(os.getenv("PARTISH_JOB_BACKOFF_BASE", "2"))
+JOB_BACKOFF_MAX = 300.0
+# Seconds a claimed job stays leased to its process; the scheduler renews the lease while it runs
+# the job, so a job whose lease expired belongs to a process that died and is claimable again
+JOB_LEASE_SECONDS = float(os.getenv("PARTISH_JOB_LEASE", "60"))
+
+# queued -> running -> done | queued (retry) | failed
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,          -- the parsed email as JSON
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,        -- not claimed before this time (retry backoff)
+    analysis TEXT,                  -- EmailAnalysis JSON, kept so retries skip the analysis
+    result TEXT,                    -- outcome of the action as JSON
+    last_error TEXT,
+    owner_pid INTEGER,              -- process running the job (informational, pids are reused)
+    owner TEXT,                     -- token of the JobQueue (process) running the job
+    lease_expires REAL,             -- the owner renews this while it runs the job
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    UNIQUE (kind, user, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, priority DESC, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user, status, created_at);
+"""
+
+def backoff_delay(attempts: int, base: float = JOB_BACKOFF_BASE) -> float:
+    """Seconds before the next attempt of a job that failed 'attempts' times: 2s, 4s, 8s, ..."""
+    return min(JOB_BACKOFF_MAX, base * 2 ** max(0, attempts - 1))
+
+class JobQueue:
+    """
+    SQLite table of jobs, one per (kind, account, message id). Workers claim the
+    highest-priority runnable jobs in one transaction, so several workers (or processes sharing
+    the file) never run the same job twice. A claimed job is leased to this queue's owner token
+    for 'lease_seconds' and must be renewed (renew()) while it runs; once the lease expires,
+    e.g. because the process died, the job can be claimed again by any process.
+    """
+
+    def __init__(
+        self,
+        path: str = JOB_DB_PATH,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        backoff_base: float = JOB_BACKOFF_BASE,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._owner: Optional[str] = None
+        self._owner_pid: Optional[int] = None
+
+    @property
+    def owner(self) -> str:
+        """Token of this queue in this process (a forked child gets its own)."""
+        if self._owner_pid != os.getpid():
+            self._owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+            self._owner_pid = os.getpid()
+        return self._owner
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.executescript(_SCHEMA)
+            # Queues created before leases lack these columns
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_expires", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, kind: str, user: str, emails: List[Dict], priorities: List[float]) -> List[Tuple[int, bool]]:
+        """
+        Queues one job per parsed email (see gmail_access.parse_message). Returns (job id,
+        created) per email; a message that already has a job keeps it (created=False).
+        """
+        now = time.time()
+        results = []
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for email, priority in zip(emails, priorities):
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO jobs (kind, user, message_id, priority, payload, status, max_attempts, run_after, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                        (kind, user, email['id'], priority, json.dumps(email), self.max_attempts, now, now)
+                    )
+                    if cursor.rowcount:
+                        results.append((cursor.lastrowid, True))
+                    else:
+                        row = conn.execute(
+                            "SELECT id FROM jobs WHERE kind = ? AND user = ? AND message_id = ?", (kind, user, email['id'])
+                        ).fetchone()
+                        results.append((row[0], False))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return results
+
+    def claim(self, kind: str, limit: int, users: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Marks up to 'limit' runnable jobs (optionally only of 'users') as running, leased to this
+        queue, and returns them, highest priority first. Runnable are queued jobs whose retry
+        delay has passed and running jobs whose lease expired (their process died).
+        """
+        now = time.time()
+        where = [
+            "kind = ?",
+            "((status = 'queued' AND run_after <= ?) OR (status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)))",
+        ]
+        params: List = [kind, now, now]
+        if users is not None:
+            users = list(users)
+            if not users:
+                return []
+            where.append(f"user IN ({', '.join('?' * len(users))})")
+            params.extend(users)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT * FROM jobs WHERE {' AND '.join(where)} ORDER BY priority DESC, id LIMIT ?", params + [limit]
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, owner_pid = ?, owner = ?, "
+                    "lease_expires = ? WHERE id = ?",
+                    [(now, os.getpid(), self.owner, now + self.lease_seconds, row['id']) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        jobs = [self._row_to_dict(row, payload=True) for row in rows]
+        for job in jobs:
+            job['status'] = 'running'
+            job['attempts'] += 1
+        return jobs
+
+    def renew(self) -> int:
+        """Extends the lease of every job this queue is running. Returns the number of jobs."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+        return cursor.rowcount
+
+    def save_analysis(self, job_id: int, analysis: Dict):
+        with self._lock:
+            self._connect().execute("UPDATE jobs SET analysis = ? WHERE id = ?", (json.dumps(analysis), job_id))
+
+    def complete(self, job_id: int, result: Dict):
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'done', result = ?, last_error = NULL, finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id: int, error: str, retry: bool = True) -> str:
+        """Records a failed attempt: the job is retried after a backoff delay, or failed for good. Returns its new status."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT status, attempts, max_attempts, owner FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return "failed"
+            if row['status'] != 'running' or row['owner'] != self.owner:
+                # Already finished, recovered or (lease expired) claimed by another process in the meantime
+                return row['status']
+            if retry and row['attempts'] < row['max_attempts']:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', last_error = ?, run_after = ? WHERE id = ?",
+                    (error, now + backoff_delay(row['attempts'], self.backoff_base), job_id)
+                )
+                return "queued"
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?", (error, now, job_id)
+            )
+            return "failed"
+
+    def recover(self) -> int:
+        """
+        Re-queues the running jobs of this queue and those whose lease expired (their process
+        crashed or was killed), leaving the jobs leased to other live processes alone.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, owner = NULL, lease_expires = NULL "
+                "WHERE status = 'running' AND (owner = ? OR owner IS NULL OR lease_expires IS NULL OR lease_expires < ?)",
+                (now, self.owner, now)
+            )
+        return cursor.rowcount
+
+    def next_run_after(self, kind: str) -> Optional[float]:
+        """Earliest time a queued job of 'kind' becomes runnable (None if none is queued)."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT MIN(run_after) FROM jobs WHERE kind = ? AND status = 'queued'", (kind,)
+            ).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row, payload: bool = False) -> Dict:
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "user": row["user"],
+            "message_id": row["message_id"],
+            "priority": row["priority"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "run_after": row["run_after"],
+            "analysis": json.loads(row["analysis"]) if row["analysis"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "last_error": row["last_error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if payload:
+            job["email"] = json.loads(row["payload"])
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row is not None else None
+
+    def list(self, user: str, status: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Jobs of one account, newest first."""
+        sql = "SELECT * FROM jobs WHERE user = ?"
+        params: List = [user]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+# The queue shared by the API's job workers
+job_queue = JobQueue()
@@ -0,0 +1,69 @@
+import re
+from typing import Dict, List, Set
+
+# Keyword Dictionaries (shared by the trainer and the extractor)
+VERY_URGENT_TERMS = ["critical", "immediate", "asap", "urgent", "now", "crucial"]
+URGENT_TERMS = ["important", "deadline", "soon", "tomorrow", "end of day", "eod", "priority"]
+PROMO_TERMS = ["newsletter", "promo", "discount", "offer", "sale", "free"]
+
+# Terms for stronger signals
+STRONG_URGENT_TERMS_SIGNAL = ["urgent", "asap", "immediate", "critical", "deadline"]
+APPLICATION_TERMS = ["application", "applicant", "admissions", "apply", "form"]
+DEADLINE_KEYWORDS = ["deadline", "due by", "due on", "submit by", "before"]
+
+KEYWORD_CATEGORIES = {
+    "very_urgent": VERY_URGENT_TERMS,
+    "urgent": URGENT_TERMS,
+    "promo": PROMO_TERMS,
+    "strong_urgent": STRONG_URGENT_TERMS_SIGNAL,
+    "application": APPLICATION_TERMS,
+    "deadline_keyword": DEADLINE_KEYWORDS,
+}
+
+class KeywordMatcher:
+    """
+    Finds every keyword category present in a (lowercased) text in a single pass.
+
+    All terms of all categories are compiled into one alternation, equivalent to running
+    re.search(r'\\b' + re.escape(term) + r'\\b', text) for every term of every category.
+    The alternation sits inside a lookahead so matches may overlap, and terms that are a
+    word-bounded prefix of a longer term are credited whenever the longer term matches.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]] = KEYWORD_CATEGORIES):
+        self.categories = categories
+
+        self._term_categories: Dict[str, Set[str]] = {}
+        for name, terms in categories.items():
+            for term in terms:
+                self._term_categories.setdefault(term, set()).add(name)
+
+        # Longest terms first, so a longer term wins over its own prefix at the same position
+        terms = sorted(self._term_categories, key=len, reverse=True)
+        self._pattern = re.compile(r'(?=\b(' + '|'.join(re.escape(term) for term in terms) + r')\b)')
+
+        # Terms implied by a match of each term: itself plus its word-bounded prefix terms
+        self._implied_terms: Dict[str, Set[str]] = {
+            term: {term} | {
+                other for other in terms
+                if other != term and re.match(r'\b' + re.escape(other) + r'\b', term)
+            }
+            for term in terms
+        }
+
+    def matched_terms(self, text: str) -> Set[str]:
+        """Returns the set of matched terms (not categories)."""
+        found: Set[str] = set()
+        for m in self._pattern.finditer(text):
+            found |= self._implied_terms[m.group(1)]
+        return found
+
+    def match(self, text: str) -> Set[str]:
+        """Returns the names of all categories with at least one term present in the text."""
+        hits: Set[str] = set()
+        for term in self.matched_terms(text):
+            hits |= self._term_categories[term]
+        return hits
+
+# Precompiled matcher shared by training and serving, so both compute features identically
+KEYWORD_MATCHER = KeywordMatcher(KEYWORD_CATEGORIES)
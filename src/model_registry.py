@@ -0,0 +1,242 @@
+import os
+import pickle
+import hashlib
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+from src.semantic_matcher import SemanticLexicon, SEMANTIC_CATEGORIES
+from src.compact_vectors import CompactVectorStore
+from src.tree_predictor import load_compiled_tree, TREE_PATH
+from src.cascade import SCREEN_PATH
+
+# spaCy and VADER are imported when the models are loaded, not when this module is imported,
+# so importing the app (or any script) stays cheap until load()/warmup runs explicitly.
+if TYPE_CHECKING:
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+# spaCy model tier: sm (small, no static word vectors, so no semantic keyword matches),
+# md (default) or lg. PARTISH_SPACY_MODEL overrides the package name directly.
+# Train and serve with the same tier: the heuristic features depend on its NER and vectors.
+SPACY_MODEL_TIERS = {"sm": "en_core_web_sm", "md": "en_core_web_md", "lg": "en_core_web_lg"}
+SPACY_MODEL_TIER = os.getenv("PARTISH_SPACY_TIER", "md")
+SPACY_MODEL_NAME = os.getenv("PARTISH_SPACY_MODEL", SPACY_MODEL_TIERS.get(SPACY_MODEL_TIER, "en_core_web_md"))
+
+# Pipeline profiles: the components excluded at load time. The features only read tokens,
+# is_stop/is_punct, word vectors and entities, so 'lean' drops everything but the tokenizer
+# and NER (which has its own embedding layer in the en_core_web_* pipelines).
+SPACY_PROFILES = {
+    "full": [],
+    "lean": ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer"],
+}
+SPACY_PROFILE = os.getenv("PARTISH_SPACY_PROFILE", "lean")
+
+# Compact semantic vector store built by `python -m src.compact_vectors` (unset = the full
+# spaCy vector table). With a store, the semantic matching also works on the sm tier.
+VECTOR_STORE_PATH = os.getenv("PARTISH_VECTOR_STORE") or None
+
+# Default artifact locations (must match DecisionTree_Trainer.py)
+MODEL_PATH = 'models/urgency_model.pkl'
+VECTORIZER_PATH = 'models/vectorizer.pkl'
+
+def load_spacy_model(name: str = SPACY_MODEL_NAME, profile: str = SPACY_PROFILE):
+    """Loads a spaCy pipeline with the profile's components excluded, downloading the package first if it is missing."""
+    if profile not in SPACY_PROFILES:
+        raise ValueError(f"Unknown spaCy profile '{profile}', expected one of {list(SPACY_PROFILES)}.")
+    exclude = SPACY_PROFILES[profile]
+    import spacy
+    try:
+        nlp = spacy.load(name, exclude=exclude)
+    except OSError:
+        print(f"Downloading spaCy model '{name}'...")
+        # Using spacy.cli.download directly
+        spacy.cli.download(name)
+        nlp = spacy.load(name, exclude=exclude)
+
+    if exclude:
+        try:
+            nlp("Please submit the report by Friday.")
+        except Exception as e:
+            # e.g. a custom pipeline whose NER listens to the shared tok2vec
+            print(f"spaCy profile '{profile}' does not work with '{name}' ({e}), loading the full pipeline.")
+            nlp = spacy.load(name)
+    return nlp
+
+def _new_sentiment_analyzer() -> "SentimentIntensityAnalyzer":
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+def load_semantic_lexicon(vocab, vector_store_path: Optional[str] = VECTOR_STORE_PATH) -> SemanticLexicon:
+    """The semantic keyword index over the compact vector store if one is configured, else over the spaCy vectors."""
+    vectors = CompactVectorStore.load(vector_store_path) if vector_store_path else None
+    return SemanticLexicon(vocab, SEMANTIC_CATEGORIES, vectors=vectors)
+
+class ModelRegistry:
+    """
+    Process-wide holder for every model the analyzer needs: the spaCy pipeline, the VADER
+    analyzer, the semantic keyword index, and the trained urgency classifier + vectorizer.
+
+    Everything is loaded exactly once, either eagerly through load() (e.g. from the FastAPI
+    lifespan hook) or lazily on first access for scripts. Load times are recorded so
+    readiness and startup cost can be inspected through status().
+    """
+
+    def __init__(
+        self,
+        spacy_model: str = SPACY_MODEL_NAME,
+        spacy_profile: str = SPACY_PROFILE,
+        model_path: str = MODEL_PATH,
+        vectorizer_path: str = VECTORIZER_PATH,
+        tree_path: str = TREE_PATH,
+        screen_path: str = SCREEN_PATH,
+        vector_store_path: Optional[str] = VECTOR_STORE_PATH
+    ):
+        self.spacy_model = spacy_model
+        self.spacy_profile = spacy_profile
+        self.model_path = model_path
+        self.vectorizer_path = vectorizer_path
+        self.tree_path = tree_path
+        self.screen_path = screen_path
+        self.vector_store_path = vector_store_path
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._nlp = None
+        self._sentiment_analyzer = None
+        self._semantic_lexicon = None
+        self._clf = None
+        self._vectorizer = None
+        self._predictor = None
+        self._screen = None
+
+        self.load_times_ms: Dict[str, float] = {}
+        self.warmup_ms: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+
+    def _timed(self, name: str, loader):
+        start = time.perf_counter()
+        value = loader()
+        self.load_times_ms[name] = (time.perf_counter() - start) * 1000
+        return value
+
+    def _load_classifier(self):
+        """
+        Loads the urgency predictor and vectorizer, if they have been trained.
+        The compiled tree export is preferred when it matches the pickled model, in which case
+        the sklearn classifier itself is never unpickled. The cascade screen is loaded when it
+        was trained with this vectorizer.
+        """
+        if not (os.path.exists(self.model_path) and os.path.exists(self.vectorizer_path)):
+            # Models not found, proceed without ML
+            return
+        try:
+            with open(self.model_path, 'rb') as f:
+                model_bytes = f.read()
+            with open(self.vectorizer_path, 'rb') as f:
+                vectorizer_bytes = f.read()
+            vectorizer = pickle.loads(vectorizer_bytes)
+
+            compiled = load_compiled_tree(self.tree_path, hashlib.sha256(model_bytes).hexdigest())
+            if compiled is not None:
+                self._predictor = compiled
+            else:
+                self._clf = pickle.loads(model_bytes)
+                self._predictor = self._clf
+            self._vectorizer = vectorizer
+
+            if os.path.exists(self.screen_path):
+                self._screen = load_compiled_tree(self.screen_path, hashlib.sha256(vectorizer_bytes).hexdigest())
+                if self._screen is None:
+                    print(f"Cascade screen {self.screen_path} is stale, retrain it with `python -m src.cascade`.")
+        except Exception as e:
+            print(f"Error loading models: {e}")
+            self._clf = None
+            self._vectorizer = None
+            self._predictor = None
+            self._screen = None
+
+    def load(self) -> "ModelRegistry":
+        """Loads all models once. Safe to call repeatedly and from several threads."""
+        if self._loaded:
+            return self
+        with self._lock:
+            if self._loaded:
+                return self
+            self._nlp = self._timed("spacy", lambda: load_spacy_model(self.spacy_model, self.spacy_profile))
+            self._sentiment_analyzer = self._timed("vader", _new_sentiment_analyzer)
+            self._semantic_lexicon = self._timed(
+                "semantic_lexicon", lambda: load_semantic_lexicon(self._nlp.vocab, self.vector_store_path)
+            )
+            self._timed("classifier", self._load_classifier)
+            self.loaded_at = time.time()
+            self._loaded = True
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    @property
+    def nlp(self):
+        return self.load()._nlp
+
+    @property
+    def sentiment_analyzer(self) -> "SentimentIntensityAnalyzer":
+        return self.load()._sentiment_analyzer
+
+    @property
+    def semantic_lexicon(self) -> SemanticLexicon:
+        return self.load()._semantic_lexicon
+
+    def set_semantic_lexicon(self, lexicon: SemanticLexicon):
+        """Replaces the semantic keyword index used by the analyzer (e.g. to compare vector tables)."""
+        self.load()
+        with self._lock:
+            self._semantic_lexicon = lexicon
+
+    @property
+    def clf(self):
+        """The unpickled sklearn classifier (None when the compiled tree is used instead)."""
+        return self.load()._clf
+
+    @property
+    def predictor(self):
+        """Whatever scores the feature matrix: the CompiledTree if available, else the sklearn model."""
+        return self.load()._predictor
+
+    @property
+    def vectorizer(self):
+        return self.load()._vectorizer
+
+    @property
+    def screen(self):
+        """The tier-0 cascade screen (a CompiledTree with leaf confidences), or None if not trained."""
+        return self.load()._screen
+
+    def set_screen(self, screen):
+        """Replaces the cascade screen (e.g. with one just trained, to evaluate it)."""
+        self.load()
+        with self._lock:
+            self._screen = screen
+
+    def record_warmup(self, elapsed_ms: float):
+        self.warmup_ms = elapsed_ms
+
+    def status(self) -> Dict:
+        """Readiness and load-time information, suitable for a health endpoint."""
+        return {
+            "ready": self._loaded,
+            "spacy_model": self.spacy_model,
+            "spacy_profile": self.spacy_profile,
+            "spacy_pipeline": list(self._nlp.pipe_names) if self._nlp is not None else None,
+            "vector_store": self.vector_store_path,
+            "ml_model_loaded": self._predictor is not None and self._vectorizer is not None,
+            "predictor": type(self._predictor).__name__ if self._predictor is not None else None,
+            "cascade_screen": self._screen is not None,
+            "load_times_ms": {name: round(ms, 1) for name, ms in self.load_times_ms.items()},
+            "total_load_ms": round(sum(self.load_times_ms.values()), 1),
+            "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+            "loaded_at": self.loaded_at,
+        }
+
+# The single registry shared by the whole process
+registry = ModelRegistry()
@@ -0,0 +1,206 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+# Pre-fork production launcher (Linux): loads every model once in the master process, then
+# forks N uvicorn workers that share the master's listening socket. The workers inherit the
+# loaded spaCy pipeline (vector table included), VADER lexicon and classifier as
+# copy-on-write memory, so adding a worker costs its private pages only, not a model copy.
+#
+#   python -m src.prefork_server --workers 4 --port 8000
+#
+# Use this instead of `uvicorn --workers N`, which starts every worker from scratch.
+# Each worker runs the app lifespan without loading the models or re-queuing interrupted
+# jobs again (the master did both), and runs its own priority scheduler over the shared
+# job queue; claims are atomic, so no job runs in two workers at once.
+
+PREFORK_WORKERS = int(os.getenv("PARTISH_WORKERS", "2"))
+# Seconds between per-worker memory reports (0 = only the report after startup)
+MEMORY_REPORT_INTERVAL = float(os.getenv("PARTISH_MEMORY_REPORT_INTERVAL", "300"))
+# Seconds after forking before the first memory report (workers finish their lifespan startup)
+MEMORY_REPORT_DELAY = 5.0
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def read_memory(pid) -> Dict[str, float]:
+    """
+    Memory of a process in MiB from /proc/<pid>/smaps_rollup. Pss (proportional set size)
+    splits shared pages between the processes sharing them, so the Pss of the master plus
+    all workers is what the host really spends; Private_* is what one more worker costs.
+    """
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in _SMAPS_FIELDS:
+                memory[name] = int(rest.split()[0]) / 1024
+    memory["Private"] = memory.get("Private_Clean", 0.0) + memory.get("Private_Dirty", 0.0)
+    return memory
+
+def report_memory(pids: Dict[str, int]):
+    """Prints one row of memory figures per process plus the Pss total."""
+    print(f"{'process':>12s} {'pid':>7s} {'RSS MiB':>9s} {'PSS MiB':>9s} {'shared':>9s} {'private':>9s}")
+    total_pss = 0.0
+    for name, pid in pids.items():
+        try:
+            memory = read_memory(pid)
+        except OSError:
+            continue
+        shared = memory.get("Shared_Clean", 0.0) + memory.get("Shared_Dirty", 0.0)
+        total_pss += memory.get("Pss", 0.0)
+        print(f"{name:>12s} {pid:7d} {memory.get('Rss', 0.0):9.1f} {memory.get('Pss', 0.0):9.1f} "
+              f"{shared:9.1f} {memory['Private']:9.1f}")
+    print(f"{'total PSS':>12s} {'':7s} {'':9s} {total_pss:9.1f}", flush=True)
+
+class PreforkServer:
+    """Loads the app and its models, binds the socket, forks and supervises the workers."""
+
+    def __init__(self, workers: int = PREFORK_WORKERS, host: str = "0.0.0.0", port: int = 8000,
+                 report_interval: float = MEMORY_REPORT_INTERVAL):
+        self.workers = max(1, workers)
+        self.host = host
+        self.port = port
+        self.report_interval = report_interval
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+        self.children: Dict[int, int] = {} # pid -> worker number
+        self._stopping = False
+
+    def preload(self):
+        """Imports the app and loads + warms up every model in the master process."""
+        # No GC passes while loading: they would only touch (and later un-share) object headers
+        gc.disable()
+
+        # Each forked worker is already a separate process, so analysis runs in-process there
+        # (the models are inherited) instead of in another pool of processes
+        from src.inference_executor import inference_executor
+        inference_executor.workers = 0
+
+        from app.main import app
+        from src.model_registry import registry
+        from src.JSON_Extracter import warmup
+        registry.load()
+        if os.getenv("PARTISH_WARMUP", "1") == "1":
+            warmup()
+        inference_executor.preloaded = True
+        print(f"Models loaded in master {os.getpid()}: {registry.status()}", flush=True)
+        self.app = app
+
+        # Jobs interrupted by a previous run are re-queued once here, not by every worker; the
+        # connection is closed so no SQLite connection crosses the fork
+        from src.job_queue import job_queue
+        from src.priority_scheduler import priority_scheduler
+        recovered = job_queue.recover()
+        job_queue.close()
+        priority_scheduler.recover_on_start = False
+        if recovered:
+            print(f"Re-queued {recovered} interrupted jobs.", flush=True)
+
+        # Move everything allocated so far into the permanent generation, so the workers' GC
+        # never writes to these objects and their pages stay shared copy-on-write
+        gc.collect()
+        gc.freeze()
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+    def _spawn(self, number: int):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(number)
+            os._exit(0)
+        self.children[pid] = number
+
+    def _run_worker(self, number: int):
+        import uvicorn
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        gc.enable()
+        config = uvicorn.Config(self.app, log_level=os.getenv("PARTISH_LOG_LEVEL", "info"))
+        server = uvicorn.Server(config)
+        print(f"Worker {number} started (pid {os.getpid()})", flush=True)
+        server.run(sockets=[self.sock])
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _memory_pids(self) -> Dict[str, int]:
+        pids = {"master": os.getpid()}
+        for pid, number in sorted(self.children.items(), key=lambda item: item[1]):
+            pids[f"worker {number}"] = pid
+        return pids
+
+    def run(self):
+        if not os.path.exists("/proc/self/smaps_rollup") or not hasattr(os, "fork"):
+            sys.exit("The pre-fork server needs Linux (fork and /proc/<pid>/smaps_rollup).")
+
+        self.preload()
+        self.bind()
+        print(f"Listening on http://{self.host}:{self.port} with {self.workers} workers", flush=True)
+        for number in range(self.workers):
+            self._spawn(number)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        next_report = time.monotonic() + MEMORY_REPORT_DELAY
+        while not self._stopping:
+            # Replace workers that died (e.g. OOM-killed); they fork from the same preloaded state
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.children:
+                number = self.children.pop(pid)
+                print(f"Worker {number} (pid {pid}) exited with status {status}, restarting it.", flush=True)
+                self._spawn(number)
+
+            if next_report is not None and time.monotonic() >= next_report:
+                report_memory(self._memory_pids())
+                next_report = time.monotonic() + self.report_interval if self.report_interval > 0 else None
+            time.sleep(0.2)
+
+        self.shutdown()
+
+    def shutdown(self, timeout: float = 30.0):
+        """Asks every worker to finish its requests (SIGTERM) and waits for them."""
+        print("Stopping workers...", flush=True)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.children.pop(pid, None)
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+        if self.sock is not None:
+            self.sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fork PARTISH server: load models once, fork uvicorn workers.")
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS, help="Number of worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--report-interval", type=float, default=MEMORY_REPORT_INTERVAL,
+                        help="Seconds between per-worker memory reports (0 = only after startup).")
+    args = parser.parse_args()
+
+    PreforkServer(args.workers, args.host, args.port, args.report_interval).run()
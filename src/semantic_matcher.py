@@ -0,0 +1,117 @@
+import numpy as np
+from typing import Dict, List, Optional, Set
+from src.keyword_matcher import VERY_URGENT_TERMS, URGENT_TERMS, PROMO_TERMS
+
+# Categories that are also matched semantically through word vectors
+SEMANTIC_CATEGORIES = {
+    "very_urgent": VERY_URGENT_TERMS,
+    "urgent": URGENT_TERMS,
+    "promo": PROMO_TERMS,
+}
+
+class SemanticLexicon:
+    """
+    Precomputed index of the target-word vectors of every keyword category.
+
+    All target vectors are L2-normalized once and stacked into a single matrix, so a doc's
+    non-stop tokens are scored against every category with one matrix multiply instead of
+    calling token.similarity() per token and per target word.
+
+    'vectors' defaults to the spaCy vector table of 'vocab'; a CompactVectorStore (pruned and
+    quantized for these categories) can be passed instead.
+    """
+
+    def __init__(self, vocab, categories: Dict[str, List[str]] = SEMANTIC_CATEGORIES, threshold: float = 0.7,
+                 vectors=None):
+        self.vocab = vocab
+        self.categories = categories
+        self.category_names = list(categories)
+        self.threshold = threshold
+        self.vectors = vectors if vectors is not None else vocab.vectors
+        # CompactVectorStore (duck-typed: it has get_rows(), spaCy's Vectors has .data)
+        self._compact = hasattr(self.vectors, "get_rows")
+        self.store_meta = None
+        if self._compact:
+            self.vectors.check_compatible(categories, threshold)
+            self.store_meta = {k: v for k, v in self.vectors.meta.items() if k != "target_words"}
+
+        # Imported here so that importing this module does not import spaCy
+        from spacy.attrs import ORTH, IS_STOP, IS_PUNCT
+        self._token_attrs = [ORTH, IS_STOP, IS_PUNCT]
+
+        # Only target words that have a vector can ever match semantically
+        target_keys = []
+        target_categories = []
+        for cat_idx, name in enumerate(self.category_names):
+            for word in categories[name]:
+                target_keys.append(vocab.strings[word])
+                target_categories.append(cat_idx)
+        target_rows = self.vectors.find(keys=np.array(target_keys, dtype=np.uint64))
+        has_vector = target_rows >= 0
+        target_categories = [cat_idx for cat_idx, found in zip(target_categories, has_vector) if found]
+
+        if has_vector.any():
+            self.target_matrix = _normalize_rows(self._rows(target_rows[has_vector]))
+        else:
+            self.target_matrix = np.zeros((0, 0), dtype=np.float32)
+        self.target_categories = np.array(target_categories, dtype=np.intp)
+
+    def _token_matrix(self, doc) -> np.ndarray:
+        """Returns the normalized vectors of the doc's non-stop, non-punctuation tokens that have a vector."""
+        if len(doc) == 0:
+            return np.zeros((0, self.target_matrix.shape[1]), dtype=np.float32)
+
+        attrs = doc.to_array(self._token_attrs)
+        keep = (attrs[:, 1] == 0) & (attrs[:, 2] == 0)
+        rows = self.vectors.find(keys=attrs[keep, 0])
+        rows = rows[rows >= 0]
+        if rows.size == 0:
+            return np.zeros((0, self.target_matrix.shape[1]), dtype=np.float32)
+        return _normalize_rows(self._rows(rows))
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        """float32 vectors of the given rows of the vector table."""
+        if self._compact:
+            return self.vectors.get_rows(rows)
+        return np.asarray(self.vectors.data[rows], dtype=np.float32)
+
+    def semantic_hits(self, doc, categories: Optional[Set[str]] = None) -> Set[str]:
+        """
+        Returns the categories for which some token of the doc has a cosine similarity
+        above the threshold with one of the category's target words.
+        """
+        if categories is None:
+            categories = set(self.category_names)
+        if not categories or self.target_matrix.size == 0:
+            return set()
+
+        wanted = np.array([name in categories for name in self.category_names])
+        target_mask = wanted[self.target_categories]
+        if not target_mask.any():
+            return set()
+
+        token_matrix = self._token_matrix(doc)
+        if token_matrix.shape[0] == 0:
+            return set()
+
+        # (tokens x targets) cosine similarities in one matrix multiply
+        similarities = token_matrix @ self.target_matrix[target_mask].T
+        hit_targets = (similarities > self.threshold).any(axis=0)
+        hit_categories = np.unique(self.target_categories[target_mask][hit_targets])
+        return {self.category_names[idx] for idx in hit_categories}
+
+    def match(self, doc, exact_hits: Set[str]) -> Set[str]:
+        """
+        Returns every category that matches the email, either exactly ('exact_hits', as found
+        by the KeywordMatcher) or semantically through the token vectors of 'doc'.
+        Equivalent to calling the old check_semantic_similarity once per category.
+        """
+        exact = exact_hits & set(self.category_names)
+        remaining = set(self.category_names) - exact
+        return exact | self.semantic_hits(doc, remaining)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row; all-zero rows stay zero (similarity 0, like spaCy)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
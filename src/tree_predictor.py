@@ -0,0 +1,150 @@
+import numpy as np
+from typing import Optional
+
+# Flat export of the trained Decision Tree (written by DecisionTree_Trainer.py)
+TREE_PATH = 'models/urgency_tree.npz'
+
+# Marker sklearn uses for "no child" (see sklearn.tree._tree.TREE_LEAF)
+TREE_LEAF = -1
+
+class CompiledTree:
+    """
+    Minimal, sklearn-free Decision Tree predictor over the flat arrays written by export_tree().
+
+    All rows descend the tree together, one level per iteration, so scoring a whole batch costs
+    at most max_depth vectorized steps. Inputs are compared as float32, exactly like sklearn,
+    so predictions are identical to DecisionTreeClassifier.predict.
+    """
+
+    def __init__(
+        self, feature, threshold, children_left, children_right, value, n_features: int,
+        model_sha256: str = "", confidence=None
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.n_features = int(n_features)
+        self.model_sha256 = model_sha256
+        # Share of the training samples at each node that belong to its predicted class (optional)
+        self.confidence = confidence
+
+        # Only the handful of features the tree actually splits on are ever read, so inputs are
+        # reduced to those columns once and the descent runs on a small dense matrix
+        self._used_features = np.unique(feature[children_left != TREE_LEAF])
+        self._local_feature = np.searchsorted(self._used_features, feature)
+        self._column_map = np.full(self.n_features, -1, dtype=np.intp)
+        self._column_map[self._used_features] = np.arange(len(self._used_features))
+
+    @classmethod
+    def from_classifier(cls, clf, model_sha256: str = "") -> "CompiledTree":
+        """Flattens a fitted single-output DecisionTreeClassifier."""
+        tree = clf.tree_
+        return cls(
+            feature=tree.feature.astype(np.intp),
+            threshold=tree.threshold.astype(np.float64),
+            children_left=tree.children_left.astype(np.intp),
+            children_right=tree.children_right.astype(np.intp),
+            # Class predicted at each node (only read at leaves)
+            value=np.asarray(clf.classes_)[np.argmax(tree.value[:, 0, :], axis=1)],
+            n_features=clf.n_features_in_,
+            model_sha256=model_sha256,
+            confidence=(tree.value[:, 0, :].max(axis=1) / tree.value[:, 0, :].sum(axis=1)).astype(np.float64)
+        )
+
+    def save(self, path: str = TREE_PATH):
+        extra = {"confidence": self.confidence} if self.confidence is not None else {}
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            children_left=self.children_left,
+            children_right=self.children_right,
+            value=self.value,
+            n_features=np.array(self.n_features),
+            model_sha256=np.array(self.model_sha256),
+            **extra
+        )
+
+    @classmethod
+    def load(cls, path: str = TREE_PATH) -> "CompiledTree":
+        data = np.load(path)
+        return cls(
+            feature=data['feature'],
+            threshold=data['threshold'],
+            children_left=data['children_left'],
+            children_right=data['children_right'],
+            value=data['value'],
+            n_features=int(data['n_features']),
+            model_sha256=str(data['model_sha256']),
+            confidence=data['confidence'] if 'confidence' in data.files else None
+        )
+
+    def _used_columns(self, X) -> np.ndarray:
+        """Returns the split columns of X as a dense float32 array (sklearn compares float32 inputs)."""
+        if hasattr(X, 'tocsr'):
+            # Scatter the stored entries of the used columns straight from the CSR arrays
+            X = X.tocsr()
+            if not X.has_canonical_format:
+                X = X.copy()
+                X.sum_duplicates()
+            out = np.zeros((X.shape[0], len(self._used_features)), dtype=np.float32)
+            local = self._column_map[X.indices]
+            keep = local >= 0
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            out[rows[keep], local[keep]] = X.data[keep]
+            return out
+        return np.asarray(X)[:, self._used_features].astype(np.float32)
+
+    def leaf_nodes(self, X) -> np.ndarray:
+        """Returns the index of the leaf each row of X lands in."""
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the tree expects {self.n_features}.")
+
+        X_used = self._used_columns(X)
+        n_rows = X_used.shape[0]
+        nodes = np.zeros(n_rows, dtype=np.intp)
+        active = np.arange(n_rows)
+        while active.size:
+            current = nodes[active]
+            is_split = self.children_left[current] != TREE_LEAF
+            active = active[is_split]
+            current = current[is_split]
+            if not active.size:
+                break
+            values = X_used[active, self._local_feature[current]]
+            go_left = values <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.children_left[current], self.children_right[current])
+        return nodes
+
+    def predict(self, X) -> np.ndarray:
+        """Predicts the class of each row of X (a dense array or a scipy sparse matrix)."""
+        return self.value[self.leaf_nodes(X)]
+
+    def predict_with_confidence(self, X):
+        """Predicts the class of each row of X and the share of training samples of that class at its leaf."""
+        if self.confidence is None:
+            raise ValueError("This tree was exported without leaf confidences.")
+        leaves = self.leaf_nodes(X)
+        return self.value[leaves], self.confidence[leaves]
+
+def export_tree(clf, path: str = TREE_PATH, model_sha256: str = ""):
+    """
+    Exports a fitted DecisionTreeClassifier as flat NumPy arrays (feature index, threshold,
+    left/right child, node class). 'model_sha256' identifies the pickled model it came from.
+    """
+    CompiledTree.from_classifier(clf, model_sha256).save(path)
+
+def load_compiled_tree(path: str = TREE_PATH, model_sha256: Optional[str] = None) -> Optional[CompiledTree]:
+    """
+    Loads the exported tree, or returns None if it is missing or was exported from a
+    different model than 'model_sha256' (e.g. a stale export next to a retrained model).
+    """
+    try:
+        tree = CompiledTree.load(path)
+    except (OSError, KeyError, ValueError):
+        return None
+    if model_sha256 is not None and tree.model_sha256 != model_sha256:
+        return None
+    return tree
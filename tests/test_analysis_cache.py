@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+from src.analysis_cache import MAX_NEAR_DUP_DISTANCE, AnalysisCache, header_signature
+from src.JSON_Extracter import EmailAnalysis
+
+TEMPLATE = (
+    "Hi {name}, thank you for your interest in the senior platform engineer role at our company. "
+    "Our team has reviewed your profile and we believe your experience with distributed systems, "
+    "observability tooling and large scale data pipelines would be a great fit for the position. "
+    "The role involves owning the reliability of our core services, mentoring other engineers, "
+    "and working closely with product teams to design new features. We offer flexible remote work, "
+    "a generous learning budget, health benefits for your whole family and a yearly team retreat. "
+    "If this sounds interesting, simply reply to this message and our recruiting coordinator will "
+    "share more details about the interview process and the next steps. Best regards, the hiring team."
+)
+DEADLINE_TEMPLATE = TEMPLATE + " Please send the signed contract by Friday."
+
+class FakeAnalyzer:
+    """Stands in for analyze_emails_batch: text-dependent fields are derived from each text."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, headers=None):
+        self.calls.append(list(texts))
+        analyses = []
+        for text in texts:
+            deadline = "Friday" if "by Friday" in text else None
+            span = (text.index("Friday"), text.index("Friday") + len("Friday")) if deadline else None
+            analyses.append(EmailAnalysis(
+                sentiment="positive", sentiment_score=0.5, urgency_level="Urgent", ml_urgency_score=1,
+                keywords=["reply"], deadline=deadline, deadline_span=span,
+                named_entities=[text.split(",")[0][3:]], dates=["Friday"] if deadline else [],
+            ))
+        return analyses
+
+    @property
+    def analyzed(self):
+        return sum(len(call) for call in self.calls)
+
+def test_exact_hit_returns_an_independent_copy():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    text = TEMPLATE.format(name="Alice")
+    first = cache.analyze_batch([text], analyze)[0]
+    first.named_entities.append("mutated")
+    second = cache.analyze_batch([text], analyze)[0]
+    assert analyze.analyzed == 1
+    assert second.named_entities == ["Alice"]
+    assert cache.stats()["exact_hits"] == 1
+
+def test_near_duplicate_reuses_only_the_urgency_fields():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    cache.analyze_batch([TEMPLATE.format(name="Alice")], analyze)
+    hit = cache.analyze_batch([TEMPLATE.format(name="Bob")], analyze)[0]
+
+    assert analyze.analyzed == 1
+    assert cache.stats()["near_hits"] == 1
+    assert (hit.urgency_level, hit.ml_urgency_score, hit.keywords) == ("Urgent", 1, ["reply"])
+    # Nothing derived from Alice's text leaks into Bob's analysis
+    assert hit.named_entities is None and hit.dates is None
+    assert hit.sentiment is None and hit.sentiment_score is None
+    assert hit.deadline is None and hit.deadline_span is None
+    assert not hit.nlp_analyzed
+
+def test_analysis_with_a_deadline_is_not_served_to_near_duplicates():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    cache.analyze_batch([DEADLINE_TEMPLATE.format(name="Alice")], analyze)
+    bob_text = DEADLINE_TEMPLATE.format(name="Bob")
+    bob = cache.analyze_batch([bob_text], analyze)[0]
+    assert analyze.analyzed == 2
+    assert cache.stats()["near_hits"] == 0
+    assert bob.named_entities == ["Bob"]
+    start, end = bob.deadline_span
+    assert bob_text[start:end] == "Friday"
+
+def test_different_dates_or_numbers_are_not_near_duplicates():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    cache.analyze_batch([TEMPLATE.format(name="Alice") + " Interviews start Monday."], analyze)
+    cache.analyze_batch([TEMPLATE.format(name="Alice") + " Interviews start Tuesday."], analyze)
+    cache.analyze_batch([TEMPLATE.format(name="Alice") + " Call 555 0100."], analyze)
+    assert analyze.analyzed == 3
+    assert cache.stats()["near_hits"] == 0
+
+def test_headers_that_change_the_analysis_are_part_of_the_key():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    text = TEMPLATE.format(name="Alice")
+    personal = {"From": "Jane <jane@example.com>"}
+    bulk = {"From": "Jobs <no-reply@example.com>", "List-Unsubscribe": "<mailto:u@example.com>"}
+    assert header_signature(personal) != header_signature(bulk)
+
+    cache.analyze_batch([text], analyze, headers=[personal])
+    cache.analyze_batch([text], analyze, headers=[bulk])
+    cache.analyze_batch([TEMPLATE.format(name="Bob")], analyze, headers=[bulk])
+    assert analyze.analyzed == 2
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"]) == (0, 1)
+
+    # Headers that do not matter to the analysis (another personal sender) still hit
+    cache.analyze_batch([text], analyze, headers=[{"From": "Joe <joe@example.com>"}])
+    assert analyze.analyzed == 2
+    assert cache.stats()["exact_hits"] == 1
+
+def test_repeats_within_a_batch_are_analyzed_once():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+    texts = [TEMPLATE.format(name="Alice") + " 1", TEMPLATE.format(name="Alice") + " 2", TEMPLATE.format(name="Alice") + " 1"]
+    results = cache.analyze_batch(texts, analyze)
+    assert analyze.calls == [texts[:2]]
+    assert [r.named_entities for r in results] == [["Alice"]] * 3
+    stats = cache.stats()
+    assert (stats["misses"], stats["exact_hits"]) == (2, 1)
+
+def test_least_recently_used_entries_are_evicted():
+    cache, analyze = AnalysisCache(max_entries=2, max_distance=-1), FakeAnalyzer()
+    a, b, c = (f"email number {n} about unrelated topics {n * 7}" for n in range(3))
+    cache.analyze_batch([a, b], analyze)
+    cache.analyze_batch([a], analyze) # a is now the most recently used
+    cache.analyze_batch([c], analyze) # evicts b
+    assert cache.get(a) is not None and cache.get(b) is None and cache.get(c) is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_disabled_cache_passes_everything_through():
+    cache, analyze = AnalysisCache(max_entries=0), FakeAnalyzer()
+    text = TEMPLATE.format(name="Alice")
+    cache.analyze_batch([text, text], analyze)
+    assert analyze.analyzed == 2
+    assert cache.get(text) is None
+
+def test_async_batches_behave_like_sync_batches():
+    cache, analyze = AnalysisCache(), FakeAnalyzer()
+
+    async def analyze_async(texts, headers=None):
+        return analyze(texts, headers)
+
+    texts = [TEMPLATE.format(name="Alice"), TEMPLATE.format(name="Alice")]
+    first = asyncio.run(cache.analyze_batch_async(texts, analyze_async))
+    second = asyncio.run(cache.analyze_batch_async([TEMPLATE.format(name="Bob")], analyze_async))
+    assert analyze.analyzed == 1
+    assert first[0].named_entities == ["Alice"]
+    assert second[0].named_entities is None and second[0].urgency_level == "Urgent"
+
+def test_near_duplicate_distance_above_the_band_limit_is_rejected():
+    assert AnalysisCache(max_distance=MAX_NEAR_DUP_DISTANCE).max_distance == MAX_NEAR_DUP_DISTANCE
+    with pytest.raises(ValueError, match="PARTISH_NEAR_DUP_DISTANCE"):
+        AnalysisCache(max_distance=MAX_NEAR_DUP_DISTANCE + 1)
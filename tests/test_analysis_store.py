@@ -0,0 +1,51 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.analysis_store import AnalysisStore
+from src.JSON_Extracter import EmailAnalysis
+
+@pytest.fixture
+def new_york(monkeypatch):
+    # A server zone away from UTC, so local and UTC datetimes differ
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def _email(message_id, received):
+    return {'id': message_id, 'threadId': message_id, 'internalDate': str(int(received.timestamp() * 1000)),
+            'sender': 'Boss <boss@example.com>', 'subject': 'Report', 'snippet': ''}
+
+def test_deadlines_are_stored_and_compared_in_utc(tmp_path, new_york):
+    store = AnalysisStore(str(tmp_path / "analyses.sqlite3"))
+    received = datetime(2026, 10, 17, 9, 0)
+    store.save("me@example.com", [_email("m1", received)], [EmailAnalysis(deadline="22 October 2026")])
+
+    row = store.query("me@example.com")[0]
+    # 9:00 to 17:00 New York time (EDT, UTC-4)
+    assert (row["deadline_start"], row["deadline_end"]) == ("2026-10-22T13:00:00", "2026-10-22T21:00:00")
+
+    # The same instant, given in any zone or as naive server local time, gives the same answer
+    for deadline_from in (datetime(2026, 10, 22, 13, 0, tzinfo=timezone.utc),
+                          datetime(2026, 10, 22, 15, 0, tzinfo=timezone(timedelta(hours=2))),
+                          datetime(2026, 10, 22, 9, 0)):
+        assert [r["id"] for r in store.query("me@example.com", deadline_from=deadline_from)] == ["m1"]
+        assert store.query("me@example.com", deadline_from=deadline_from + timedelta(minutes=1)) == []
+    store.close()
+
+def test_local_deadlines_of_older_stores_are_migrated(tmp_path, new_york):
+    path = str(tmp_path / "analyses.sqlite3")
+    store = AnalysisStore(path)
+    store.save("me@example.com", [_email("m1", datetime(2026, 10, 17, 9, 0))], [EmailAnalysis(deadline="22 October 2026")])
+    store.close()
+    # Stores written before the UTC layout held server local time
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE analyses SET deadline_start = '2026-10-22T09:00:00', deadline_end = '2026-10-22T17:00:00'")
+        conn.execute("PRAGMA user_version = 0")
+    conn.close()
+
+    row = AnalysisStore(path).query("me@example.com")[0]
+    assert (row["deadline_start"], row["deadline_end"]) == ("2026-10-22T13:00:00", "2026-10-22T21:00:00")
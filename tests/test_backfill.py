@@ -0,0 +1,122 @@
+import json
+import pytest
+from googleapiclient.discovery import build
+from src.analysis_store import AnalysisStore
+from src.backfill import BackfillJob
+from src.fake_gmail import FakeGmailHttp
+from src.JSON_Extracter import EmailAnalysis
+
+N_MESSAGES = 25
+
+class FakeAnalyzer:
+    """Stands in for the analyzer; can stop the job or fail after a number of batches."""
+
+    def __init__(self, stop_after=None, fail_after=None):
+        self.texts = []
+        self.headers = []
+        self.batches = 0
+        self.job = None
+        self.stop_after = stop_after
+        self.fail_after = fail_after
+
+    def __call__(self, texts, headers=None):
+        if self.fail_after is not None and self.batches == self.fail_after:
+            raise RuntimeError("inference worker died")
+        self.batches += 1
+        self.texts.extend(texts)
+        self.headers.extend(headers)
+        if self.stop_after is not None and self.batches == self.stop_after:
+            self.job.stop()
+        return [EmailAnalysis(sentiment="neutral", sentiment_score=0.0, urgency_level="Regular", ml_urgency_score=0)
+                for _ in texts]
+
+@pytest.fixture
+def mailbox():
+    return FakeGmailHttp.from_csv(limit=N_MESSAGES)
+
+@pytest.fixture
+def service(mailbox):
+    return build('gmail', 'v1', http=mailbox, static_discovery=True)
+
+def _job(service, analyzer, state_dir, **kwargs):
+    job = BackfillJob(service, analyzer, page_size=10, batch_size=4, state_dir=str(state_dir), **kwargs)
+    analyzer.job = job
+    return job
+
+def _result_ids(job):
+    with open(job.results_path) as f:
+        return [json.loads(line)["id"] for line in f]
+
+def test_full_run_analyzes_every_message_once(service, mailbox, tmp_path):
+    analyzer = FakeAnalyzer()
+    status = _job(service, analyzer, tmp_path).run()
+    assert status["state"] == "done"
+    assert (status["processed"], status["pages_done"]) == (N_MESSAGES, 3)
+    assert status["urgency_counts"] == {"Regular": N_MESSAGES}
+    assert len(analyzer.texts) == N_MESSAGES
+
+    # A finished backfill started again does nothing
+    again = FakeAnalyzer()
+    assert _job(service, again, tmp_path).run()["state"] == "done"
+    assert again.texts == []
+
+def test_stopped_backfill_resumes_mid_page_from_its_checkpoint(service, mailbox, tmp_path):
+    first = FakeAnalyzer(stop_after=4) # stops inside the second page (batches of 4, pages of 10)
+    job = _job(service, first, tmp_path)
+    status = job.run()
+    assert status["state"] == "stopped"
+    assert status["processed"] == 14
+    with open(job.checkpoint_path) as f:
+        checkpoint = json.load(f)
+    assert checkpoint["pages_done"] == 1 and len(checkpoint["page_processed_ids"]) == 4
+
+    second = FakeAnalyzer()
+    resumed = _job(service, second, tmp_path)
+    status = resumed.run()
+    assert status["state"] == "done"
+    assert status["processed"] == N_MESSAGES
+    assert len(second.texts) == N_MESSAGES - 14
+    ids = _result_ids(resumed)
+    assert len(ids) == len(set(ids)) == N_MESSAGES
+    assert set(ids) == {msg["id"] for msg in mailbox.messages}
+
+def test_failed_backfill_resumes_without_losing_messages(service, mailbox, tmp_path):
+    crashing = FakeAnalyzer(fail_after=2)
+    status = _job(service, crashing, tmp_path).run()
+    assert status["state"] == "failed"
+    assert status["error"] == "inference worker died"
+    assert status["processed"] == 8
+
+    resumed = _job(service, FakeAnalyzer(), tmp_path)
+    assert resumed.run()["state"] == "done"
+    # The failed batch never reached the results file, so nothing is duplicated
+    ids = _result_ids(resumed)
+    assert sorted(ids) == sorted(msg["id"] for msg in mailbox.messages)
+
+def test_restart_or_another_query_starts_over(service, tmp_path):
+    _job(service, FakeAnalyzer(stop_after=2), tmp_path).run()
+
+    restarted = FakeAnalyzer()
+    job = _job(service, restarted, tmp_path, restart=True)
+    assert job.checkpoint["processed"] == 0
+    job.run()
+    assert len(restarted.texts) == N_MESSAGES
+    assert len(_result_ids(job)) == N_MESSAGES
+
+    other_query = _job(service, FakeAnalyzer(), tmp_path, query="is:unread")
+    assert other_query.checkpoint["processed"] == 0 and not other_query.checkpoint["done"]
+
+def test_backfill_records_analyses_in_the_store(service, mailbox, tmp_path):
+    store = AnalysisStore(str(tmp_path / "analyses.sqlite3"))
+    _job(service, FakeAnalyzer(stop_after=1), tmp_path, store=store).run()
+    _job(service, FakeAnalyzer(), tmp_path, store=store).run()
+    assert store.summary(mailbox.email_address)["total"] == N_MESSAGES
+    store.close()
+
+def test_backfill_passes_the_message_headers_to_the_analyzer(service, mailbox, tmp_path):
+    analyzer = FakeAnalyzer()
+    _job(service, analyzer, tmp_path).run()
+    assert len(analyzer.headers) == N_MESSAGES
+    senders = {headers["From"] for headers in analyzer.headers}
+    assert senders == {header["value"] for msg in mailbox.messages
+                       for header in msg["payload"]["headers"] if header["name"] == "From"}
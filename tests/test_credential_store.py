@@ -0,0 +1,42 @@
+import os
+import stat
+from google.oauth2.credentials import Credentials
+from src.credential_store import CredentialStore
+
+def _credentials(token, refresh_token="refresh-1"):
+    return Credentials(token=token, refresh_token=refresh_token, client_id="id", client_secret="secret",
+                       token_uri="https://oauth2.googleapis.com/token")
+
+def test_credentials_written_by_one_process_are_read_by_another(tmp_path):
+    path = str(tmp_path / "credentials.sqlite3")
+    # Two stores on the same file stand in for two server workers
+    worker_a, worker_b = CredentialStore(path), CredentialStore(path)
+    assert worker_b.get("session:current_user") is None
+
+    worker_a.set("session:current_user", _credentials("token-1"))
+    read = worker_b.get("session:current_user")
+    assert (read.token, read.refresh_token, read.client_id) == ("token-1", "refresh-1", "id")
+    # Unchanged rows are not unpickled again
+    assert worker_b.get("session:current_user") is read
+
+    # A refresh in worker A is seen by worker B
+    worker_a.set("session:current_user", _credentials("token-2"))
+    assert worker_b.get("session:current_user").token == "token-2"
+    worker_a.close()
+    worker_b.close()
+
+def test_keys_by_prefix(tmp_path):
+    store = CredentialStore(str(tmp_path / "credentials.sqlite3"))
+    store.set("session:current_user", _credentials("t"))
+    store.set("account:me@example.com", _credentials("t"))
+    store.set("account:you@example.com", _credentials("u", "refresh-2"))
+    assert store.keys("account:") == {"account:me@example.com", "account:you@example.com"}
+    assert len(store.keys()) == 3
+    store.close()
+
+def test_store_file_is_private(tmp_path):
+    path = tmp_path / "state" / "credentials.sqlite3"
+    store = CredentialStore(str(path))
+    store.set("session:current_user", _credentials("t"))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    store.close()
@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import pytest
+from googleapiclient.discovery import build
+from src.fake_gmail import FakeGmailHttp
+from src import gmail_access
+from src.gmail_access import SyncCheckpointStore, sync_inbox
+
+@pytest.fixture
+def mailbox():
+    return FakeGmailHttp.from_csv(limit=10)
+
+@pytest.fixture
+def service(mailbox):
+    return build('gmail', 'v1', http=mailbox, static_discovery=True)
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    return SyncCheckpointStore(str(tmp_path / "sync_state.json"))
+
+def _ids(sync):
+    return [msg['id'] for msg in sync['messages']]
+
+def test_checkpoint_store_roundtrip(tmp_path):
+    path = str(tmp_path / "state" / "sync_state.json")
+    store = SyncCheckpointStore(path)
+    assert store.get("me@example.com:inbox") is None
+    store.set("me@example.com:inbox", 1234)
+    store.set("me@example.com:other", "99")
+    reloaded = SyncCheckpointStore(path)
+    assert reloaded.get("me@example.com:inbox") == "1234"
+    assert reloaded.get("me@example.com:other") == "99"
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")]
+
+def _write_checkpoints(path, worker, n):
+    store = SyncCheckpointStore(path)
+    for i in range(n):
+        store.set(f"user{worker}@example.com:inbox", i)
+
+def test_processes_sharing_the_checkpoint_file_keep_each_others_keys(tmp_path):
+    path = str(tmp_path / "sync_state.json")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_checkpoints, args=(path, worker, 30)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+    store = SyncCheckpointStore(path)
+    assert [store.get(f"user{worker}@example.com:inbox") for worker in range(4)] == ["29"] * 4
+
+def test_corrupt_checkpoint_file_reads_as_empty(tmp_path):
+    path = tmp_path / "sync_state.json"
+    path.write_text("{not json")
+    assert SyncCheckpointStore(str(path)).get("me@example.com:inbox") is None
+
+def test_first_sync_is_full_and_does_not_save_the_checkpoint(service, checkpoints):
+    sync = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    assert sync['mode'] == 'full'
+    assert len(sync['messages']) == 3
+    assert sync['user'] == "me@example.com"
+    assert sync['checkpoint_key'] == "me@example.com:inbox"
+    # Saving is up to the caller, once the messages were handled
+    assert checkpoints.get(sync['checkpoint_key']) is None
+
+def test_unsaved_sync_returns_the_same_messages_again(service, mailbox, checkpoints):
+    first = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    checkpoints.set(first['checkpoint_key'], first['history_id'])
+
+    new = mailbox.add_email("Boss <boss@example.com>", "Report due", "Please send it by Friday.")
+    failed = sync_inbox(service, checkpoints=checkpoints)
+    assert failed['mode'] == 'incremental'
+    assert _ids(failed) == [new['id']]
+
+    # e.g. the analysis failed: nothing was saved, so the message comes back
+    retried = sync_inbox(service, checkpoints=checkpoints)
+    assert _ids(retried) == [new['id']]
+
+    checkpoints.set(retried['checkpoint_key'], retried['history_id'])
+    assert sync_inbox(service, checkpoints=checkpoints)['messages'] == []
+
+def test_incremental_sync_returns_only_new_messages_newest_first(service, mailbox, checkpoints):
+    first = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    checkpoints.set(first['checkpoint_key'], first['history_id'])
+
+    older = mailbox.add_email("a@example.com", "One", "First new message.")
+    newer = mailbox.add_email("b@example.com", "Two", "Second new message.")
+    sync = sync_inbox(service, checkpoints=checkpoints)
+    assert sync['mode'] == 'incremental'
+    assert _ids(sync) == [newer['id'], older['id']]
+    assert int(sync['history_id']) > int(first['history_id'])
+
+def test_consumers_have_independent_checkpoints(service, mailbox, checkpoints):
+    for consumer in ('analyze', 'process'):
+        sync = sync_inbox(service, max_results=3, consumer=consumer, checkpoints=checkpoints)
+        checkpoints.set(sync['checkpoint_key'], sync['history_id'])
+
+    new = mailbox.add_email("a@example.com", "Hello", "Body.")
+    analyzed = sync_inbox(service, consumer='analyze', checkpoints=checkpoints)
+    checkpoints.set(analyzed['checkpoint_key'], analyzed['history_id'])
+    assert _ids(analyzed) == [new['id']]
+    assert _ids(sync_inbox(service, consumer='process', checkpoints=checkpoints)) == [new['id']]
+
+def test_expired_history_falls_back_to_full_resync(service, mailbox, checkpoints):
+    first = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    checkpoints.set(first['checkpoint_key'], first['history_id'])
+    mailbox.add_email("a@example.com", "Hello", "Body.")
+    mailbox.expire_history()
+    mailbox.add_email("b@example.com", "Hello again", "Body.")
+
+    sync = sync_inbox(service, max_results=4, checkpoints=checkpoints)
+    assert sync['mode'] == 'full'
+    assert len(sync['messages']) == 4
+
+def test_messages_that_cannot_be_fetched_keep_the_checkpoint(service, mailbox, checkpoints, monkeypatch):
+    monkeypatch.setattr(gmail_access, "FETCH_BACKOFF_BASE", 0)
+    first = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    checkpoints.set(first['checkpoint_key'], first['history_id'])
+
+    fetched = mailbox.add_email("a@example.com", "One", "First new message.")
+    rate_limited = mailbox.add_email("b@example.com", "Two", "Second new message.")
+    mailbox.failing_ids[rate_limited['id']] = 429
+    sync = sync_inbox(service, checkpoints=checkpoints)
+    assert _ids(sync) == [fetched['id']]
+    assert sync['failed_ids'] == [rate_limited['id']]
+    # Saving this sync must not move the checkpoint past the message that was not fetched
+    assert sync['history_id'] == first['history_id']
+    checkpoints.set(sync['checkpoint_key'], sync['history_id'])
+
+    del mailbox.failing_ids[rate_limited['id']]
+    retried = sync_inbox(service, checkpoints=checkpoints)
+    assert _ids(retried) == [rate_limited['id'], fetched['id']]
+    assert retried['failed_ids'] == []
+    assert int(retried['history_id']) > int(first['history_id'])
+
+def test_failed_full_sync_has_no_checkpoint_to_save(service, mailbox, checkpoints, monkeypatch):
+    monkeypatch.setattr(gmail_access, "FETCH_BACKOFF_BASE", 0)
+    mailbox.failing_ids[mailbox.messages[0]['id']] = 503
+    sync = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    assert sync['mode'] == 'full'
+    assert len(sync['messages']) == 2 and sync['failed_ids'] == [mailbox.messages[0]['id']]
+    assert sync['history_id'] is None
+
+def test_messages_that_no_longer_exist_are_skipped_without_holding_the_checkpoint(service, mailbox, checkpoints):
+    first = sync_inbox(service, max_results=3, checkpoints=checkpoints)
+    checkpoints.set(first['checkpoint_key'], first['history_id'])
+    deleted = mailbox.add_email("a@example.com", "Gone", "Deleted before it was fetched.")
+    mailbox.failing_ids[deleted['id']] = 404
+    sync = sync_inbox(service, checkpoints=checkpoints)
+    assert sync['messages'] == [] and sync['failed_ids'] == []
+    assert int(sync['history_id']) > int(first['history_id'])
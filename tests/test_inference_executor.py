@@ -0,0 +1,42 @@
+import asyncio
+import os
+import signal
+import time
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from src import inference_executor as executor_module
+from src.analysis_cache import AnalysisCache
+from src.inference_executor import InferenceExecutor
+
+def _init_without_models(start_barrier=None):
+    # Worker status only; the tests never analyze anything
+    executor_module._start_barrier = start_barrier
+
+def test_worker_status_is_refreshed_when_the_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(executor_module, "_init_worker", _init_without_models)
+    executor = InferenceExecutor(workers=2, start_method="fork", cache=AnalysisCache(max_entries=0))
+
+    async def scenario():
+        await executor.start()
+        old_pids = executor.status()["worker_pids"]
+        assert len(old_pids) == 2 and executor.status()["pool_restarts"] == 0
+
+        os.kill(old_pids[0], signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool):
+            # The pool notices the dead worker on the next call
+            for _ in range(50):
+                await executor.analyze(["hello"], timeout=None)
+                await asyncio.sleep(0.05)
+        # The dead processes are no longer reported
+        assert not set(executor.status()["worker_pids"]) & set(old_pids)
+        assert executor.status()["pool_restarts"] == 1
+
+        deadline = time.monotonic() + 30
+        while not executor.worker_status and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        new_pids = executor.status()["worker_pids"]
+        await executor.shutdown()
+        return old_pids, new_pids
+
+    old_pids, new_pids = asyncio.run(scenario())
+    assert len(new_pids) == 2 and not set(new_pids) & set(old_pids)
@@ -0,0 +1,130 @@
+import time
+import pytest
+from src.job_queue import JobQueue, backoff_delay
+
+def _email(message_id):
+    return {"id": message_id, "threadId": message_id, "subject": f"Subject {message_id}", "body": "Body", "sender": "a@example.com"}
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=3, backoff_base=2)
+    yield queue
+    queue.close()
+
+def test_enqueue_is_idempotent_by_message_id(queue):
+    first = queue.enqueue("inbox", "me@example.com", [_email("m1"), _email("m2")], [0.5, 0.1])
+    again = queue.enqueue("inbox", "me@example.com", [_email("m2"), _email("m3")], [0.9, 0.2])
+    assert [created for _, created in first] == [True, True]
+    assert again[0] == (first[1][0], False)
+    assert again[1][1] is True
+    # Another account's copy of the same message is a separate job
+    assert queue.enqueue("inbox", "you@example.com", [_email("m1")], [0.5])[0][1] is True
+    assert queue.counts()["queued"] == 4
+
+def test_claim_returns_highest_priority_first_and_only_once(queue):
+    queue.enqueue("inbox", "me@example.com", [_email("low"), _email("high"), _email("mid")], [0.1, 0.9, 0.5])
+    queue.enqueue("inbox", "other@example.com", [_email("other")], [1.0])
+
+    claimed = queue.claim("inbox", 2, users=["me@example.com"])
+    assert [job["message_id"] for job in claimed] == ["high", "mid"]
+    assert all(job["status"] == "running" and job["attempts"] == 1 for job in claimed)
+    assert claimed[0]["email"]["subject"] == "Subject high"
+    assert queue.get(claimed[0]["id"])["status"] == "running"
+
+    assert [job["message_id"] for job in queue.claim("inbox", 10, users=["me@example.com"])] == ["low"]
+    assert queue.claim("inbox", 10, users=["me@example.com"]) == []
+    assert queue.claim("inbox", 10, users=[]) == []
+    assert queue.claim("other-kind", 10) == []
+
+def test_failed_job_is_retried_after_backoff_then_failed_for_good(queue):
+    (job_id, _), = queue.enqueue("inbox", "me@example.com", [_email("m1")], [0.5])
+    job, = queue.claim("inbox", 1)
+
+    before = time.time()
+    assert queue.fail(job_id, "calendar unavailable") == "queued"
+    retried = queue.get(job_id)
+    assert retried["last_error"] == "calendar unavailable"
+    assert retried["run_after"] >= before + backoff_delay(1, 2)
+    # Not runnable before the backoff delay has passed
+    assert queue.claim("inbox", 1) == []
+    assert queue.next_run_after("inbox") == retried["run_after"]
+
+    for attempt in (2, 3):
+        queue._connect().execute("UPDATE jobs SET run_after = 0 WHERE id = ?", (job_id,))
+        job, = queue.claim("inbox", 1)
+        assert job["attempts"] == attempt
+        status = queue.fail(job_id, f"attempt {attempt} failed")
+    assert status == "failed"
+    failed = queue.get(job_id)
+    assert (failed["status"], failed["attempts"], failed["last_error"]) == ("failed", 3, "attempt 3 failed")
+    assert failed["finished_at"] is not None
+
+def test_non_retryable_failure_fails_immediately(queue):
+    (job_id, _), = queue.enqueue("inbox", "me@example.com", [_email("m1")], [0.5])
+    queue.claim("inbox", 1)
+    assert queue.fail(job_id, "bad payload", retry=False) == "failed"
+    assert queue.get(job_id)["attempts"] == 1
+
+def test_fail_leaves_jobs_that_are_not_running_alone(queue):
+    (job_id, _), = queue.enqueue("inbox", "me@example.com", [_email("m1")], [0.5])
+    # Never claimed
+    assert queue.fail(job_id, "late failure") == "queued"
+    assert queue.get(job_id)["last_error"] is None
+
+    queue.claim("inbox", 1)
+    queue.complete(job_id, {"action": "none"})
+    assert queue.fail(job_id, "late failure") == "done"
+    done = queue.get(job_id)
+    assert (done["status"], done["result"], done["last_error"]) == ("done", {"action": "none"}, None)
+    assert queue.fail(12345, "unknown job") == "failed"
+
+def test_recover_requeues_own_and_expired_jobs_only(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # Separate queues on one file stand in for separate processes
+    this, crashed, alive = JobQueue(path), JobQueue(path, lease_seconds=0.05), JobQueue(path)
+    ids = [job_id for job_id, _ in this.enqueue("inbox", "me@example.com", [_email(f"m{i}") for i in range(3)], [0.3, 0.2, 0.1])]
+    assert [job["id"] for job in this.claim("inbox", 1)] == ids[:1]
+    assert [job["id"] for job in crashed.claim("inbox", 1)] == ids[1:2]
+    assert [job["id"] for job in alive.claim("inbox", 1)] == ids[2:]
+    time.sleep(0.1) # the crashed process never renewed its lease
+
+    assert this.recover() == 2
+    assert [this.get(job_id)["status"] for job_id in ids] == ["queued", "queued", "running"]
+    # Recovered jobs are runnable right away and keep their attempt count
+    reclaimed = this.claim("inbox", 10)
+    assert [job["id"] for job in reclaimed] == ids[:2]
+    assert all(job["attempts"] == 2 for job in reclaimed)
+    for queue in (this, crashed, alive):
+        queue.close()
+
+def test_expired_lease_is_claimable_by_another_process(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = JobQueue(path, lease_seconds=0.2), JobQueue(path)
+    (job_id, _), = first.enqueue("inbox", "me@example.com", [_email("m1")], [0.5])
+    first.claim("inbox", 1)
+    assert second.claim("inbox", 1) == []
+    time.sleep(0.12)
+    # Renewed in time: still leased to the first process
+    assert first.renew() == 1
+    time.sleep(0.12)
+    assert second.claim("inbox", 1) == []
+
+    time.sleep(0.2) # the first process stopped renewing (e.g. it was killed)
+    job, = second.claim("inbox", 1)
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+    # The first process no longer owns the job: its late failure changes nothing
+    assert first.fail(job_id, "late failure") == "running"
+    assert first.renew() == 0
+    assert second.fail(job_id, "calendar unavailable") == "queued"
+    first.close()
+    second.close()
+
+def test_jobs_survive_reopening_the_file(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(path)
+    (job_id, _), = queue.enqueue("inbox", "me@example.com", [_email("m1")], [0.5])
+    queue.close()
+    reopened = JobQueue(path)
+    assert reopened.list("me@example.com")[0]["id"] == job_id
+    assert reopened.enqueue("inbox", "me@example.com", [_email("m1")], [0.5]) == [(job_id, False)]
+    reopened.close()